@@ -0,0 +1,171 @@
+"""
+Database and Slack load under abusive traffic, with and without admission control (:mod:`desktop_dispatcher.admission`).
+
+For ``--seconds``, ``--abusers`` users who occupy a desktop press
+``/desktop`` and 'Change desktop' in turn, ``--rate`` times a second each,
+while ``--users`` ordinary users run ``/desktop`` every two seconds. The
+availability snapshot is reloaded for every request by default
+(``--cache-ttl 0``), i.e. every admitted press reaches the database, the
+worst case. This runs with admission control off and with the default
+limits (or ``--user-limits``/``--global-limits``).
+
+Reported are the database statements per second (mean and peak over the
+seconds until the processing backlog drained), the Slack calls, how many
+requests were refused, and the reply latency of the ordinary users whose
+requests were admitted.
+
+Usage:
+    python -m benchmarks.admission_control --abusers 10 --rate 20 --users 50 --seconds 10
+"""
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .environment import configure, seed_desktops
+from .load_test import percentiles
+from .payloads import block_action, dm_channel, slash_command
+from .stub_slack import StubSlack
+
+
+class StatementRate:
+    """
+    Counts the statements run on an engine per second.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.started_at = time.perf_counter()
+        self.per_second = Counter()
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.perf_counter()
+            self.per_second.clear()
+
+    def summary(self):
+        with self._lock:
+            seconds = max(self.per_second, default=0) + 1
+            total = sum(self.per_second.values())
+            return {
+                "statements": total,
+                "mean_per_second": round(total / seconds, 1),
+                "peak_per_second": max(self.per_second.values(), default=0),
+            }
+
+    def _count(self, *args):
+        with self._lock:
+            self.per_second[int(time.perf_counter() - self.started_at)] += 1
+
+
+def run(app, stub, statements, args):
+    from slack_bolt.request import BoltRequest
+
+    from desktop_dispatcher.admission import ADMISSION_REJECTED, admission_controller
+    from desktop_dispatcher.processing import processing_runner
+
+    stub.reset()
+    statements.reset()
+    finish_at = time.perf_counter() + args.seconds
+    latencies = []
+    sent = Counter()
+    lock = threading.Lock()
+
+    def abuse(index):
+        user_id = f"U{index}"
+        interval = 1 / args.rate
+        presses = 0
+        while time.perf_counter() < finish_at:
+            if presses % 2:
+                body = block_action(user_id, "change_desktop")
+            else:
+                body = slash_command(user_id)
+            app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+            presses += 1
+            time.sleep(interval)
+        with lock:
+            sent["abusive"] += presses
+
+    def use(index):
+        user_id = f"U{index}"
+        while time.perf_counter() < finish_at:
+            started_at = time.perf_counter()
+            response = app.dispatch(BoltRequest(body=slash_command(user_id), mode="socket_mode"))
+            # A refused command is answered in the ack alone
+            refused = bool(response.body) and json.loads(response.body).get("text") == ADMISSION_REJECTED
+            reply = None if refused else stub.wait_for_reply(dm_channel(user_id), started_at)
+            with lock:
+                sent["ordinary"] += 1
+                sent["ordinary_refused"] += refused
+                if reply is not None:
+                    latencies.append((reply[0] - started_at) * 1000)
+            time.sleep(max(started_at + 2 - time.perf_counter(), 0))
+
+    abusers = range(1, args.abusers + 1)
+    users = range(args.abusers + 1, args.abusers + args.users + 1)
+    with ThreadPoolExecutor(max_workers=args.abusers + args.users) as executor:
+        for index in abusers:
+            executor.submit(abuse, index)
+        for index in users:
+            executor.submit(use, index)
+    drained_at = time.perf_counter()
+    deadline = time.monotonic() + 120
+    while processing_runner.backlog and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    return {
+        "requests": dict(sent),
+        "drain_seconds": round(time.perf_counter() - drained_at, 2),
+        "db": statements.summary(),
+        "slack_calls": dict(sorted(stub.calls.items())),
+        "ordinary_reply_ms": percentiles(latencies),
+        "admission_stats": admission_controller.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--abusers", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=20.0, help="presses per second of each abuser")
+    parser.add_argument("--users", type=int, default=50, help="ordinary users, one /desktop every two seconds")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--cache-ttl", type=float, default=0.0, help="AVAILABILITY_CACHE_TTL")
+    parser.add_argument("--user-limits", help="ADMISSION_USER_LIMITS, defaults to the bot's default")
+    parser.add_argument("--global-limits", default="", help="ADMISSION_GLOBAL_LIMITS")
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    stub = StubSlack().start()
+    configure(stub, database_url=args.database_url)
+    desktops = (args.abusers + args.users) * 2
+    seed_desktops(desktops, occupied=lambda i: i <= args.abusers)
+
+    from desktop_dispatcher import admission
+    from desktop_dispatcher.cache import availability_cache
+    from desktop_dispatcher.events import create_app
+    from desktop_dispatcher.session import get_engine
+
+    availability_cache.ttl = args.cache_ttl
+    availability_cache.invalidate()
+    app = create_app()
+    statements = StatementRate(get_engine())
+    limits = admission.admission_controller.user_limits
+    if args.user_limits is not None:
+        limits = admission.parse_limits(args.user_limits)
+
+    for mode in ("off", "on"):
+        admission.admission_controller = admission.AdmissionController(
+            limits if mode == "on" else {},
+            admission.parse_limits(args.global_limits) if mode == "on" else {},
+        )
+        print(json.dumps({"admission": mode, **run(app, stub, statements, args)}))
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Measures the cost of rendering the bot's messages.
+
+Compares the precompiled templates in :mod:`desktop_dispatcher.blocks` with
+building the same messages from SDK model objects per request, which is what
+the listeners did before. Both sides include the serialisation to JSON that
+happens before the message is sent, and the output is checked to be identical.
+The free-desktop list does not change between renders, so the template side
+reuses its cached options array as it does between availability changes.
+
+Usage:
+    python -m benchmarks.block_rendering --desktops 50
+"""
+import argparse
+import json
+import timeit
+from collections import namedtuple
+
+from slack_sdk.models.blocks import (
+    ActionsBlock,
+    ButtonElement,
+    DividerBlock,
+    Option,
+    PlainTextObject,
+    SectionBlock,
+    StaticSelectElement,
+)
+
+from desktop_dispatcher import blocks
+
+Desktop = namedtuple("Desktop", ["id", "name"])
+
+
+def sdk_options(desktops):
+    return [
+        Option(text=PlainTextObject(text=desktop.name), value=str(desktop.id))
+        for desktop in desktops
+    ]
+
+
+def sdk_occupied_desktop_blocks(desktop):
+    return [
+        SectionBlock(text=f"🟢  You are using *{desktop.name}*"),
+        ActionsBlock(
+            elements=[
+                ButtonElement(text="Change desktop", action_id="change_desktop"),
+                ButtonElement(
+                    text="Leave",
+                    action_id="leave_desktop",
+                    value=str(desktop.id),
+                    style="danger",
+                ),
+            ]
+        ),
+        DividerBlock(),
+    ]
+
+
+def sdk_desktop_selection_blocks(free_desktops):
+    return [
+        DividerBlock(),
+        SectionBlock(text="⚪  You're not using any desktop"),
+        ActionsBlock(
+            elements=[
+                StaticSelectElement(
+                    placeholder=PlainTextObject(text="Select desktop"),
+                    options=sdk_options(free_desktops),
+                    action_id="desktop_selection",
+                )
+            ]
+        ),
+        DividerBlock(),
+    ]
+
+
+def sdk_change_desktop_blocks(current_desktop, free_desktops):
+    return [
+        SectionBlock(text=f"🟢  You are currently using *{current_desktop.name}*"),
+        ActionsBlock(
+            elements=[
+                StaticSelectElement(
+                    placeholder=PlainTextObject(text="Select new desktop"),
+                    options=sdk_options(free_desktops),
+                    action_id="new_desktop_selection",
+                ),
+                ButtonElement(text="Change", action_id="confirm_desktop_change", style="primary"),
+                ButtonElement(text="Cancel", action_id="cancel_desktop_change"),
+            ]
+        ),
+        DividerBlock(),
+    ]
+
+
+def sdk_json(built):
+    return json.dumps([block.to_dict() for block in built])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--desktops", type=int, default=50, help="free desktops in the dropdown (max 100)")
+    parser.add_argument("--number", type=int, default=2000, help="renders per measurement")
+    args = parser.parse_args()
+
+    desktop = Desktop(1, "desktop-00001")
+    free = [Desktop(i, f"desktop-{i:05d}") for i in range(2, args.desktops + 2)]
+    cases = {
+        "occupied_desktop": (
+            lambda: sdk_json(sdk_occupied_desktop_blocks(desktop)),
+            lambda: json.dumps(blocks.occupied_desktop_blocks(desktop)),
+        ),
+        "desktop_selection": (
+            lambda: sdk_json(sdk_desktop_selection_blocks(free)),
+            lambda: json.dumps(blocks.desktop_selection_blocks(free)),
+        ),
+        "change_desktop": (
+            lambda: sdk_json(sdk_change_desktop_blocks(desktop, free)),
+            lambda: json.dumps(blocks.change_desktop_blocks(desktop, free)),
+        ),
+    }
+
+    print(f"{'message':<20}{'sdk µs':>10}{'template µs':>14}{'speedup':>10}")
+    for name, (sdk, template) in cases.items():
+        assert json.loads(sdk()) == json.loads(template()), f"{name} renders differently"
+        sdk_us = min(timeit.repeat(sdk, number=args.number, repeat=5)) / args.number * 1e6
+        template_us = min(timeit.repeat(template, number=args.number, repeat=5)) / args.number * 1e6
+        print(f"{name:<20}{sdk_us:>10.1f}{template_us:>14.1f}{sdk_us / template_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Checks that the conditional claim and swap statements hold up under contention.
+
+``--threads`` users, released together by a barrier, claim the same free
+desktop through :func:`desktop_dispatcher.repository.claim_desktop`; exactly
+one of them must get it. Then as many users, each occupying a desktop of their
+own, swap onto the same free desktop through ``swap_desktop``: exactly one
+must move, and every loser must still occupy the desktop they started on.
+Each round is repeated ``--rounds`` times; the script exits non-zero on the
+first violation.
+
+Usage:
+    python -m benchmarks.claim_contention --threads 32 --rounds 20
+    python -m benchmarks.claim_contention --database-url postgresql://...
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .environment import configure, seed_desktops
+
+
+def contend(threads, attempt):
+    """
+    Runs ``attempt(i)`` on ``threads`` threads at once.
+
+    Returns:
+        list: What each attempt returned, by thread index.
+    """
+    barrier = threading.Barrier(threads)
+
+    def run(i):
+        barrier.wait()
+        return attempt(i)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(run, range(threads)))
+
+
+def occupants():
+    from sqlalchemy import select
+
+    from desktop_dispatcher.models import Desktop
+    from desktop_dispatcher.session import session_scope
+
+    with session_scope() as session:
+        return {
+            row.id: row.user_id
+            for row in session.execute(select(Desktop.id, Desktop.user_id, Desktop.occupied))
+            if row.occupied
+        }
+
+
+def claim_round(threads):
+    """
+    Every thread claims desktop 1; exactly one wins and holds it.
+    """
+    from desktop_dispatcher.repository import claim_desktop
+    from desktop_dispatcher.session import session_scope
+
+    seed_desktops(1)
+
+    def attempt(i):
+        with session_scope() as session:
+            return claim_desktop(session, 1, f"C{i}") is not None
+
+    winners = [f"C{i}" for i, won in enumerate(contend(threads, attempt)) if won]
+    held = occupants()
+    if len(winners) != 1 or held != {1: winners[0]}:
+        return f"claim: winners {winners}, desktop occupied by {held}"
+    return None
+
+
+def swap_round(threads):
+    """
+    User ``U<i>`` on desktop ``i`` swaps to the free desktop ``threads + 1``; one
+    moves, the others keep their desktop.
+    """
+    from desktop_dispatcher.repository import swap_desktop
+    from desktop_dispatcher.session import session_scope
+
+    target = threads + 1
+    seed_desktops(target, occupied=lambda i: i != target)
+
+    def attempt(i):
+        with session_scope() as session:
+            return swap_desktop(session, f"U{i + 1}", target) is not None
+
+    winners = [i + 1 for i, won in enumerate(contend(threads, attempt)) if won]
+    held = occupants()
+    expected = {i: f"U{i}" for i in range(1, target) if i not in winners}
+    if winners:
+        expected[target] = f"U{winners[0]}"
+    if len(winners) != 1 or held != expected:
+        lost = sorted(i for i in range(1, target) if i not in winners and held.get(i) != f"U{i}")
+        return f"swap: winners {winners}, losers without their desktop {lost}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16, help="users contending at once")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    configure(database_url=args.database_url)
+
+    started_at = time.perf_counter()
+    for name, check in (("claim", claim_round), ("swap", swap_round)):
+        for _ in range(args.rounds):
+            failure = check(args.threads)
+            if failure:
+                print(failure, file=sys.stderr)
+                sys.exit(1)
+        print(json.dumps({"check": name, "rounds": args.rounds, "threads": args.threads, "winners": 1}))
+    print(json.dumps({"seconds": round(time.perf_counter() - started_at, 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Graceful degradation while the database fails or stalls (:mod:`desktop_dispatcher.breaker`).
+
+Simulated users keep running ``/desktop``, claiming a desktop and leaving it
+through the app, at ``--concurrency``, while faults are injected into every
+SQL statement: after ``--before`` seconds, for ``--outage`` seconds, each
+statement fails with an ``OperationalError`` (``--fault error``) or hangs for
+``--stall`` seconds (``--fault slow``); then the database recovers and the
+run goes on for ``--after`` seconds.
+
+Per phase the benchmark reports the reply latency and the replies by kind:
+``ok``, ``stale`` (a desktop list from the last-known-good snapshot, with
+its notice), ``refused`` (the fast "database is not responding" answer),
+``errors`` (any other error reply) and ``timeouts``. It also reports when
+the circuit breaker changed state, in seconds from the start of the fault.
+
+Usage:
+    python -m benchmarks.degradation --fault slow --outage 10
+    python -m benchmarks.degradation --fault error --outage 10 --concurrency 20
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .environment import configure, seed_desktops
+from .load_test import ERROR_PREFIX, claim, leave, list_desktops, percentiles, user_of
+from .payloads import dm_channel
+from .stub_slack import StubSlack
+
+STALE_PREFIX = "⚠️"
+
+
+class Fault:
+    """
+    Makes every statement on an engine fail or hang while switched on.
+
+    Args:
+        engine (Engine): The engine to inject into.
+        kind (str): ``error`` or ``slow``.
+        stall (float): How long a statement hangs with ``slow``, in seconds.
+    """
+
+    def __init__(self, engine, kind, stall):
+        from sqlalchemy import event
+
+        self.kind = kind
+        self.stall = stall
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._inject)
+
+    def _inject(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.active:
+            return
+        if self.kind == "slow":
+            time.sleep(self.stall)
+            return
+        from sqlalchemy.exc import OperationalError
+
+        raise OperationalError(statement, parameters, Exception("injected outage"))
+
+
+def watch_breaker(breaker, stopping, timeline, started_at):
+    """
+    Records the state changes of ``breaker`` until ``stopping`` is set.
+    """
+    state = breaker.state
+    while not stopping.is_set():
+        if breaker.state != state:
+            state = breaker.state
+            timeline.append({"at": round(time.perf_counter() - started_at, 2), "state": state})
+        time.sleep(0.005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fault", choices=("error", "slow"), default="slow")
+    parser.add_argument("--stall", type=float, default=3.0, help="seconds a statement hangs with --fault slow")
+    parser.add_argument("--before", type=float, default=3.0, help="seconds of healthy traffic first")
+    parser.add_argument("--outage", type=float, default=10.0, help="seconds the fault lasts")
+    parser.add_argument("--after", type=float, default=8.0, help="seconds of traffic after recovery")
+    parser.add_argument("--concurrency", type=int, default=10, help="users in flight at once")
+    parser.add_argument("--desktops", type=int, default=1000)
+    parser.add_argument("--breaker-failures", type=int, default=5, help="DB_BREAKER_FAILURES")
+    parser.add_argument("--breaker-slow", type=float, default=1.0, help="DB_BREAKER_SLOW_SECONDS")
+    parser.add_argument("--breaker-reset", type=float, default=2.0, help="DB_BREAKER_RESET_SECONDS")
+    parser.add_argument("--cache-ttl", type=float, default=1.0, help="AVAILABILITY_CACHE_TTL")
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    stub = StubSlack().start()
+    configure(stub, args.database_url)
+    seed_desktops(args.desktops)
+
+    from slack_bolt.request import BoltRequest
+
+    from desktop_dispatcher.breaker import database_breaker
+    from desktop_dispatcher.cache import availability_cache
+    from desktop_dispatcher.events import DATABASE_UNAVAILABLE, create_app
+    from desktop_dispatcher.session import get_engine
+
+    database_breaker.failure_threshold = args.breaker_failures
+    database_breaker.slow_call_seconds = args.breaker_slow
+    database_breaker.reset_timeout = args.breaker_reset
+    availability_cache.ttl = availability_cache.retry_interval = args.cache_ttl
+    availability_cache.invalidate()
+
+    app = create_app()
+    fault = Fault(get_engine(), args.fault, args.stall)
+    users = itertools.count(1)
+    latencies = defaultdict(list)
+    outcomes = defaultdict(Counter)
+    lock = threading.Lock()
+
+    started_at = time.perf_counter()
+    fault_on = started_at + args.before
+    fault_off = fault_on + args.outage
+    finish_at = fault_off + args.after
+
+    def phase(moment):
+        return "before" if moment < fault_on else "outage" if moment < fault_off else "after"
+
+    def interact(body):
+        sent_at = time.perf_counter()
+        app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+        reply = stub.wait_for_reply(dm_channel(user_of(body)), sent_at)
+        if reply is None:
+            outcome = "timeouts"
+        else:
+            arrived_at, text = reply
+            if text == DATABASE_UNAVAILABLE:
+                outcome = "refused"
+            elif text.startswith(ERROR_PREFIX):
+                outcome = "errors"
+            elif text.startswith(STALE_PREFIX):
+                outcome = "stale"
+            else:
+                outcome = "ok"
+        with lock:
+            outcomes[phase(sent_at)][outcome] += 1
+            if reply is not None:
+                latencies[phase(sent_at)].append((arrived_at - sent_at) * 1000)
+
+    def run_user():
+        while time.perf_counter() < finish_at:
+            user = next(users)
+            user_id, desktop_id = f"U{user}", user % args.desktops + 1
+            for body, _ in (list_desktops(user_id), claim(user_id, desktop_id), leave(user_id, desktop_id)):
+                interact(body)
+
+    stopping = threading.Event()
+    timeline = []
+    watcher = threading.Thread(
+        target=watch_breaker, args=(database_breaker, stopping, timeline, fault_on), daemon=True
+    )
+    watcher.start()
+
+    def switch_fault():
+        time.sleep(max(fault_on - time.perf_counter(), 0))
+        fault.active = True
+        time.sleep(max(fault_off - time.perf_counter(), 0))
+        fault.active = False
+
+    switcher = threading.Thread(target=switch_fault, daemon=True)
+    switcher.start()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(run_user)
+    switcher.join()
+    stopping.set()
+    watcher.join()
+
+    print(
+        json.dumps(
+            {
+                "fault": args.fault,
+                "outage_seconds": args.outage,
+                "phases": {
+                    name: {
+                        "interactions": sum(outcomes[name].values()),
+                        "replies": dict(sorted(outcomes[name].items())),
+                        "reply_ms": percentiles(latencies[name]),
+                    }
+                    for name in ("before", "outage", "after")
+                },
+                "breaker": timeline,
+                "breaker_stats": database_breaker.stats(),
+            },
+            indent=2,
+        )
+    )
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
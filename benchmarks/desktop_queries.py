@@ -0,0 +1,85 @@
+"""
+Compares the latency of the hot desktop queries with and without the partial indexes.
+
+Seeds a temporary copy of the ``desktop`` table (nothing is written to the real
+table), times the free-desktop listing and the per-user lookup, creates the
+indexes from migration 3b9c1d7e4a52 and times them again.
+
+Usage:
+    python -m benchmarks.desktop_queries --rows 10000 100000
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import text
+
+from desktop_dispatcher.session import get_engine
+
+QUERIES = {
+    "free_desktops": "SELECT * FROM desktop_bench WHERE occupied = false",
+    "user_desktop": (
+        "SELECT * FROM desktop_bench WHERE occupied = true AND user_id = :user_id LIMIT 1"
+    ),
+}
+
+
+def seed(conn, rows, free_ratio):
+    conn.execute(text("DROP TABLE IF EXISTS desktop_bench"))
+    conn.execute(text("CREATE TEMP TABLE desktop_bench (LIKE desktop INCLUDING DEFAULTS)"))
+    conn.execute(
+        text(
+            """
+            INSERT INTO desktop_bench (id, name, occupied, user_id)
+            SELECT i, 'desktop-' || i, occupied, CASE WHEN occupied THEN 'U' || i END
+            FROM (
+                SELECT i, random() >= :free_ratio AS occupied
+                FROM generate_series(1, :rows) AS i
+            ) AS s
+            """
+        ),
+        {"rows": rows, "free_ratio": free_ratio},
+    )
+    conn.execute(text("ANALYZE desktop_bench"))
+
+
+def add_indexes(conn):
+    conn.execute(text("CREATE INDEX ON desktop_bench (id) WHERE occupied = false"))
+    conn.execute(text("CREATE UNIQUE INDEX ON desktop_bench (user_id) WHERE occupied = true"))
+    conn.execute(text("ANALYZE desktop_bench"))
+
+
+def time_queries(conn, rows, iterations):
+    results = {}
+    for name, sql in QUERIES.items():
+        samples = []
+        for i in range(iterations):
+            params = {"user_id": f"U{(i * 7919) % rows + 1}"}
+            started_at = time.perf_counter()
+            conn.execute(text(sql), params).fetchall()
+            samples.append((time.perf_counter() - started_at) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--free-ratio", type=float, default=0.05)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'query':<14} {'before ms':>10} {'after ms':>10}")
+    with get_engine().connect() as conn:
+        for rows in args.rows:
+            seed(conn, rows, args.free_ratio)
+            before = time_queries(conn, rows, args.iterations)
+            add_indexes(conn)
+            after = time_queries(conn, rows, args.iterations)
+            for name in QUERIES:
+                print(f"{rows:>8} {name:<14} {before[name]:>10.3f} {after[name]:>10.3f}")
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    main()
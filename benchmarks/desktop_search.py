@@ -0,0 +1,75 @@
+"""
+Measures the latency of the type-ahead desktop search behind the ``external_select`` menus.
+
+Seeds ``--desktops`` desktops named like ``berlin-03-gpu-0412`` into a temporary
+SQLite database, a share of them occupied, and times what the options listener
+does per query: the search, building the options and serialising them. Slack
+drops an options response that takes longer than 3 seconds.
+
+Usage:
+    python -m benchmarks.desktop_search --desktops 50000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from .environment import configure, seed_desktops
+
+SITES = ["berlin", "dresden", "munich", "hamburg", "cologne", "leipzig", "bremen", "essen"]
+KINDS = ["gpu", "cpu", "lab", "dev", "ws"]
+QUERIES = ["", "b", "mu", "berl", "dresden-0", "hamburg-07-gpu", "gpu-04", "0412", "brelin-03", "zzz"]
+
+
+def desktop_name(i):
+    rng = random.Random(i)
+    return f"{rng.choice(SITES)}-{rng.randrange(1, 13):02d}-{rng.choice(KINDS)}-{i:05d}"
+
+
+def percentile(samples, share):
+    return sorted(samples)[min(int(len(samples) * share), len(samples) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--desktops", type=int, default=50000)
+    parser.add_argument("--occupied", type=float, default=0.6, help="share of occupied desktops")
+    parser.add_argument("--iterations", type=int, default=200, help="runs per query")
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    configure(database_url=args.database_url)
+    seed_desktops(
+        args.desktops,
+        name_of=desktop_name,
+        occupied=lambda i: random.Random(-i).random() < args.occupied,
+    )
+
+    from desktop_dispatcher.blocks import suggested_options
+    from desktop_dispatcher.cache import availability_cache
+    from desktop_dispatcher.search import desktop_search
+
+    started_at = time.perf_counter()
+    availability_cache.free_desktops()
+    loaded_at = time.perf_counter()
+    desktop_search.search("warm-up")
+    indexed_at = time.perf_counter()
+    print(f"cache load {(loaded_at - started_at) * 1000:.0f} ms, index build {(indexed_at - loaded_at) * 1000:.0f} ms")
+
+    print(f"{'query':<18}{'results':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for query in QUERIES:
+        samples = []
+        for _ in range(args.iterations):
+            started_at = time.perf_counter()
+            desktops = desktop_search.search(query)
+            json.dumps({"options": suggested_options(desktops)})
+            samples.append((time.perf_counter() - started_at) * 1000)
+        print(
+            f"{query!r:<18}{len(desktops):>8}{statistics.median(samples):>9.2f}"
+            f"{percentile(samples, 0.99):>9.2f}{max(samples):>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
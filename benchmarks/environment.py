@@ -0,0 +1,68 @@
+"""
+Points the bot at the stub Slack API and a benchmark database.
+
+Must run before anything from ``desktop_dispatcher`` is imported, because the
+bot reads its configuration at import time.
+"""
+import os
+import tempfile
+
+
+def configure(stub=None, database_url=None):
+    """
+    Sets the environment for an offline run.
+
+    Args:
+        stub (StubSlack): The running stub Web API, if the run talks to Slack.
+        database_url (str): A SQLAlchemy URL; defaults to a fresh SQLite file.
+
+    Returns:
+        str: The database URL in use.
+    """
+    if not database_url:
+        path = os.path.join(tempfile.mkdtemp(prefix="desktop-bench-"), "bench.db")
+        database_url = f"sqlite:///{path}"
+    os.environ.update(
+        {
+            "SQLALCHEMY_URL": database_url,
+            "SLACK_BOT_TOKEN": "xoxb-bench",
+            "SLACK_APP_TOKEN": "xapp-bench",
+        }
+    )
+    if stub:
+        os.environ["SLACK_API_URL"] = stub.url
+        os.environ["NOTIFICATION_CHANNEL_NAME"] = stub.channel_name
+    return database_url
+
+
+def seed_desktops(count, name_of=None, occupied=None):
+    """
+    Recreates the schema and inserts ``count`` desktops.
+
+    Args:
+        count (int): The number of desktops, with IDs from 1.
+        name_of (function): Maps an ID to the desktop name, ``desktop-00001`` style by default.
+        occupied (function): Tells whether the desktop with an ID is occupied, all free by default.
+    """
+    from sqlalchemy import delete, insert
+
+    from desktop_dispatcher.models import Desktop
+    from desktop_dispatcher.session import Base, get_engine
+
+    engine = get_engine()
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(delete(Desktop))
+        conn.execute(
+            insert(Desktop),
+            [
+                {
+                    "id": i,
+                    "name": name_of(i) if name_of else f"desktop-{i:05d}",
+                    "occupied": bool(occupied and occupied(i)),
+                    "user_id": f"U{i}" if occupied and occupied(i) else None,
+                }
+                for i in range(1, count + 1)
+            ],
+        )
@@ -0,0 +1,142 @@
+"""
+Throughput of the HTTP Events API mode (:mod:`desktop_dispatcher.web`) by gunicorn worker count.
+
+For each ``--workers`` value gunicorn is started on the real config, the
+stub Slack API and a temporary SQLite database (or ``--database-url``), and
+``--requests`` signed ``/desktop`` slash commands are posted to it from
+``--concurrency`` client threads. Reported are acks per second, i.e. HTTP
+responses, and replies per second, i.e. the messages the listeners posted
+back through the stub. With enough cores both should grow linearly with the
+worker count; the load generator runs on the same machine, so leave it a core.
+
+Usage:
+    python -m benchmarks.http_throughput --workers 1 2 4 --requests 2000
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from slack_sdk.signature import SignatureVerifier
+
+from .environment import configure, seed_desktops
+from .payloads import slash_command
+from .stub_slack import StubSlack
+
+SIGNING_SECRET = "bench-signing-secret"
+
+
+def signed_headers(body):
+    timestamp = str(int(time.time()))
+    return {
+        "Content-Type": "application/x-www-form-urlencoded",
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": SignatureVerifier(SIGNING_SECRET).generate_signature(
+            timestamp=timestamp, body=body
+        ),
+    }
+
+
+def wait_until_ready(port, server, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/readyz")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("gunicorn did not become ready")
+
+
+def run_workers(workers, args, stub):
+    port = args.port
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        SLACK_SIGNING_SECRET=SIGNING_SECRET,
+        PENDING_SELECTION_BACKEND="database",
+        METRICS_PORT="0",
+        # Every user sends several commands; this measures throughput, not the limits
+        ADMISSION_USER_LIMITS="",
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn",
+            "--config", "python:desktop_dispatcher.gunicorn_config",
+            "--log-level", "warning",
+            "desktop_dispatcher.web:application",
+        ],
+        env=env,
+    )
+    try:
+        wait_until_ready(port, server)
+        local = threading.local()
+        statuses = []
+
+        def post(index):
+            if not hasattr(local, "connection"):
+                local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            body = urlencode(slash_command(f"U{index % args.users + 1}"))
+            local.connection.request("POST", "/slack/events", body=body, headers=signed_headers(body))
+            response = local.connection.getresponse()
+            response.read()
+            statuses.append(response.status)
+
+        stub.reset()
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(post, range(args.requests)))
+        acked = time.perf_counter() - started_at
+        stub.wait_for_replies(args.requests)
+        replied = time.perf_counter() - started_at
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "workers": workers,
+        "requests": args.requests,
+        "rejected": sum(status != 200 for status in statuses),
+        "acks_per_second": round(args.requests / acked, 1),
+        "replies_per_second": round(args.requests / replied, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads posting at once")
+    parser.add_argument("--slack-latency", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=3031)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    stub = StubSlack(latency=args.slack_latency).start()
+    configure(stub, args.database_url)
+    seed_desktops(args.users * 2, occupied=lambda i: i <= args.users and i % 2 == 0)
+
+    baseline = None
+    for workers in args.workers:
+        result = run_workers(workers, args, stub)
+        baseline = baseline or result["replies_per_second"] / workers
+        result["scaling_efficiency"] = round(result["replies_per_second"] / (baseline * workers), 2)
+        print(json.dumps(result))
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Duplicate interactions (:mod:`desktop_dispatcher.dedup`): the work they cost with and without the dedup middleware.
+
+Every simulated user claims a desktop and leaves it again, clicking in the
+same message. A share of the clicks is repeated: ``--redeliveries`` are
+delivered a second time unchanged, the way Slack retries an interaction it
+thinks timed out, and ``--double-clicks`` are clicked again 0.1s later.
+
+This runs with dedup switched off, with the ``memory`` and ``database``
+backends, and with ``database`` and no keys kept in memory, as if every
+duplicate reached another replica. Reported are the duplicates sent and
+dropped, the database statements, the Slack calls per method, the channel
+notifications, the error replies (such as "you already occupy a desktop" for
+a repeated claim) and the dedup hit rate.
+
+Usage:
+    python -m benchmarks.interaction_dedup --users 300 --redeliveries 0.1 --double-clicks 0.2
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .environment import configure, seed_desktops
+from .load_test import ERROR_PREFIX, desktop_name
+from .payloads import block_action, dm_channel
+from .stub_slack import StubSlack
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def run(app, stub, statements, users, redeliveries, double_clicks, concurrency, seed):
+    from slack_bolt.request import BoltRequest
+
+    from desktop_dispatcher.cache import availability_cache
+    from desktop_dispatcher.dedup import interaction_dedup
+    from desktop_dispatcher.metrics import DUPLICATE_INTERACTIONS
+    from desktop_dispatcher.notifications import dispatcher
+
+    seed_desktops(users)
+    availability_cache.invalidate()
+    rng = random.Random(seed)
+    # Decided up front so every run repeats the same clicks
+    repeats = [[rng.random() for _ in range(2)] for _ in range(users)]
+    dropped_before = {
+        reason: DUPLICATE_INTERACTIONS.labels(reason)._value.get() for reason in ("redelivery", "repeated_click")
+    }
+    stub.reset()
+    statements.count = 0
+    sent = {"originals": 0, "duplicates": 0}
+    lock = threading.Lock()
+
+    def click(user_id, action_id, message_ts, repeat, **action):
+        body = block_action(user_id, action_id, message_ts=message_ts, **action)
+        started_at = time.perf_counter()
+        app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+        duplicate = None
+        if repeat < redeliveries:
+            duplicate = body
+        elif repeat < redeliveries + double_clicks:
+            time.sleep(0.1)
+            duplicate = block_action(user_id, action_id, message_ts=message_ts, **action)
+        if duplicate is not None:
+            app.dispatch(BoltRequest(body=duplicate, mode="socket_mode"))
+        with lock:
+            sent["originals"] += 1
+            sent["duplicates"] += duplicate is not None
+        stub.wait_for_reply(dm_channel(user_id), started_at)
+
+    def journey(i):
+        user_id, message_ts = f"U{i}", f"{time.time():.6f}"
+        click(user_id, "desktop_selection", message_ts, repeats[i - 1][0], selected=(i, desktop_name(i)))
+        click(user_id, "leave_desktop", message_ts, repeats[i - 1][1], value=i)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(journey, range(1, users + 1)))
+    # Let the listeners of late duplicates and the channel notifications finish
+    deadline = time.monotonic() + 30
+    replies = -1
+    while (stub.replies != replies or dispatcher.queue_depth) and time.monotonic() < deadline:
+        replies = stub.replies
+        time.sleep(0.3)
+
+    return {
+        "seconds": round(time.perf_counter() - started_at, 2),
+        **sent,
+        "dropped": {
+            reason: int(DUPLICATE_INTERACTIONS.labels(reason)._value.get() - before)
+            for reason, before in dropped_before.items()
+        },
+        "db_statements": statements.count,
+        "slack_calls": dict(sorted(stub.calls.items())),
+        "notifications": stub.notifications,
+        "error_replies": sum(
+            text.startswith(ERROR_PREFIX) for log in stub.reply_log.values() for _, text in log
+        ),
+        "dedup_stats": interaction_dedup.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--redeliveries", type=float, default=0.1, help="share of clicks delivered twice")
+    parser.add_argument("--double-clicks", type=float, default=0.2, help="share of clicks clicked twice")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    stub = StubSlack().start()
+    configure(stub, database_url=args.database_url)
+
+    from desktop_dispatcher import dedup
+    from desktop_dispatcher.events import create_app
+    from desktop_dispatcher.session import get_engine
+
+    app = create_app()
+    statements = StatementCounter(get_engine())
+    windows = dedup.dedup_window, dedup.click_window
+
+    for backend in ("off", "memory", "database", "database_other_replica"):
+        # Zero windows let every key expire at once, i.e. nothing is a duplicate
+        dedup.dedup_window, dedup.click_window = (0.0, 0.0) if backend == "off" else windows
+        if backend.startswith("database"):
+            dedup.interaction_dedup = dedup.DatabaseDedupStore()
+            if backend == "database_other_replica":
+                dedup.interaction_dedup.local.max_entries = 0
+        else:
+            dedup.interaction_dedup = dedup.MemoryDedupStore()
+        result = run(
+            app, stub, statements, args.users, args.redeliveries, args.double_clicks, args.concurrency, args.seed
+        )
+        print(json.dumps({"dedup": backend, **result}))
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Desktop inventory import (:mod:`desktop_dispatcher.inventory`) against row-by-row ORM inserts.
+
+For each ``--rows`` size a CSV inventory is generated and loaded into an
+empty ``desktop`` table, once with one ORM object added and flushed per row
+(what scripting the hand-written INSERTs amounts to) and once with
+:func:`desktop_dispatcher.inventory.import_inventory`. A second import then
+applies a weekly change to the full table: a tenth of the desktops renamed,
+a tenth replaced by new ones, and half of those occupied, which the import
+must leave alone. The peak Python memory of each import is measured
+with tracemalloc in a separate run, so it can be compared across sizes.
+
+Usage:
+    python -m benchmarks.inventory_import --rows 10000 100000
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from .environment import configure
+
+
+def write_inventory(path, rows, week=0):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("id", "name"))
+        for i in range(1, rows + 1):
+            if week and i % 10 == 1:
+                # Replaced: the old desktop is gone, a new one has no id yet
+                writer.writerow(("", f"desktop-{i:06d}-new"))
+            elif week and i % 10 == 2:
+                writer.writerow((i, f"desktop-{i:06d}-renamed"))
+            else:
+                writer.writerow((i, f"desktop-{i:06d}"))
+
+
+def orm_rows(path):
+    from desktop_dispatcher.models import Desktop
+    from desktop_dispatcher.session import session_scope
+
+    started_at = time.perf_counter()
+    with open(path, newline="") as file, session_scope() as session:
+        for row in csv.DictReader(file):
+            session.add(Desktop(id=int(row["id"]), name=row["name"], occupied=False))
+            session.flush()
+    return time.perf_counter() - started_at
+
+
+def timed_import(path):
+    from desktop_dispatcher.inventory import import_inventory
+
+    started_at = time.perf_counter()
+    stats = import_inventory(path)
+    return time.perf_counter() - started_at, stats
+
+
+def peak_memory(path):
+    from desktop_dispatcher.inventory import import_inventory
+
+    tracemalloc.start()
+    import_inventory(path, dry_run=True)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def occupy_tenth():
+    # Half of the desktops the weekly file replaces or renames are occupied
+    from sqlalchemy import String, update
+
+    from desktop_dispatcher.models import Desktop
+    from desktop_dispatcher.session import get_engine
+
+    with get_engine().begin() as conn:
+        conn.execute(
+            update(Desktop)
+            .where((Desktop.id % 20).in_((1, 2)))
+            .values(occupied=True, user_id="U" + Desktop.id.cast(String))
+        )
+
+
+def clear_desktops():
+    from sqlalchemy import delete
+
+    from desktop_dispatcher.models import Desktop
+    from desktop_dispatcher.session import Base, get_engine
+
+    Base.metadata.create_all(get_engine())
+    with get_engine().begin() as conn:
+        conn.execute(delete(Desktop))
+
+
+def run(rows, directory):
+    initial = os.path.join(directory, f"inventory-{rows}.csv")
+    weekly = os.path.join(directory, f"inventory-{rows}-week.csv")
+    write_inventory(initial, rows)
+    write_inventory(weekly, rows, week=1)
+
+    clear_desktops()
+    orm_seconds = orm_rows(initial)
+
+    clear_desktops()
+    import_seconds, _ = timed_import(initial)
+    occupy_tenth()
+    diff_seconds, diff = timed_import(weekly)
+
+    return {
+        "rows": rows,
+        "orm_rows_per_second": round(rows / orm_seconds),
+        "import_rows_per_second": round(rows / import_seconds),
+        "diff_seconds": round(diff_seconds, 2),
+        "diff": diff,
+        "import_peak_mib": round(peak_memory(weekly), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    configure(database_url=args.database_url)
+    with tempfile.TemporaryDirectory(prefix="desktop-inventory-") as directory:
+        for rows in args.rows:
+            print(json.dumps(run(rows, directory)))
+
+
+if __name__ == "__main__":
+    main()
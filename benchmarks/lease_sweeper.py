@@ -0,0 +1,128 @@
+"""
+Time to release expired leases: the set-based sweeper against a per-row ORM loop.
+
+Seeds ``--leases`` occupied desktops in a temporary SQLite database (or
+``--database-url``), lets ``--expired`` of them run out, and releases them once
+with :class:`desktop_dispatcher.leases.LeaseSweeper` and once by loading the
+expired desktops as ORM objects and freeing them one by one, the way a naive
+sweeper would. Reported are the wall time, the statements sent to the database
+and the channel notifications of each.
+
+Usage:
+    python -m benchmarks.lease_sweeper --leases 100000 --expired 0.5
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from .environment import configure, seed_desktops
+
+
+def seed_leases(engine, leases, expired, now):
+    from sqlalchemy import update
+
+    from desktop_dispatcher.models import Desktop
+
+    seed_desktops(leases, occupied=lambda i: True)
+    expired_count = int(leases * expired)
+    with engine.begin() as conn:
+        conn.execute(
+            update(Desktop).values(claimed_at=now - timedelta(hours=12), expires_at=now + timedelta(hours=1))
+        )
+        # Spread over the last hour, so the sweeper has to use the expiry index rather than a flag
+        for minute in range(60):
+            conn.execute(
+                update(Desktop)
+                .where(Desktop.id <= expired_count, Desktop.id % 60 == minute)
+                .values(expires_at=now - timedelta(minutes=minute, seconds=1))
+            )
+    return expired_count
+
+
+def count_statements(engine):
+    # Only the sweeping thread: the occupancy log writes the release events meanwhile
+    counter = {"statements": 0}
+    sweeping_thread = threading.get_ident()
+
+    def before_cursor_execute(*args):
+        if threading.get_ident() == sweeping_thread:
+            counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return counter, lambda: event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def orm_loop(now, notify):
+    # The per-row alternative: every desktop is loaded, changed and flushed on its own
+    from sqlalchemy import select
+
+    from desktop_dispatcher.models import Desktop
+    from desktop_dispatcher.session import session_scope
+
+    with session_scope() as session:
+        desktops = session.scalars(
+            select(Desktop).where(Desktop.occupied == True, Desktop.expires_at <= now)
+        ).all()
+        for desktop in desktops:
+            user_id = desktop.user_id
+            desktop.occupied = False
+            desktop.user_id = None
+            desktop.claimed_at = None
+            desktop.expires_at = None
+            session.flush()
+            notify(f"⏰  *<@{user_id}>*'s lease on *{desktop.name}* expired")
+    return len(desktops)
+
+
+def measure(name, engine, release):
+    notifications = []
+    counter, stop_counting = count_statements(engine)
+    started_at = time.perf_counter()
+    released = release(notifications.append)
+    elapsed = time.perf_counter() - started_at
+    stop_counting()
+    return {
+        "sweeper": name,
+        "released": released,
+        "seconds": round(elapsed, 3),
+        "statements": counter["statements"],
+        "notifications": len(notifications),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--leases", type=int, default=100000)
+    parser.add_argument("--expired", type=float, default=0.5, help="fraction of leases that ran out")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    configure(database_url=args.database_url)
+
+    from desktop_dispatcher.leases import LeaseSweeper
+    from desktop_dispatcher.occupancy import occupancy_log
+    from desktop_dispatcher.session import get_engine
+
+    engine = get_engine()
+    now = datetime.now(timezone.utc)
+
+    seed_leases(engine, args.leases, args.expired, now)
+    print(json.dumps(measure("orm_loop", engine, lambda notify: orm_loop(now, notify))))
+
+    seed_leases(engine, args.leases, args.expired, now)
+
+    def sweep(notify):
+        sweeper = LeaseSweeper(batch_size=args.batch_size, notify=notify)
+        return len(sweeper.run(now=now))
+
+    print(json.dumps(measure("set_based", engine, sweep)))
+    occupancy_log.shutdown(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
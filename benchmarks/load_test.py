@@ -0,0 +1,358 @@
+"""
+Offline load test and replay harness for the Bolt listeners in :mod:`desktop_dispatcher.events`.
+
+Each scenario seeds the desktop table, then drives simulated users through the
+``App`` at ``--concurrency``: every user runs a short journey of slash commands
+and block actions, one interaction after another, like a person clicking
+through the bot. Slack is replaced by the stub Web API and the database is a
+temporary SQLite file unless ``--database-url`` points at Postgres.
+
+Per scenario the harness reports:
+
+- ack latency: until ``App.dispatch`` returns, which is when the Socket Mode
+  handler sends the acknowledgement to Slack,
+- end-to-end latency: until the reply reaches the user's channel,
+- throughput, database statements and Slack API calls (per method).
+
+``--slack-latency`` and ``--db-latency`` slow down the stub Web API and every
+SQL statement; with the listeners acking before they process, ack latency
+should stay flat while they rise and only end-to-end latency grows.
+
+Results are written as JSON with the commit they were measured on, and a
+previous result file can be given with ``--baseline`` to compare against.
+``--record`` saves the generated payloads as JSON lines and ``--replay`` drives
+such a file (or payloads captured elsewhere) through the app instead of the
+scenarios.
+
+Usage:
+    python -m benchmarks.load_test --users 200 --concurrency 20 --output results.json
+    python -m benchmarks.load_test --baseline results.json
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from .environment import configure, seed_desktops
+from .payloads import block_action, dm_channel, slash_command
+from .stub_slack import StubSlack
+
+ERROR_PREFIX = "⛔"
+
+
+def desktop_name(desktop_id):
+    return f"desktop-{desktop_id:05d}"
+
+
+def list_desktops(user_id):
+    return slash_command(user_id), True
+
+
+def claim(user_id, desktop_id):
+    return block_action(
+        user_id, "desktop_selection", selected=(desktop_id, desktop_name(desktop_id))
+    ), True
+
+
+def leave(user_id, desktop_id):
+    return block_action(user_id, "leave_desktop", value=desktop_id), True
+
+
+def change(user_id, desktop_id):
+    return [
+        (block_action(user_id, "change_desktop"), True),
+        (
+            block_action(
+                user_id,
+                "new_desktop_selection",
+                selected=(desktop_id, desktop_name(desktop_id)),
+            ),
+            False,
+        ),
+        (block_action(user_id, "confirm_desktop_change"), True),
+    ]
+
+
+def scenario_desktop(users, rng):
+    """/desktop from users of whom every other one occupies a desktop."""
+    setup = {"count": users * 2, "occupied": lambda i: i <= users and i % 2 == 0}
+    return setup, [[list_desktops(f"U{i}")] for i in range(1, users + 1)]
+
+
+def scenario_claim(users, rng):
+    """Every user claims a different free desktop."""
+    setup = {"count": users + 50, "occupied": None}
+    return setup, [[claim(f"U{i}", i)] for i in range(1, users + 1)]
+
+
+def scenario_claim_contended(users, rng):
+    """Ten users race for each free desktop; one of them gets it."""
+    desktops = max(users // 10, 1)
+    setup = {"count": desktops, "occupied": None}
+    return setup, [[claim(f"U{i}", i % desktops + 1)] for i in range(1, users + 1)]
+
+
+def scenario_leave(users, rng):
+    """Every user releases the desktop they occupy."""
+    setup = {"count": users, "occupied": lambda i: True}
+    return setup, [[leave(f"U{i}", i)] for i in range(1, users + 1)]
+
+
+def scenario_change(users, rng):
+    """Every user opens 'Change desktop', picks a free desktop and confirms."""
+    setup = {"count": users * 2, "occupied": lambda i: i <= users}
+    return setup, [change(f"U{i}", users + i) for i in range(1, users + 1)]
+
+
+def scenario_mixed(users, rng):
+    """Half the users occupy a desktop and leave or change it, the other half look for one and claim it."""
+    count = users * 2
+    setup = {"count": count, "occupied": lambda i: i <= users and i % 2 == 0}
+    journeys = []
+    for i in range(1, users + 1):
+        user_id = f"U{i}"
+        if i % 2 == 0:
+            if rng.random() < 0.5:
+                journeys.append([list_desktops(user_id), leave(user_id, i)])
+            else:
+                new_desktop = rng.randrange(users + 1, count + 1)
+                journeys.append([list_desktops(user_id), *change(user_id, new_desktop)])
+        else:
+            new_desktop = rng.randrange(users + 1, count + 1)
+            journeys.append([list_desktops(user_id), claim(user_id, new_desktop)])
+    return setup, journeys
+
+
+SCENARIOS = {
+    "desktop": scenario_desktop,
+    "claim": scenario_claim,
+    "claim_contended": scenario_claim_contended,
+    "leave": scenario_leave,
+    "change": scenario_change,
+    "mixed": scenario_mixed,
+}
+
+
+def expects_reply(body):
+    """
+    Tells whether the bot answers a payload with a message in the user's channel.
+    """
+    if body.get("type") == "block_suggestion":
+        return False
+    if body.get("type") == "block_actions":
+        return body["actions"][0]["action_id"] != "new_desktop_selection"
+    return True
+
+
+def user_of(body):
+    return body.get("user_id") or body["user"]["id"]
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def at(share):
+        return round(ordered[min(int(len(ordered) * share), len(ordered) - 1)], 2)
+
+    return {
+        "p50": round(statistics.median(ordered), 2),
+        "p90": at(0.90),
+        "p99": at(0.99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class Harness:
+    """
+    Drives journeys through the app and collects the measurements of one scenario.
+
+    Args:
+        app (App): The Bolt app under test.
+        stub (StubSlack): The stub Web API the app talks to.
+        concurrency (int): How many journeys run at once.
+        think_time (float): The pause after an interaction Slack gets no reply for, in seconds.
+        db_latency (float): The delay added to every SQL statement, in seconds.
+    """
+
+    def __init__(self, app, stub, concurrency, think_time, db_latency=0.0):
+        from sqlalchemy import event
+
+        from desktop_dispatcher.session import get_engine
+
+        self.app = app
+        self.stub = stub
+        self.concurrency = concurrency
+        self.think_time = think_time
+        self.db_latency = db_latency
+        self.queries = 0
+        self._lock = threading.Lock()
+        event.listen(get_engine(), "before_cursor_execute", self._count_query)
+
+    def run(self, journeys):
+        from slack_bolt.request import BoltRequest
+
+        from desktop_dispatcher.notifications import dispatcher
+
+        ack_ms, e2e_ms = [], []
+        outcomes = Counter()
+
+        def run_journey(steps):
+            for body, replied in steps:
+                started_at = time.perf_counter()
+                self.app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+                ack_ms.append((time.perf_counter() - started_at) * 1000)
+                if not replied:
+                    time.sleep(self.think_time)
+                    continue
+                reply = self.stub.wait_for_reply(dm_channel(user_of(body)), started_at)
+                if reply is None:
+                    outcome = "timeouts"
+                else:
+                    arrived_at, text = reply
+                    e2e_ms.append((arrived_at - started_at) * 1000)
+                    outcome = "errors" if text.startswith(ERROR_PREFIX) else "ok"
+                with self._lock:
+                    outcomes[outcome] += 1
+
+        self.stub.reset()
+        self.queries = 0
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(run_journey, journeys))
+        elapsed = time.perf_counter() - started_at
+        # Channel notifications are posted in the background, let them finish for the call counts
+        deadline = time.monotonic() + 30
+        while dispatcher.queue_depth and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        interactions = sum(len(steps) for steps in journeys)
+        return {
+            "interactions": interactions,
+            "seconds": round(elapsed, 3),
+            "throughput": round(interactions / elapsed, 1),
+            "ack_ms": percentiles(ack_ms),
+            "e2e_ms": percentiles(e2e_ms),
+            "error_replies": outcomes["errors"],
+            "reply_timeouts": outcomes["timeouts"],
+            "db_queries": self.queries,
+            "db_queries_per_interaction": round(self.queries / interactions, 2),
+            "slack_calls": dict(sorted(self.stub.calls.items())),
+        }
+
+    def _count_query(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.queries += 1
+        if self.db_latency:
+            time.sleep(self.db_latency)
+
+
+def current_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    baseline = (baseline or {}).get("scenarios", {})
+    print(
+        f"{'scenario':<17}{'req/s':>8}{'ack p50':>9}{'ack p99':>9}"
+        f"{'e2e p50':>9}{'e2e p99':>9}{'db/req':>8}{'errors':>8}"
+    )
+    for name, result in results["scenarios"].items():
+        e2e = result["e2e_ms"] or {"p50": 0, "p99": 0}
+        print(
+            f"{name:<17}{result['throughput']:>8}{result['ack_ms']['p50']:>9}{result['ack_ms']['p99']:>9}"
+            f"{e2e['p50']:>9}{e2e['p99']:>9}{result['db_queries_per_interaction']:>8}{result['error_replies']:>8}"
+        )
+        previous = baseline.get(name)
+        if previous:
+            delta = (result["throughput"] - previous["throughput"]) / previous["throughput"] * 100
+            print(
+                f"{'  vs baseline':<17}{delta:>+7.1f}%"
+                f"{previous['ack_ms']['p50']:>9}{previous['ack_ms']['p99']:>9}"
+                f"{(previous['e2e_ms'] or {}).get('p50', 0):>9}{(previous['e2e_ms'] or {}).get('p99', 0):>9}"
+                f"{previous['db_queries_per_interaction']:>8}{previous['error_replies']:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20, help="journeys in flight at once")
+    parser.add_argument("--slack-latency", type=float, default=0.02, help="seconds per stub API call")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds added to every SQL statement")
+    parser.add_argument("--think-time", type=float, default=0.05, help="pause after an interaction without a reply")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="a previous results file to compare against")
+    parser.add_argument("--record", help="write the generated payloads to this JSON lines file")
+    parser.add_argument("--replay", help="drive the payloads of this JSON lines file instead of the scenarios")
+    args = parser.parse_args()
+
+    stub = StubSlack(latency=args.slack_latency).start()
+    configure(stub, args.database_url)
+
+    from desktop_dispatcher.cache import availability_cache
+    from desktop_dispatcher.events import create_app
+
+    harness = Harness(create_app(), stub, args.concurrency, args.think_time, args.db_latency)
+    results = {
+        "commit": current_commit(),
+        "measured_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "record")
+        },
+        "scenarios": {},
+    }
+
+    if args.replay:
+        with open(args.replay) as f:
+            bodies = [json.loads(line) for line in f if line.strip()]
+        seed_desktops(args.users * 2)
+        availability_cache.invalidate()
+        journeys = [[(body, expects_reply(body))] for body in bodies]
+        results["scenarios"]["replay"] = harness.run(journeys)
+    else:
+        recorded = []
+        for name in args.scenarios:
+            setup, journeys = SCENARIOS[name](args.users, random.Random(args.seed))
+            seed_desktops(setup["count"], name_of=desktop_name, occupied=setup["occupied"])
+            availability_cache.invalidate()
+            results["scenarios"][name] = harness.run(journeys)
+            recorded += [body for steps in journeys for body, _ in steps]
+        if args.record:
+            with open(args.record, "w") as f:
+                f.writelines(json.dumps(body) + "\n" for body in recorded)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
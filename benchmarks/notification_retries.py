@@ -0,0 +1,150 @@
+"""
+Checks the retries of the channel notifications against the stub Slack API.
+
+Each check runs a fresh :class:`~desktop_dispatcher.notifications.NotificationDispatcher`
+against :class:`~benchmarks.stub_slack.StubSlack`, which fails ``chat.postMessage``
+as scripted and records when every attempt arrived:
+
+- retries: a message that keeps failing with 503 is attempted exactly
+  ``max_retries + 1`` times and then dropped, and the next one is delivered;
+- rate limit: after a 429 the next attempt waits for the ``Retry-After``
+  interval, far longer than the backoff it would otherwise use;
+- backoff: after successive 503s the gaps between attempts double from
+  ``--backoff-base``;
+- shutdown: everything queued before :meth:`shutdown`, including messages
+  that are being retried, reaches the channel, each exactly once.
+
+Gaps are measured between the attempts the stub received, and may exceed the
+expected delay by at most ``--tolerance`` seconds. The script exits non-zero on
+the first failed check.
+
+Usage:
+    python -m benchmarks.notification_retries --backoff-base 0.1 --retry-after 1
+"""
+import argparse
+import json
+import sys
+
+from .environment import configure
+from .stub_slack import StubSlack
+
+METHOD = "chat.postMessage"
+
+
+def dispatcher(stub, **options):
+    from desktop_dispatcher.notifications import NotificationDispatcher
+    from desktop_dispatcher.utils import ChannelResolver, slack_client
+
+    return NotificationDispatcher(slack_client, ChannelResolver(slack_client), stub.channel_name, **options)
+
+
+def deliver(stub, notifier, message):
+    """
+    Sends one message and waits until the dispatcher is done with it; reset the stub beforehand.
+
+    Returns:
+        list[float]: The gaps between the attempts the stub received, in seconds.
+    """
+    notifier.enqueue(message)
+    notifier.shutdown(timeout=60)
+    times = stub.call_times.get(METHOD, [])
+    return [later - earlier for earlier, later in zip(times, times[1:])]
+
+
+def check_gaps(name, gaps, expected, tolerance):
+    if len(gaps) != len(expected) or any(
+        not delay <= gap <= delay + tolerance for gap, delay in zip(gaps, expected)
+    ):
+        return f"{name}: gaps {[round(gap, 3) for gap in gaps]}, expected {expected} (+{tolerance})"
+    return None
+
+
+def retries_check(stub, args):
+    notifier = dispatcher(stub, max_retries=args.max_retries, backoff_base=0.01)
+    stub.reset()
+    stub.fail_next(METHOD, 503, count=args.max_retries + 1)
+    attempts = len(deliver(stub, notifier, "given up")) + 1
+    delivered = stub.notifications
+    stub.reset()
+    deliver(stub, notifier, "after giving up")
+    if attempts != args.max_retries + 1 or delivered or stub.notifications != 1:
+        return (
+            f"retries: {attempts} attempts of {args.max_retries + 1}, {delivered} delivered "
+            f"after giving up, {stub.notifications} of 1 delivered afterwards"
+        )
+    print(json.dumps({"check": "retries", "max_retries": args.max_retries, "attempts": attempts}))
+    return None
+
+
+def rate_limit_check(stub, args):
+    notifier = dispatcher(stub, backoff_base=args.backoff_base)
+    stub.reset()
+    stub.fail_next(METHOD, 429, headers={"Retry-After": str(args.retry_after)})
+    gaps = deliver(stub, notifier, "rate limited")
+    failure = check_gaps("rate limit", gaps, [args.retry_after], args.tolerance)
+    if failure or stub.notifications != 1:
+        return failure or f"rate limit: {stub.notifications} of 1 delivered"
+    print(json.dumps({"check": "rate_limit", "retry_after": args.retry_after, "waited": round(gaps[0], 3)}))
+    return None
+
+
+def backoff_check(stub, args):
+    failures = 4
+    notifier = dispatcher(stub, max_retries=failures, backoff_base=args.backoff_base, backoff_max=60)
+    stub.reset()
+    stub.fail_next(METHOD, 503, count=failures)
+    gaps = deliver(stub, notifier, "server errors")
+    expected = [args.backoff_base * 2**attempt for attempt in range(failures)]
+    failure = check_gaps("backoff", gaps, expected, args.tolerance)
+    if failure or stub.notifications != 1:
+        return failure or f"backoff: {stub.notifications} of 1 delivered"
+    print(json.dumps({"check": "backoff", "expected": expected, "waited": [round(gap, 3) for gap in gaps]}))
+    return None
+
+
+def shutdown_check(stub, args):
+    notifier = dispatcher(stub, workers=args.workers, backoff_base=args.backoff_base)
+    stub.reset()
+    stub.channel_messages.clear()
+    # Some of the first attempts fail, so messages are still being retried when shutdown begins
+    stub.fail_next(METHOD, 503, count=args.workers * 2)
+    sent = [f"queued {index}" for index in range(args.messages)]
+    for message in sent:
+        if not notifier.enqueue(message):
+            return f"shutdown: the queue refused {message!r}"
+    notifier.shutdown(timeout=60)
+    posted = sorted(message["text"] for message in stub.channel_messages.values())
+    if posted != sorted(sent) or notifier.queue_depth:
+        lost = sorted(set(sent) - set(posted))
+        return (
+            f"shutdown: {len(posted)} posted of {len(sent)}, lost {lost[:10]}, "
+            f"{notifier.queue_depth} still queued"
+        )
+    print(json.dumps({"check": "shutdown", "queued": len(sent), "delivered": len(posted), "workers": args.workers}))
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--backoff-base", type=float, default=0.1, help="first backoff delay in seconds")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After of the 429 in seconds")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="seconds a gap may exceed its delay")
+    parser.add_argument("--messages", type=int, default=200, help="messages queued before shutdown")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    stub = StubSlack(latency=0.002).start()
+    configure(stub=stub)
+    try:
+        for check in (retries_check, rate_limit_check, backoff_check, shutdown_check):
+            failure = check(stub, args)
+            if failure:
+                print(failure, file=sys.stderr)
+                sys.exit(1)
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
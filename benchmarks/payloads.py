@@ -0,0 +1,107 @@
+"""
+Builders for the Slack payloads the bot receives, shaped like Socket Mode deliveries.
+"""
+import itertools
+import os
+import time
+from urllib.parse import urljoin
+
+TEAM_ID = "T1"
+
+_trigger_ids = itertools.count(1)
+
+
+def dm_channel(user_id):
+    """
+    The ID of the direct message channel between the bot and a user, where replies go.
+    """
+    return f"D{user_id}"
+
+
+def response_url(user_id):
+    """
+    The ``response_url`` of an interaction, served by the stub Web API next to its ``/api/`` methods.
+    """
+    return urljoin(os.environ.get("SLACK_API_URL", "http://127.0.0.1/api/"), f"../response/{dm_channel(user_id)}")
+
+
+def _common(user_id):
+    return {
+        "team": {"id": TEAM_ID, "domain": "bench"},
+        "user": {"id": user_id, "name": user_id, "team_id": TEAM_ID},
+        "channel": {"id": dm_channel(user_id), "name": "directmessage"},
+        "trigger_id": f"{next(_trigger_ids)}.bench",
+        "api_app_id": "ABENCH",
+        "token": "bench",
+    }
+
+
+def slash_command(user_id, command="/desktop", text=""):
+    return {
+        "token": "bench",
+        "team_id": TEAM_ID,
+        "team_domain": "bench",
+        "channel_id": dm_channel(user_id),
+        "channel_name": "directmessage",
+        "user_id": user_id,
+        "user_name": user_id,
+        "command": command,
+        "text": text,
+        "api_app_id": "ABENCH",
+        "trigger_id": f"{next(_trigger_ids)}.bench",
+    }
+
+
+def block_action(user_id, action_id, value=None, selected=None, message_ts=None):
+    """
+    Args:
+        user_id (str): The user clicking.
+        action_id (str): The ``action_id`` of the element.
+        value (str): The button value.
+        selected (tuple): ``(value, text)`` of the chosen option for select menus.
+        message_ts (str): The ``ts`` of the message the element lives in; made up if not given,
+            since every button and menu the bot sends is in a message.
+    """
+    action = {
+        "action_id": action_id,
+        "block_id": "bench",
+        "action_ts": f"{time.time():.6f}",
+    }
+    if selected:
+        action["type"] = "static_select"
+        action["selected_option"] = {
+            "text": {"type": "plain_text", "text": selected[1]},
+            "value": str(selected[0]),
+        }
+    else:
+        action["type"] = "button"
+        action["value"] = str(value) if value is not None else None
+    message_ts = message_ts or f"{time.time():.6f}"
+    return {
+        "type": "block_actions",
+        "actions": [action],
+        "container": {
+            "type": "message",
+            "message_ts": message_ts,
+            "channel_id": dm_channel(user_id),
+        },
+        "message": {"ts": message_ts, "type": "message"},
+        "response_url": response_url(user_id),
+        **_common(user_id),
+    }
+
+
+def block_suggestion(user_id, action_id, value=""):
+    """
+    Args:
+        user_id (str): The user typing.
+        action_id (str): The ``action_id`` of the ``external_select``.
+        value (str): The text typed so far.
+    """
+    return {
+        "type": "block_suggestion",
+        "action_id": action_id,
+        "block_id": "bench",
+        "value": value,
+        **_common(user_id),
+    }
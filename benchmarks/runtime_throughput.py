@@ -0,0 +1,145 @@
+"""
+Compares interaction throughput of the sync (thread pool) and async (event loop) runtimes.
+
+Each run claims ``--users`` desktops concurrently, lists them with ``/desktop``
+and releases them again, against the stub Slack API with ``--slack-latency``
+seconds per call. Both runtimes get ``--concurrency`` interactions in flight:
+worker threads in sync mode, tasks on one event loop in async mode. SQLite
+serialises writers, so use ``--database-url`` with Postgres to compare the
+runtimes at high concurrency. The async mode needs an async driver for the database
+(aiosqlite for the default SQLite file, asyncpg for Postgres).
+
+Usage:
+    python -m benchmarks.runtime_throughput --users 200 --slack-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from .environment import configure, seed_desktops
+from .payloads import block_action, slash_command
+from .stub_slack import StubSlack
+
+
+def phases(users):
+    return [
+        [
+            block_action(f"U{i}", "desktop_selection", selected=(i, f"desktop-{i:05d}"))
+            for i in range(1, users + 1)
+        ],
+        [slash_command(f"U{i}") for i in range(1, users + 1)],
+        [block_action(f"U{i}", "leave_desktop", value=i) for i in range(1, users + 1)],
+    ]
+
+
+def run_sync(stub, users, concurrency):
+    from slack_bolt.request import BoltRequest
+
+    from desktop_dispatcher.events import create_app
+
+    app = create_app()
+
+    def dispatch(body):
+        app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+
+    # Like the Socket Mode client, hand each delivery to a thread of its own pool
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        dispatch(slash_command("UWARMUP"))
+        stub.wait_for_replies(1)
+        stub.reset()
+        started_at = time.perf_counter()
+        expected = 0
+        for bodies in phases(users):
+            list(executor.map(dispatch, bodies))
+            expected += len(bodies)
+            stub.wait_for_replies(expected)
+        return time.perf_counter() - started_at
+
+
+def run_async(stub, users, concurrency):
+    from slack_bolt.request.async_request import AsyncBoltRequest
+
+    from desktop_dispatcher.async_events import create_async_app
+
+    async_app = create_async_app()
+
+    async def run():
+        async_app.client.session = aiohttp.ClientSession()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def dispatch(body):
+            async with slots:
+                await async_app.async_dispatch(AsyncBoltRequest(body=body, mode="socket_mode"))
+
+        await async_app.async_dispatch(
+            AsyncBoltRequest(body=slash_command("UWARMUP"), mode="socket_mode")
+        )
+        while stub.replies < 1:
+            await asyncio.sleep(0.005)
+        stub.reset()
+        started_at = time.perf_counter()
+        expected = 0
+        for bodies in phases(users):
+            await asyncio.gather(*(dispatch(body) for body in bodies))
+            expected += len(bodies)
+            while stub.replies < expected:
+                await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - started_at
+        await async_app.client.session.close()
+        return elapsed
+
+    return asyncio.run(run())
+
+
+def run_mode(args):
+    stub = StubSlack(latency=args.slack_latency).start()
+    configure(stub, args.database_url)
+    # Keep the free list within Slack's 100 option limit once the users hold their desktops
+    seed_desktops(args.users + 50)
+    elapsed = (run_sync if args.mode == "sync" else run_async)(stub, args.users, args.concurrency)
+    interactions = args.users * 3
+    print(
+        json.dumps(
+            {
+                "mode": args.mode,
+                "interactions": interactions,
+                "seconds": round(elapsed, 3),
+                "per_second": round(interactions / elapsed, 1),
+                "slack_calls": dict(stub.calls),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--slack-latency", type=float, default=0.05)
+    parser.add_argument(
+        "--concurrency", type=int, default=10, help="interactions dispatched at once (threads or tasks)"
+    )
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    if args.mode != "both":
+        run_mode(args)
+        return
+    # Each runtime gets a fresh process so their clients, pools and caches don't interfere
+    for mode in ("sync", "async"):
+        command = [sys.executable, "-m", "benchmarks.runtime_throughput", "--mode", mode]
+        command += ["--users", str(args.users), "--slack-latency", str(args.slack_latency)]
+        command += ["--concurrency", str(args.concurrency)]
+        if args.database_url:
+            command += ["--database-url", args.database_url]
+        subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    main()
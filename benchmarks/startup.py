@@ -0,0 +1,130 @@
+"""
+Cold start cost of the bot: import time of the listeners and time to the first ack.
+
+Both are measured in fresh interpreters, ``--runs`` times each:
+
+- ``python -X importtime -c "import desktop_dispatcher.events"`` with an empty
+  environment, reporting the total and the slowest imports by their
+  cumulative time,
+- time to first ack: from starting a process until it has built the app
+  with :func:`desktop_dispatcher.events.create_app` and dispatched (and
+  acknowledged) a ``/desktop`` command against the stub Slack API, and until
+  the reply to it arrived. Connecting to Slack's Socket Mode endpoint is not
+  part of it.
+
+Usage:
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .environment import configure, seed_desktops
+from .payloads import dm_channel
+from .stub_slack import StubSlack
+
+TARGET = "desktop_dispatcher.events"
+
+
+def import_times():
+    """
+    Returns:
+        dict: Cumulative import time in ms by module, for one fresh interpreter.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={"PATH": os.environ.get("PATH", ""), "PYTHONPATH": os.getcwd()},
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative) / 1000
+    return times
+
+
+def child():
+    from slack_bolt.request import BoltRequest
+
+    from desktop_dispatcher.events import create_app
+
+    from .payloads import slash_command
+
+    app = create_app()
+    app.dispatch(BoltRequest(body=slash_command("U1"), mode="socket_mode"))
+    print("acked", flush=True)
+    # Stay up until the reply was posted from the processing pool
+    sys.stdin.read()
+
+
+def first_ack(stub):
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        env=dict(os.environ, METRICS_PORT="0"),
+    )
+    try:
+        if process.stdout.readline().strip() != "acked":
+            raise RuntimeError("the child process failed before its first ack")
+        acked = time.perf_counter() - started_at
+        reply = stub.wait_for_reply(dm_channel("U1"), started_at)
+        replied = reply[0] - started_at if reply else None
+    finally:
+        process.stdin.close()
+        process.wait()
+    return acked * 1000, replied * 1000 if replied else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--slack-latency", type=float, default=0.05)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    runs = [import_times() for _ in range(args.runs)]
+    totals = [times[TARGET] for times in runs]
+    median_run = sorted(runs, key=lambda times: times[TARGET])[len(runs) // 2]
+    slowest = sorted(
+        ((module, ms) for module, ms in median_run.items() if module != TARGET),
+        key=lambda item: -item[1],
+    )[: args.top]
+
+    stub = StubSlack(latency=args.slack_latency).start()
+    configure(stub)
+    seed_desktops(100)
+    acks, replies = zip(*(first_ack(stub) for _ in range(args.runs)))
+    stub.stop()
+
+    print(
+        json.dumps(
+            {
+                "import_ms": round(statistics.median(totals), 1),
+                "slowest_imports_ms": {module: round(ms, 1) for module, ms in slowest},
+                "first_ack_ms": round(statistics.median(acks), 1),
+                "first_reply_ms": round(statistics.median(r for r in replies if r), 1),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Slack calls of the channel notifications during a shift change: a message per change against the status board.
+
+Seeds ``--desktops`` desktops and replays ``--changes`` claims and releases
+spread over ``--seconds``, the way a shift change hits the bot, once with
+``NOTIFICATION_MODE=messages`` (one ``chat.postMessage`` each) and once with
+``NOTIFICATION_MODE=board`` (see :mod:`desktop_dispatcher.status_board`).
+Reported are the Slack calls per method, the board messages it took, and
+whether the pinned board ended up matching the desktop table. A second board
+run in a fresh :class:`~desktop_dispatcher.status_board.StatusBoard` checks
+that a restarted process finds and reuses the pinned messages.
+
+Usage:
+    python -m benchmarks.status_board --desktops 500 --changes 400 --seconds 10 --window 1
+"""
+import argparse
+import json
+import random
+import time
+
+from .environment import configure, seed_desktops
+from .stub_slack import StubSlack
+
+
+def shift_change(desktops, changes, seconds, seed, notify):
+    """
+    Claims free desktops and releases occupied ones at random, ``changes`` times over ``seconds``.
+    """
+    from desktop_dispatcher.cache import availability_cache
+
+    rng = random.Random(seed)
+    started_at = time.perf_counter()
+    for index in range(changes):
+        desktop = availability_cache.get(rng.randint(1, desktops))
+        user_id = None if desktop.user_id else f"U{rng.randint(1, 10 * desktops)}"
+        availability_cache.apply(desktop.id, desktop.name, user_id)
+        notify(f"🖥️  *{desktop.name}* changed")
+        delay = started_at + seconds * (index + 1) / changes - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def board_matches(stub):
+    from desktop_dispatcher.blocks import status_board_blocks
+    from desktop_dispatcher.cache import availability_cache
+
+    _, desktops = availability_cache.snapshot()
+    desktops.sort(key=lambda desktop: (desktop.name or "", desktop.id))
+    return [message["blocks"] for message in stub.pinned_messages()] == status_board_blocks(desktops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--desktops", type=int, default=500)
+    parser.add_argument("--changes", type=int, default=400)
+    parser.add_argument("--seconds", type=float, default=10.0, help="how long the shift change lasts")
+    parser.add_argument("--window", type=float, default=1.0, help="STATUS_BOARD_WINDOW")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    stub = StubSlack().start()
+    configure(stub, database_url=args.database_url)
+    seed_desktops(args.desktops, occupied=lambda i: i % 2 == 0)
+
+    from desktop_dispatcher import notifications
+    from desktop_dispatcher.status_board import StatusBoard, status_board
+    from desktop_dispatcher.utils import channel_resolver
+
+    channel_resolver.warm()
+    status_board.window = args.window
+
+    for mode in ("messages", "board"):
+        notifications.notification_mode = mode
+        stub.reset()
+        started_at = time.perf_counter()
+        shift_change(args.desktops, args.changes, args.seconds, args.seed, notifications.notify_channel)
+        if mode == "messages":
+            notifications.dispatcher.shutdown(timeout=60)
+        else:
+            status_board.shutdown(timeout=60)
+        result = {
+            "mode": mode,
+            "changes": args.changes,
+            "seconds": round(time.perf_counter() - started_at, 2),
+            "slack_calls": dict(sorted(stub.calls.items())),
+        }
+        if mode == "board":
+            result["board_messages"] = len(stub.pinned_messages())
+            result["board_matches"] = board_matches(stub)
+            result["stats"] = status_board.stats()
+        print(json.dumps(result))
+
+    # A restarted process edits the pinned board instead of posting another
+    stub.reset()
+    restarted = StatusBoard(status_board.client, channel_resolver, status_board.channel_name)
+    restarted.flush()
+    print(
+        json.dumps(
+            {
+                "mode": "board_restarted",
+                "slack_calls": dict(sorted(stub.calls.items())),
+                "board_messages": len(stub.pinned_messages()),
+                "board_matches": board_matches(stub),
+            }
+        )
+    )
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+A local stand-in for the Slack Web API used by the benchmarks.
+
+Point the bot at it with ``SLACK_API_URL`` and every ``WebClient`` /
+``AsyncWebClient`` call lands here instead of slack.com. Each API method
+answers with a minimal successful payload after an optional artificial delay,
+and every ``rate_limit_every``-th call is rejected with HTTP 429 to exercise the
+retry paths; :meth:`StubSlack.fail_next` scripts other error answers. The
+``response_url`` of the payloads in :mod:`benchmarks.payloads` points here
+too (``/response/<channel>``) and is counted as the ``response_url`` method.
+Calls are counted and timed per method, and the
+replies to users, whether posted, updated with ``chat.update`` or sent to a
+``response_url``, are logged per channel with the time they arrived and their
+text (that of the first block for messages sent with blocks only). The
+messages of the notification channel are kept, with ``chat.update``,
+``chat.delete`` and pins applied to them.
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BOT_USER_ID = "UBOT"
+NOTIFICATION_CHANNEL_ID = "CNOTIFY"
+
+
+def _reply_text(params):
+    if params.get("text"):
+        return params["text"]
+    blocks = params.get("blocks") or []
+    if isinstance(blocks, str):
+        blocks = json.loads(blocks)
+    for block in blocks:
+        text = block.get("text") or (block.get("elements") or [{}])[0].get("text")
+        if isinstance(text, dict):
+            text = text.get("text")
+        if isinstance(text, str) and text:
+            return text
+    return ""
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under load, which shows up as 1s SYN retries
+    request_queue_size = 128
+
+
+class StubSlack:
+    """
+    Runs the stub Web API on a background thread.
+
+    Args:
+        channel_name (str): The name reported for the notification channel.
+        latency (float): Seconds each call waits before answering.
+        rate_limit_every (int): Answer every n-th call with 429, 0 to disable.
+    """
+
+    def __init__(self, channel_name="general", latency=0.0, rate_limit_every=0):
+        self.channel_name = channel_name
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = Counter()
+        # method -> time.perf_counter() of every call, answered or not
+        self.call_times = {}
+        self.replies = 0
+        self.notifications = 0
+        self.reply_log = {}
+        # ts -> message posted to the notification channel, and the pinned ones
+        self.channel_messages = {}
+        self.pins = set()
+        self._lock = threading.Lock()
+        self._replied = threading.Condition(self._lock)
+        self._total = 0
+        # method -> (status, headers) of the error answers still to give
+        self._failures = {}
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/api/"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.call_times = {}
+            self._failures = {}
+            self.replies = 0
+            self.notifications = 0
+            self.reply_log = {}
+
+    def fail_next(self, method, status, count=1, headers=None):
+        """
+        Answers the next ``count`` calls of ``method`` with HTTP ``status`` instead of handling them.
+
+        Args:
+            method (str): The API method, e.g. ``chat.postMessage``.
+            status (int): The HTTP status, e.g. 429 or 503.
+            count (int): How many calls fail.
+            headers (dict): Headers of the error answers, e.g. ``Retry-After``.
+        """
+        with self._lock:
+            self._failures.setdefault(method, []).extend([(status, headers or {})] * count)
+
+    def pinned_messages(self):
+        """
+        Returns the pinned messages of the notification channel, oldest first.
+        """
+        with self._lock:
+            return [self.channel_messages[ts] for ts in sorted(self.pins) if ts in self.channel_messages]
+
+    def wait_for_replies(self, count, timeout=120.0):
+        """
+        Blocks until ``count`` replies reached channels other than the notification channel.
+        """
+        deadline = time.monotonic() + timeout
+        while self.replies < count:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Only {self.replies} of {count} replies arrived")
+            time.sleep(0.005)
+
+    def wait_for_reply(self, channel, since, timeout=30.0):
+        """
+        Waits for a reply in ``channel`` at or after the ``time.perf_counter()`` value ``since``.
+
+        Returns:
+            tuple: ``(arrived_at, text)`` of the first such message, or None on timeout.
+        """
+        deadline = time.perf_counter() + timeout
+        with self._replied:
+            while True:
+                for arrived_at, text in self.reply_log.get(channel, ()):
+                    if arrived_at >= since:
+                        return arrived_at, text
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self._replied.wait(remaining)
+
+    def _record(self, method, params):
+        """
+        Counts a call.
+
+        Returns:
+            tuple: The ``(status, payload, headers)`` of the error answer to give, or None.
+        """
+        with self._lock:
+            self._total += 1
+            self.calls[method] += 1
+            self.call_times.setdefault(method, []).append(time.perf_counter())
+            failures = self._failures.get(method)
+            if failures:
+                status, headers = failures.pop(0)
+                self.calls[str(status)] += 1
+                error = "ratelimited" if status == 429 else "internal_error"
+                return status, {"ok": False, "error": error}, headers
+            if self.rate_limit_every and self._total % self.rate_limit_every == 0:
+                self.calls["429"] += 1
+                return 429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "1"}
+            if method in ("chat.postMessage", "chat.update", "response_url"):
+                if params.get("channel") == NOTIFICATION_CHANNEL_ID:
+                    self.notifications += 1
+                else:
+                    self.replies += 1
+                    self.reply_log.setdefault(params.get("channel"), []).append(
+                        (time.perf_counter(), _reply_text(params))
+                    )
+                    self._replied.notify_all()
+        return None
+
+    def _answer(self, method, params):
+        if method == "auth.test":
+            return {"ok": True, "user_id": BOT_USER_ID, "bot_id": "BBOT", "team_id": "T1"}
+        if method == "users.conversations":
+            return {
+                "ok": True,
+                "channels": [{"id": NOTIFICATION_CHANNEL_ID, "name": self.channel_name}],
+                "response_metadata": {"next_cursor": ""},
+            }
+        if params.get("channel") == NOTIFICATION_CHANNEL_ID:
+            return self._channel_answer(method, params)
+        if method in ("chat.postMessage", "chat.update"):
+            return {"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"}
+        return {"ok": True}
+
+    def _channel_answer(self, method, params):
+        blocks = params.get("blocks")
+        if isinstance(blocks, str):
+            blocks = json.loads(blocks)
+        with self._lock:
+            if method == "chat.postMessage":
+                ts = f"{time.time():.6f}"
+                while ts in self.channel_messages:
+                    ts = f"{float(ts) + 0.000001:.6f}"
+                self.channel_messages[ts] = {"ts": ts, "text": params.get("text"), "blocks": blocks}
+                return {"ok": True, "channel": NOTIFICATION_CHANNEL_ID, "ts": ts}
+            ts = params.get("ts") or params.get("timestamp")
+            if method in ("chat.update", "chat.delete", "pins.add") and ts not in self.channel_messages:
+                return {"ok": False, "error": "message_not_found"}
+            if method == "chat.update":
+                self.channel_messages[ts].update(text=params.get("text"), blocks=blocks)
+            elif method == "chat.delete":
+                del self.channel_messages[ts]
+                self.pins.discard(ts)
+            elif method == "pins.add":
+                self.pins.add(ts)
+            elif method == "pins.list":
+                items = [
+                    {"type": "message", "message": self.channel_messages[ts]}
+                    for ts in sorted(self.pins)
+                ]
+                return {"ok": True, "items": items}
+            return {"ok": True, "channel": NOTIFICATION_CHANNEL_ID, "ts": ts}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.do_POST()
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode() if length else ""
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(raw or "{}")
+                else:
+                    params = {key: values[0] for key, values in parse_qs(raw).items()}
+                params.update({key: values[0] for key, values in parse_qs(url.query).items()})
+                method = url.path.rsplit("/", 1)[-1]
+                if url.path.startswith("/response/"):
+                    params.setdefault("channel", method)
+                    method = "response_url"
+                if stub.latency:
+                    time.sleep(stub.latency)
+                failure = stub._record(method, params)
+                if failure:
+                    self._send(*failure)
+                else:
+                    self._send(200, stub._answer(method, params))
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,170 @@
+"""
+Cost of the occupancy log and of ``/desktop-stats`` as the history grows.
+
+Against a temporary SQLite database (or ``--database-url``) it measures:
+
+- writes per second of :class:`desktop_dispatcher.occupancy.OccupancyLog`
+  against one INSERT per event, as the listeners would do without it,
+- the rollup of ``--days`` days of synthetic history (claims and releases of
+  ``--desktops`` desktops during office hours), in hours processed per second,
+- the latency of the 7 day report, read from the rollups, against computing
+  the same figures by scanning the events of those 7 days.
+
+Usage:
+    python -m benchmarks.usage_rollup --desktops 200 --days 30 90
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from .environment import configure, seed_desktops
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def synthetic_events(desktops, days):
+    """
+    Yields the events of a desktop claimed every morning and some afternoons, in time order per day.
+    """
+    random_ = random.Random(7)
+    for day in range(days):
+        midnight = START + timedelta(days=day)
+        events = []
+        for desktop_id in range(1, desktops + 1):
+            at = midnight + timedelta(hours=8, minutes=random_.randint(0, 120))
+            for _ in range(random_.randint(1, 3)):
+                user_id = f"U{random_.randint(1, desktops)}"
+                release = at + timedelta(minutes=random_.randint(30, 240))
+                events.append((at, desktop_id, user_id, "claim"))
+                events.append((release, desktop_id, user_id, "release"))
+                at = release + timedelta(minutes=random_.randint(5, 60))
+        events.sort()
+        yield [
+            {"desktop_id": desktop_id, "user_id": user_id, "kind": kind, "occurred_at": at}
+            for at, desktop_id, user_id, kind in events
+        ]
+
+
+def reset(engine):
+    from sqlalchemy import delete
+
+    from desktop_dispatcher.models import DesktopUsage, OccupancyEvent, OpenOccupancy, UsageRollupProgress
+
+    with engine.begin() as conn:
+        for model in (OccupancyEvent, DesktopUsage, OpenOccupancy, UsageRollupProgress):
+            conn.execute(delete(model))
+
+
+def time_writes(engine, events):
+    from sqlalchemy import insert
+
+    from desktop_dispatcher.models import OccupancyEvent
+    from desktop_dispatcher.occupancy import OccupancyLog
+    from desktop_dispatcher.session import session_scope
+
+    reset(engine)
+    started_at = time.perf_counter()
+    for event in events:
+        with session_scope() as session:
+            session.execute(insert(OccupancyEvent), [event])
+    single = len(events) / (time.perf_counter() - started_at)
+
+    reset(engine)
+    log = OccupancyLog()
+    started_at = time.perf_counter()
+    for event in events:
+        log.record(event["desktop_id"], event["user_id"], event["kind"])
+    log.shutdown(timeout=60)
+    batched = len(events) / (time.perf_counter() - started_at)
+    return {"single_insert_per_second": round(single), "batched_per_second": round(batched)}
+
+
+def scan_report(session, since, until):
+    # What /desktop-stats would cost without the rollups: replay every event of the period
+    from sqlalchemy import select
+
+    from desktop_dispatcher.models import OccupancyEvent
+
+    seconds, claims, open_since = {}, {}, {}
+    events = session.execute(
+        select(OccupancyEvent.desktop_id, OccupancyEvent.kind, OccupancyEvent.occurred_at)
+        .where(OccupancyEvent.occurred_at >= since, OccupancyEvent.occurred_at < until)
+        .order_by(OccupancyEvent.occurred_at)
+    )
+    for desktop_id, kind, occurred_at in events:
+        if kind == "claim":
+            open_since[desktop_id] = occurred_at
+            claims[desktop_id] = claims.get(desktop_id, 0) + 1
+        elif desktop_id in open_since:
+            occupied = (occurred_at - open_since.pop(desktop_id)).total_seconds()
+            seconds[desktop_id] = seconds.get(desktop_id, 0.0) + occupied
+    return seconds, claims
+
+
+def run(days, args, engine):
+    from sqlalchemy import insert
+
+    from desktop_dispatcher.models import OccupancyEvent
+    from desktop_dispatcher.occupancy import UsageRollup, usage_report
+    from desktop_dispatcher.session import session_scope
+
+    reset(engine)
+    count = 0
+    for batch in synthetic_events(args.desktops, days):
+        with engine.begin() as conn:
+            conn.execute(insert(OccupancyEvent), batch)
+        count += len(batch)
+
+    now = START + timedelta(days=days)
+    rollup = UsageRollup(lag=0)
+    started_at = time.perf_counter()
+    hours = rollup.run(now=now)
+    rollup_seconds = time.perf_counter() - started_at
+
+    report_ms, scan_ms = [], []
+    for _ in range(args.iterations):
+        with session_scope() as session:
+            started_at = time.perf_counter()
+            report = usage_report(session, days=7, now=now - timedelta(seconds=1))
+            report_ms.append((time.perf_counter() - started_at) * 1000)
+            started_at = time.perf_counter()
+            scan_report(session, now - timedelta(days=7), now)
+            scan_ms.append((time.perf_counter() - started_at) * 1000)
+
+    return {
+        "days": days,
+        "events": count,
+        "hours_rolled_up": hours,
+        "rollup_hours_per_second": round(hours / rollup_seconds, 1),
+        "report_claims": report.claims,
+        "report_p50_ms": round(statistics.median(report_ms), 2),
+        "event_scan_p50_ms": round(statistics.median(scan_ms), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--desktops", type=int, default=200)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90])
+    parser.add_argument("--writes", type=int, default=5000, help="events for the write benchmark")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    configure(database_url=args.database_url)
+    seed_desktops(args.desktops)
+
+    from desktop_dispatcher.session import get_engine
+
+    engine = get_engine()
+    events = [event for batch in synthetic_events(args.desktops, 30) for event in batch]
+    print(json.dumps(time_writes(engine, events[: args.writes])))
+    for days in args.days:
+        print(json.dumps(run(days, args, engine)))
+
+
+if __name__ == "__main__":
+    main()
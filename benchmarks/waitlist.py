@@ -0,0 +1,175 @@
+"""
+Database and Slack load while users wait for a desktop, polling ``/desktop`` against the waitlist (:mod:`desktop_dispatcher.waitlist`).
+
+All ``--desktops`` desktops start occupied and ``--waiters`` users want one.
+Every ``--release-every`` seconds an occupant leaves, until as many desktops
+were freed as there are waiters (or every occupant left, if there are more
+waiters than desktops). This runs twice:
+
+- ``polling``: each waiter runs ``/desktop`` every ``--poll`` seconds and, when
+  the list shows free desktops, picks one of them at random, the way users
+  without a waitlist do;
+- ``waitlist``: each waiter runs ``/desktop`` once, presses 'Notify me' and
+  waits for the direct message handing a desktop over.
+
+Reported are the database statements, the ``/desktop`` commands, the claims
+tried and lost, the Slack calls, and the time each waiter waited for a
+desktop, from the start of the run.
+
+Usage:
+    python -m benchmarks.waitlist --desktops 200 --waiters 100 --release-every 0.1 --poll 2
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .environment import configure, seed_desktops
+from .interaction_dedup import StatementCounter
+from .load_test import ERROR_PREFIX, claim, leave, percentiles
+from .payloads import block_action, dm_channel, slash_command
+from .stub_slack import StubSlack
+
+NO_FREE_PREFIX = "🔴"
+
+
+def run(app, stub, statements, mode, args):
+    from slack_bolt.request import BoltRequest
+    from sqlalchemy import delete
+
+    from desktop_dispatcher.cache import availability_cache
+    from desktop_dispatcher.models import WaitlistEntry
+    from desktop_dispatcher.processing import processing_runner
+    from desktop_dispatcher.session import session_scope
+    from desktop_dispatcher.waitlist import waitlist
+
+    seed_desktops(args.desktops, occupied=lambda i: True)
+    with session_scope() as session:
+        session.execute(delete(WaitlistEntry))
+    availability_cache.invalidate()
+    waitlist.counters.clear()
+    rng = random.Random(args.seed)
+    stub.reset()
+    statements.count = 0
+    counts = Counter()
+    waited = []
+    lock = threading.Lock()
+    started_at = time.perf_counter()
+    deadline = started_at + args.timeout
+
+    def dispatch(body):
+        sent_at = time.perf_counter()
+        app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+        return stub.wait_for_reply(dm_channel(body.get("user_id") or body["user"]["id"]), sent_at)
+
+    def count(counter):
+        with lock:
+            counts[counter] += 1
+
+    def try_claim(user_id):
+        free = availability_cache.free_desktops()
+        if not free:
+            return False
+        count("claims")
+        reply = dispatch(claim(user_id, rng.choice(free).id)[0])
+        if reply is None or reply[1].startswith(ERROR_PREFIX):
+            count("claims_lost")
+            return False
+        return True
+
+    def poll(user_id):
+        while time.perf_counter() < deadline:
+            polled_at = time.perf_counter()
+            count("desktop_commands")
+            reply = dispatch(slash_command(user_id))
+            if reply and not reply[1].startswith(NO_FREE_PREFIX) and try_claim(user_id):
+                return True
+            time.sleep(max(polled_at + args.poll - time.perf_counter(), 0))
+        return False
+
+    def wait_on_list(user_id):
+        while time.perf_counter() < deadline:
+            count("desktop_commands")
+            reply = dispatch(slash_command(user_id))
+            if reply and not reply[1].startswith(NO_FREE_PREFIX):
+                if try_claim(user_id):
+                    return True
+                continue
+            joined_at = time.perf_counter()
+            reply = dispatch(block_action(user_id, "join_waitlist"))
+            if reply and reply[1].startswith("🕒"):
+                return stub.wait_for_reply(user_id, joined_at, timeout=max(deadline - time.perf_counter(), 0)) is not None
+            # A desktop was freed meanwhile, so the list came back instead
+            if try_claim(user_id):
+                return True
+        return False
+
+    def wait(index):
+        user_id = f"U{args.desktops + index}"
+        served = (poll if mode == "polling" else wait_on_list)(user_id)
+        with lock:
+            if served:
+                waited.append((time.perf_counter() - started_at) * 1000)
+            else:
+                counts["not_served"] += 1
+
+    def release():
+        for desktop_id in range(1, min(args.desktops, args.waiters) + 1):
+            time.sleep(args.release_every)
+            dispatch(leave(f"U{desktop_id}", desktop_id)[0])
+
+    releaser = threading.Thread(target=release, daemon=True)
+    releaser.start()
+    with ThreadPoolExecutor(max_workers=args.waiters) as executor:
+        list(executor.map(wait, range(1, args.waiters + 1)))
+    releaser.join()
+    while processing_runner.backlog and time.perf_counter() < deadline:
+        time.sleep(0.05)
+
+    return {
+        "seconds": round(time.perf_counter() - started_at, 2),
+        "served": len(waited),
+        **dict(sorted(counts.items())),
+        "db_statements": statements.count,
+        "slack_calls": dict(sorted(stub.calls.items())),
+        "waited_ms": percentiles(waited),
+        "waitlist_stats": waitlist.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--desktops", type=int, default=200)
+    parser.add_argument("--waiters", type=int, default=100)
+    parser.add_argument("--release-every", type=float, default=0.1, help="seconds between two occupants leaving")
+    parser.add_argument("--poll", type=float, default=2.0, help="seconds between two /desktop of a polling user")
+    parser.add_argument("--cache-ttl", type=float, default=1.0, help="AVAILABILITY_CACHE_TTL")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds after which the waiters give up")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="SQLAlchemy URL, defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    stub = StubSlack().start()
+    configure(stub, database_url=args.database_url)
+    # Polling users would otherwise be refused by the default /desktop limit
+    os.environ["ADMISSION_USER_LIMITS"] = ""
+
+    from desktop_dispatcher.cache import availability_cache
+    from desktop_dispatcher.events import create_app
+    from desktop_dispatcher.session import get_engine
+
+    availability_cache.ttl = args.cache_ttl
+    app = create_app()
+    statements = StatementCounter(get_engine())
+
+    for mode in ("polling", "waitlist"):
+        print(json.dumps({"mode": mode, **run(app, stub, statements, mode, args)}))
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
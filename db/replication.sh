@@ -0,0 +1,3 @@
+#!/bin/sh
+# Lets the db-replica service of compose-dev.yaml stream the WAL; runs on the first start of an empty volume
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,73 @@
+"""
+Admin commands run against the bot's database, next to the :mod:`desktop_dispatcher.main` entry point.
+
+Usage:
+    python -m desktop_dispatcher.admin import-desktops desktops.csv [--keep-missing] [--dry-run]
+    python -m desktop_dispatcher.admin export-desktops desktops.jsonl
+
+Files ending in ``.jsonl`` or ``.ndjson`` are JSON lines, anything else CSV;
+``--format`` overrides that, and ``-`` reads stdin or writes stdout.
+"""
+import argparse
+import json
+import sys
+
+from .config import load_config
+
+
+def import_desktops(args):
+    from .inventory import import_inventory
+
+    stats = import_inventory(
+        args.file,
+        format=args.format,
+        delete_missing=not args.keep_missing,
+        dry_run=args.dry_run,
+    )
+    print(json.dumps({**stats, "dry_run": args.dry_run}), file=sys.stderr)
+
+
+def export_desktops(args):
+    from .inventory import export_inventory
+
+    count = export_inventory(args.file, format=args.format)
+    print(json.dumps({"rows": count}), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m desktop_dispatcher.admin")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importing = commands.add_parser(
+        "import-desktops",
+        help="make the desktop table match an inventory file, in one transaction",
+    )
+    importing.add_argument("file", help="CSV with a name and optional id column, or JSON lines; - for stdin")
+    importing.add_argument(
+        "--keep-missing",
+        action="store_true",
+        help="do not delete desktops missing from the file (occupied ones never are)",
+    )
+    importing.add_argument("--dry-run", action="store_true", help="report the changes and roll them back")
+    importing.set_defaults(run=import_desktops)
+
+    exporting = commands.add_parser("export-desktops", help="write every desktop to an inventory file")
+    exporting.add_argument("file", help="- for stdout")
+    exporting.set_defaults(run=export_desktops)
+
+    for command in (importing, exporting):
+        command.add_argument("--format", choices=("csv", "jsonl"), help="default: from the file name")
+
+    args = parser.parse_args(argv)
+    load_config("admin")
+
+    from .inventory import InventoryError
+
+    try:
+        args.run(args)
+    except InventoryError as e:
+        parser.exit(1, f"{args.file}: {str(e)}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Admission control: token buckets per user and for the whole app, per command and per ``action_id``.
+
+A few users pressing ``/desktop`` or 'Change desktop' over and over during
+contention make every press cost a processing thread, the availability
+queries once the snapshot is stale, and a message to Slack.
+:func:`admission_middleware` runs before the listeners and refuses the
+requests that exceed their bucket. A refused slash command is acked with a
+fixed ephemeral reply, which costs no Web API call. A refused click gets the
+same reply through its ``response_url`` once it is acked, from the
+processing pool, at most once per ``ADMISSION_NOTICE_INTERVAL`` seconds per
+user; further refused clicks are only acked. Neither touches the database.
+
+The limits are lists of ``name=per_minute:burst`` entries, where ``name`` is
+a slash command or an ``action_id`` and ``*`` covers the names without an
+entry of their own, which then share one bucket:
+
+- ``ADMISSION_USER_LIMITS``: per user, e.g. ``/desktop=12:4,*=120:20``
+- ``ADMISSION_GLOBAL_LIMITS``: for all users together, empty (unlimited) by default
+
+A bucket holds up to ``burst`` requests and refills at ``per_minute``. Type-ahead
+queries of the dropdowns are never limited.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+from slack_bolt.response import BoltResponse
+
+from .metrics import ADMISSION_REJECTIONS
+from .processing import processing_runner
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_REJECTED = "⏳  Too many requests. Please wait a few seconds and try again."
+
+# Built once: a refusal is answered from this payload, with no rendering and no lookups
+_REJECTED_ACK = {"response_type": "ephemeral", "text": ADMISSION_REJECTED}
+
+Rejection = namedtuple("Rejection", ["scope", "name", "notify"])
+
+# Refusal notices in flight on the event loop, referenced until they are sent
+_notices = set()
+
+
+def parse_limits(spec):
+    """
+    Parses a list of limits.
+
+    Args:
+        spec (str): Comma-separated ``name=per_minute:burst`` entries.
+
+    Returns:
+        dict: ``(per_second, burst)`` by command, ``action_id`` or ``*``.
+    """
+    limits = {}
+    for entry in filter(None, (entry.strip() for entry in spec.split(","))):
+        try:
+            name, _, limit = entry.rpartition("=")
+            per_minute, _, burst = limit.partition(":")
+            if not name:
+                raise ValueError("no name")
+            limits[name] = (float(per_minute) / 60, float(burst or 1))
+        except ValueError as e:
+            logger.error(f"Ignoring the admission limit {entry}: {str(e)}")
+    return limits
+
+
+def request_name(body):
+    """
+    Returns the slash command or ``action_id`` a request is limited by, None for requests never limited.
+    """
+    if body.get("command"):
+        return body["command"]
+    if body.get("type") == "block_actions" and body.get("actions"):
+        return body["actions"][0]["action_id"]
+    return None
+
+
+class TokenBucket:
+    """
+    Holds up to ``burst`` tokens and refills at ``rate`` tokens per second.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at", "notified_at")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+        self.notified_at = float("-inf")
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class AdmissionController:
+    """
+    Admits or refuses requests against per-user and global token buckets.
+
+    A request is admitted only if both its user's bucket and the global
+    bucket hold a token, and then takes one from each. The user buckets are
+    kept for the ``max_users`` most recently seen user and name pairs; an
+    evicted bucket starts full again.
+
+    Args:
+        user_limits (dict): The per-user limits from :func:`parse_limits`.
+        global_limits (dict): The limits shared by all users from :func:`parse_limits`.
+        max_users (int): The maximum number of user buckets kept.
+        notice_interval (float): The minimum time between two refusal notices to a user, in seconds.
+    """
+
+    def __init__(self, user_limits, global_limits, max_users=10000, notice_interval=10.0):
+        self.user_limits = user_limits
+        self.global_limits = global_limits
+        self.max_users = max_users
+        self.notice_interval = notice_interval
+        self.counters = Counter()
+        self._user_buckets = OrderedDict()
+        self._global_buckets = {}
+        self._lock = threading.Lock()
+
+    def admit(self, user_id, name):
+        """
+        Takes a token for a request, if its buckets allow it.
+
+        Args:
+            user_id (str): The Slack ID of the user.
+            name (str): The slash command or ``action_id``.
+
+        Returns:
+            Rejection: Why the request is refused and whether to tell the user, or None if it is admitted.
+        """
+        user_key = _bucket_key(self.user_limits, name)
+        global_key = _bucket_key(self.global_limits, name)
+        if user_key is None and global_key is None:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            user_bucket = self._user_bucket(user_id, user_key, now) if user_key else None
+            global_bucket = self._global_bucket(global_key, now) if global_key else None
+            scope = (
+                "user" if user_bucket and user_bucket.tokens < 1
+                else "global" if global_bucket and global_bucket.tokens < 1
+                else None
+            )
+            if scope is None:
+                for bucket in (user_bucket, global_bucket):
+                    if bucket:
+                        bucket.tokens -= 1
+                self.counters["admitted"] += 1
+                return None
+            self.counters[f"rejected_{scope}"] += 1
+            notify = False
+            if user_bucket and now - user_bucket.notified_at >= self.notice_interval:
+                user_bucket.notified_at = now
+                notify = True
+            return Rejection(scope, name, notify)
+
+    def stats(self):
+        """
+        Returns the admitted and rejected counters and the number of user buckets.
+        """
+        with self._lock:
+            return {**self.counters, "user_buckets": len(self._user_buckets)}
+
+    def _user_bucket(self, user_id, key, now):
+        bucket = self._user_buckets.get((user_id, key))
+        if bucket is None:
+            bucket = self._user_buckets[(user_id, key)] = TokenBucket(*self.user_limits[key], now)
+            while len(self._user_buckets) > self.max_users:
+                self._user_buckets.popitem(last=False)
+        else:
+            self._user_buckets.move_to_end((user_id, key))
+            bucket.refill(now)
+        return bucket
+
+    def _global_bucket(self, key, now):
+        bucket = self._global_buckets.get(key)
+        if bucket is None:
+            bucket = self._global_buckets[key] = TokenBucket(*self.global_limits[key], now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+
+def _bucket_key(limits, name):
+    if name in limits:
+        return name
+    return "*" if "*" in limits else None
+
+
+admission_controller = AdmissionController(
+    parse_limits(os.getenv("ADMISSION_USER_LIMITS", "/desktop=12:4,change_desktop=12:4,*=120:20")),
+    parse_limits(os.getenv("ADMISSION_GLOBAL_LIMITS", "")),
+    max_users=int(os.getenv("ADMISSION_MAX_USERS", "10000")),
+    notice_interval=float(os.getenv("ADMISSION_NOTICE_INTERVAL", "10")),
+)
+
+
+def _check(body):
+    name = request_name(body)
+    if name is None:
+        return None
+    user_id = body.get("user_id") or body["user"]["id"]
+    rejection = admission_controller.admit(user_id, name)
+    if rejection is not None:
+        ADMISSION_REJECTIONS.labels(rejection.scope, name).inc()
+    return rejection
+
+
+def _notify_rejected(respond):
+    try:
+        respond(text=ADMISSION_REJECTED, response_type="ephemeral", replace_original=False)
+    except Exception as e:
+        logger.warning(f"Could not tell a user their request was refused: {str(e)}")
+
+
+async def _notify_rejected_async(respond):
+    try:
+        await respond(text=ADMISSION_REJECTED, response_type="ephemeral", replace_original=False)
+    except Exception as e:
+        logger.warning(f"Could not tell a user their request was refused: {str(e)}")
+
+
+def admission_middleware(req, body, respond, next):
+    """
+    Bolt global middleware acking the requests over their limit without running their listener.
+    """
+    rejection = _check(body)
+    if rejection is None:
+        next()
+        return
+    if body.get("command"):
+        return BoltResponse(status=200, body=_REJECTED_ACK)
+    if rejection.notify and respond is not None:
+        # Sent after the ack, a slow response_url must not delay it into a redelivery
+        notice = req.to_copyable()
+        # Not a processed request, keep it out of the processing latency
+        notice.context.pop("metrics_started_at", None)
+        processing_runner.start(_notify_rejected, notice)
+    return BoltResponse(status=200, body="")
+
+
+async def async_admission_middleware(body, respond, next):
+    """
+    AsyncApp version of :func:`admission_middleware`.
+    """
+    rejection = _check(body)
+    if rejection is None:
+        await next()
+        return
+    if body.get("command"):
+        return BoltResponse(status=200, body=_REJECTED_ACK)
+    if rejection.notify and respond is not None:
+        task = asyncio.create_task(_notify_rejected_async(respond))
+        _notices.add(task)
+        task.add_done_callback(_notices.discard)
+    return BoltResponse(status=200, body="")
@@ -0,0 +1,367 @@
+"""
+asyncio versions of the listeners in :mod:`desktop_dispatcher.events`.
+
+Every listener awaits the database and the Slack Web API instead of blocking a
+Bolt worker thread, so thousands of in-flight interactions can share one event
+loop. Run with ``DISPATCHER_MODE=async``.
+"""
+import logging
+
+from slack_bolt.async_app import AsyncApp
+
+from .admission import async_admission_middleware
+from .async_metrics import instrument_async_app
+from .async_notifications import async_slack_client, notify_channel
+from .async_session import async_session_scope
+from .blocks import (
+    MAX_STATIC_OPTIONS,
+    change_desktop_blocks,
+    desktop_selection_blocks,
+    no_free_desktop_blocks,
+    occupied_desktop_blocks,
+    suggested_options,
+    waitlisted_blocks,
+)
+from .cache import availability_cache
+from .dedup import async_dedup_middleware
+from .breaker import DatabaseUnavailable
+from .events import (
+    DATABASE_UNAVAILABLE,
+    SELECTION_NOT_STORED,
+    _desktop_name,
+    lease_end,
+    with_stale_notice,
+)
+from .messages import message_updater_async
+from .occupancy import CLAIM, RELEASE, format_usage_report, occupancy_log, usage_report_async
+from .repository import (
+    claim_desktop_async,
+    release_desktop_async,
+    renew_lease_async,
+    swap_desktop_async,
+)
+from .search import desktop_search
+from .selections import pending_selections
+from .waitlist import waitlist
+
+logger = logging.getLogger(__name__)
+
+
+async def list_of_desktops(ack, body, say):
+    """
+    Async version of :func:`desktop_dispatcher.events.list_of_desktops`.
+    """
+    await ack()
+    try:
+        user_id = body["user_id"]
+        await availability_cache.refresh_async()
+        free_desktops = availability_cache.free_desktops()
+        occupied_desktop = availability_cache.desktop_of(user_id)
+
+        if occupied_desktop:
+            await say(blocks=with_stale_notice(occupied_desktop_blocks(occupied_desktop)))
+        elif free_desktops:
+            await say(blocks=with_stale_notice(desktop_selection_blocks(free_desktops)))
+        else:
+            await say(blocks=with_stale_notice(no_free_desktop_blocks()))
+    except DatabaseUnavailable:
+        await say(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred: {str(e)}")
+        await say("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_desktop_selection(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_desktop_selection`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    desktop_id = body["actions"][0]["selected_option"]["value"]
+    user_id = body["user"]["id"]
+
+    try:
+        async with async_session_scope(user_id=user_id) as session:
+            desktop = await claim_desktop_async(session, desktop_id, user_id)
+
+        if desktop:
+            availability_cache.apply(desktop.id, desktop.name, user_id)
+            occupancy_log.record(desktop.id, user_id, CLAIM)
+            await reply(blocks=occupied_desktop_blocks(desktop))
+            await notify_channel(f"🖥️    *<@{user_id}>* is now using {desktop.name}")
+        else:
+            await reply("⛔  The selected desktop is no longer available. Please pick another one with /desktop.")
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while processing selection: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_leave_desktop(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_leave_desktop`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    desktop_id = body["actions"][0]["value"]
+    user_id = body["user"]["id"]
+
+    try:
+        async with async_session_scope(user_id=user_id) as session:
+            desktop = await release_desktop_async(session, desktop_id, user_id)
+
+        if desktop:
+            availability_cache.apply(desktop.id, desktop.name, None)
+            occupancy_log.record(desktop.id, user_id, RELEASE)
+            await reply(f"⚪  You left: *{desktop.name}*")
+            await notify_channel(f"⚪  *<@{user_id}>* left *{desktop.name}*")
+            await waitlist.offer_async(desktop.id, released_by=user_id)
+        else:
+            await reply("⛔  You are not currently occupying this desktop.")
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while processing leave request: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_renew_lease(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_renew_lease`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    desktop_id = body["actions"][0]["value"]
+    user_id = body["user"]["id"]
+
+    try:
+        async with async_session_scope(user_id=user_id) as session:
+            desktop = await renew_lease_async(session, desktop_id, user_id)
+
+        if desktop:
+            await reply(blocks=occupied_desktop_blocks(desktop, until=lease_end(desktop.expires_at)))
+        else:
+            await reply("⛔  You are not currently occupying this desktop.")
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while renewing lease: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_join_waitlist(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_join_waitlist`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    user_id = body["user"]["id"]
+
+    try:
+        await availability_cache.refresh_async()
+        occupied_desktop = availability_cache.desktop_of(user_id)
+        free_desktops = availability_cache.free_desktops()
+
+        if occupied_desktop:
+            await reply(blocks=occupied_desktop_blocks(occupied_desktop))
+        elif free_desktops:
+            await reply(blocks=with_stale_notice(desktop_selection_blocks(free_desktops)))
+        else:
+            await reply(blocks=waitlisted_blocks(await waitlist.join_async(user_id)))
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while joining the waitlist: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_leave_waitlist(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_leave_waitlist`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    user_id = body["user"]["id"]
+
+    try:
+        if await waitlist.leave_async(user_id):
+            await reply("⚪  You left the waitlist.")
+        else:
+            await reply("⛔  You are not on the waitlist.")
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while leaving the waitlist: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_new_desktop_selection(ack, body, respond):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_new_desktop_selection`.
+    """
+    await ack()
+    selected_desktop_id = body["actions"][0]["selected_option"]["value"]
+    user_id = body["user"]["id"]
+
+    try:
+        await pending_selections.put_async(user_id, selected_desktop_id)
+    except Exception as e:
+        logger.error(f"An error occurred while storing a desktop selection: {str(e)}")
+        await respond(
+            text=SELECTION_NOT_STORED, response_type="ephemeral", replace_original=False
+        )
+
+
+async def handle_confirm_desktop_change(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_confirm_desktop_change`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    user_id = body["user"]["id"]
+
+    try:
+        new_desktop_id = await pending_selections.pop_async(user_id)
+        if not new_desktop_id:
+            await reply("⛔  No desktop selected. Please start over with /desktop.")
+            return
+
+        async with async_session_scope(user_id=user_id) as session:
+            desktop = await swap_desktop_async(session, user_id, new_desktop_id)
+
+        if not desktop:
+            await reply("⛔  The selected desktop is no longer available. Please pick another one with /desktop.")
+            return
+
+        if desktop.previous_id:
+            availability_cache.apply(desktop.previous_id, desktop.previous_name, None)
+            occupancy_log.record(desktop.previous_id, user_id, RELEASE)
+        availability_cache.apply(desktop.id, desktop.name, user_id)
+        occupancy_log.record(desktop.id, user_id, CLAIM)
+
+        if desktop.previous_name:
+            await reply(f"🟢  You changed {desktop.previous_name} -> *{desktop.name}*")
+            await notify_channel(f"🖥️  *<@{user_id}>* changed desktop from *{desktop.previous_name}* -> *{desktop.name}*")
+        else:
+            await reply(f"🟢  You are using *{desktop.name}*")
+            await notify_channel(f"🖥️    *<@{user_id}>* is now using {desktop.name}")
+
+        if desktop.previous_id:
+            await waitlist.offer_async(desktop.previous_id, released_by=user_id)
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while changing desktop: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_cancel_desktop_change(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_cancel_desktop_change`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    user_id = body["user"]["id"]
+
+    try:
+        await pending_selections.discard_async(user_id)
+
+        # Back to the message the change started from
+        await availability_cache.refresh_async()
+        current_desktop = availability_cache.desktop_of(user_id)
+        if current_desktop:
+            await reply(blocks=occupied_desktop_blocks(current_desktop))
+        else:
+            await reply("⛔  Desktop change cancelled.")
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while cancelling desktop change: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_change_desktop(ack, body, say, respond, client):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_change_desktop`.
+    """
+    await ack()
+    reply = message_updater_async(body, respond, client, say)
+    user_id = body["user"]["id"]
+
+    try:
+        await availability_cache.refresh_async()
+        current_desktop = availability_cache.desktop_of(user_id)
+
+        if not current_desktop:
+            await reply("⛔  You are not currently using any desktop.")
+            return
+
+        available_desktops = availability_cache.free_desktops()
+        await reply(blocks=with_stale_notice(change_desktop_blocks(current_desktop, available_desktops)))
+
+    except DatabaseUnavailable:
+        await reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while processing change desktop request: {str(e)}")
+        await reply("⛔  An error occurred. Please contact maintainer.")
+
+
+async def handle_desktop_search(ack, body):
+    """
+    Async version of :func:`desktop_dispatcher.events.handle_desktop_search`.
+    """
+    try:
+        await availability_cache.refresh_async()
+        desktops = desktop_search.search(body.get("value", ""), limit=MAX_STATIC_OPTIONS)
+        await ack(options=suggested_options(desktops))
+    except Exception as e:
+        logger.error(f"An error occurred while searching desktops: {str(e)}")
+        await ack(options=[])
+
+
+async def desktop_stats(ack, body, say):
+    """
+    Async version of :func:`desktop_dispatcher.events.desktop_stats`.
+    """
+    await ack()
+    try:
+        text = body.get("text", "").strip()
+        days = min(max(int(text), 1), 366) if text.isdigit() else 7
+        async with async_session_scope(read_only=True, user_id=body["user_id"]) as session:
+            report = await usage_report_async(session, days)
+        await availability_cache.refresh_async()
+        await say(format_usage_report(report, _desktop_name, len(availability_cache.snapshot()[1])))
+    except DatabaseUnavailable:
+        await say(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while reporting desktop usage: {str(e)}")
+        await say("⛔  An error occurred. Please contact maintainer.")
+
+
+def create_async_app():
+    """
+    Async version of :func:`desktop_dispatcher.events.create_app`.
+
+    Returns:
+        AsyncApp: The app to hand to the AsyncSocketModeHandler.
+    """
+    app = AsyncApp(client=async_slack_client)
+    app.middleware(async_dedup_middleware)
+    app.middleware(async_admission_middleware)
+    instrument_async_app(app)
+
+    app.command("/desktop")(list_of_desktops)
+    app.command("/desktop-stats")(desktop_stats)
+    app.action("desktop_selection")(handle_desktop_selection)
+    app.action("leave_desktop")(handle_leave_desktop)
+    app.action("renew_lease")(handle_renew_lease)
+    app.action("new_desktop_selection")(handle_new_desktop_selection)
+    app.action("confirm_desktop_change")(handle_confirm_desktop_change)
+    app.action("cancel_desktop_change")(handle_cancel_desktop_change)
+    app.action("change_desktop")(handle_change_desktop)
+    app.action("join_waitlist")(handle_join_waitlist)
+    app.action("leave_waitlist")(handle_leave_waitlist)
+    app.options("desktop_selection")(handle_desktop_search)
+    app.options("new_desktop_selection")(handle_desktop_search)
+    return app
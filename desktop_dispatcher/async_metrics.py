@@ -0,0 +1,72 @@
+"""
+asyncio versions of the Slack client and listener instrumentation in :mod:`desktop_dispatcher.metrics`.
+
+Kept apart so the synchronous runtime never imports aiohttp.
+"""
+import time
+
+from slack_bolt.context.say.async_say import AsyncSay
+from slack_bolt.listener.async_listener_completion_handler import AsyncListenerCompletionHandler
+from slack_sdk.web.async_client import AsyncWebClient
+
+from .metrics import SLACK_API_SECONDS, record_listener, record_slack_error
+
+
+class InstrumentedAsyncWebClient(AsyncWebClient):
+    """
+    AsyncWebClient version of :class:`desktop_dispatcher.metrics.InstrumentedWebClient`.
+    """
+
+    @classmethod
+    def wrap(cls, client):
+        """
+        Returns an instrumented client with the same token, settings and HTTP session as ``client``.
+        """
+        return cls(
+            token=client.token,
+            base_url=client.base_url,
+            timeout=client.timeout,
+            ssl=client.ssl,
+            proxy=client.proxy,
+            session=client.session,
+            trust_env_in_session=client.trust_env_in_session,
+            headers=client.headers,
+            team_id=client.default_params.get("team_id"),
+            retry_handlers=client.retry_handlers,
+        )
+
+    async def api_call(self, api_method, *args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await super().api_call(api_method, *args, **kwargs)
+        except Exception as e:
+            record_slack_error(api_method, e)
+            raise
+        finally:
+            SLACK_API_SECONDS.labels(api_method).observe(time.perf_counter() - started_at)
+
+
+async def async_listener_timing_middleware(context, next):
+    """
+    AsyncApp version of :func:`desktop_dispatcher.metrics.listener_timing_middleware`.
+    """
+    context["metrics_started_at"] = time.perf_counter()
+    context["client"] = InstrumentedAsyncWebClient.wrap(context.client)
+    context["say"] = AsyncSay(client=context.client, channel=context.channel_id)
+    await next()
+
+
+class _AsyncListenerTimer(AsyncListenerCompletionHandler):
+    async def handle(self, request, response):
+        record_listener(request.context, request.body, response)
+
+
+def instrument_async_app(app):
+    """
+    AsyncApp version of :func:`desktop_dispatcher.metrics.instrument_app`.
+
+    Args:
+        app (AsyncApp): The app to instrument.
+    """
+    app.middleware(async_listener_timing_middleware)
+    app.listener_runner.listener_completion_handler = _AsyncListenerTimer()
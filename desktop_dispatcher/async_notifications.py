@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+
+from slack_sdk.errors import SlackApiError
+
+from .async_metrics import InstrumentedAsyncWebClient
+from .notifications import is_channel_not_found, notification_mode, retry_delay
+from .utils import (
+    ChannelResolver,
+    channel_cache_ttl,
+    channel_miss_ttl,
+    notification_channel_name,
+    slack_api_url,
+)
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AsyncChannelResolver(ChannelResolver):
+    """
+    :class:`~desktop_dispatcher.utils.ChannelResolver` for an ``AsyncWebClient``.
+    """
+
+    def __init__(self, client, ttl=3600, page_size=200, negative_ttl=300):
+        super().__init__(client, ttl=ttl, page_size=page_size, negative_ttl=negative_ttl)
+        self._lock = asyncio.Lock()
+
+    async def warm(self):
+        async with self._lock:
+            await self._refresh()
+
+    async def resolve(self, channel_name):
+        async with self._lock:
+            if self._is_stale(channel_name):
+                await self._refresh()
+                self._note_miss(channel_name)
+            return self._channels.get(channel_name)
+
+    def invalidate(self, channel_name):
+        self._channels.pop(channel_name, None)
+
+    async def _refresh(self):
+        channels = {}
+        cursor = None
+        try:
+            while True:
+                response = await self.client.users_conversations(
+                    limit=self.page_size, exclude_archived=True, cursor=cursor
+                )
+                for channel in response["channels"]:
+                    channels[channel["name"]] = channel["id"]
+                cursor = response.get("response_metadata", {}).get("next_cursor")
+                if not cursor:
+                    break
+        except SlackApiError as e:
+            logger.error(f"Error fetching channels: {str(e)}")
+            return
+        self._store(channels)
+
+
+class AsyncNotificationDispatcher:
+    """
+    asyncio counterpart of :class:`~desktop_dispatcher.notifications.NotificationDispatcher`.
+
+    Uses an ``asyncio.Queue`` drained by worker tasks on the running event loop,
+    with the same retry rules for rate limits and transient errors.
+    """
+
+    def __init__(
+        self,
+        client,
+        resolver,
+        channel_name,
+        maxsize=1000,
+        workers=1,
+        max_retries=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+    ):
+        self.client = client
+        self.resolver = resolver
+        self.channel_name = channel_name
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue = None
+        self._tasks = []
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    def enqueue(self, message):
+        self.start()
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            logger.error(f"Notification queue is full, dropping message: {message}")
+            return False
+
+    async def shutdown(self, timeout=10.0):
+        tasks, self._tasks = self._tasks, []
+        for _ in tasks:
+            await self._queue.put(_STOP)
+        done, pending = await asyncio.wait(tasks, timeout=timeout) if tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        if self.queue_depth:
+            logger.error(f"{self.queue_depth} notifications were not delivered before shutdown")
+
+    async def _run(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                if message is _STOP:
+                    return
+                await self._deliver(message)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message):
+        for attempt in range(self.max_retries + 1):
+            channel_id = await self.resolver.resolve(self.channel_name)
+            if not channel_id:
+                logger.error(f"Channel {self.channel_name} not found.")
+                return
+            try:
+                await self.client.chat_postMessage(channel=channel_id, text=message)
+                return
+            except Exception as e:
+                if is_channel_not_found(e):
+                    self.resolver.invalidate(self.channel_name)
+                delay = retry_delay(e, attempt, self.backoff_base, self.backoff_max)
+            if delay is None:
+                return
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        logger.error(f"Giving up on notification after {self.max_retries} retries: {message}")
+
+
+async_slack_client = InstrumentedAsyncWebClient(
+    token=os.getenv("SLACK_BOT_TOKEN"), base_url=slack_api_url
+)
+async_channel_resolver = AsyncChannelResolver(
+    async_slack_client, ttl=channel_cache_ttl, negative_ttl=channel_miss_ttl
+)
+async_dispatcher = AsyncNotificationDispatcher(
+    async_slack_client,
+    async_channel_resolver,
+    notification_channel_name,
+    maxsize=int(os.getenv("NOTIFICATION_QUEUE_SIZE", "1000")),
+    workers=int(os.getenv("NOTIFICATION_WORKERS", "1")),
+    max_retries=int(os.getenv("NOTIFICATION_MAX_RETRIES", "5")),
+)
+
+
+async def notify_channel(message):
+    """
+    Queues a message for the notification channel on the running event loop,
+    or marks the status board as changed, see :func:`desktop_dispatcher.notifications.notify_channel`.
+
+    Args:
+        message (str): The message to send to the Slack channel.
+    """
+    if notification_mode == "board":
+        from .status_board import status_board
+
+        status_board.touch()
+        return
+    async_dispatcher.enqueue(message)
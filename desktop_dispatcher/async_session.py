@@ -0,0 +1,118 @@
+import os
+from contextlib import asynccontextmanager
+
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .breaker import database_breaker, replica_breaker
+from .metrics import instrument_engine
+from .session import (
+    RoutingSession,
+    connect_timeout,
+    database_url,
+    max_overflow,
+    note_write,
+    pool_pre_ping,
+    pool_recycle,
+    pool_size,
+    pool_timeout,
+    read_target,
+    replica_url,
+    statement_timeout_ms,
+)
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+_async_engine = None
+_async_replica_engine = None
+
+
+def get_async_engine():
+    """
+    Returns the async engine of the process, creating it on first use.
+
+    Only the event loop's thread uses it, so no lock is needed.
+
+    Returns:
+        AsyncEngine: The primary's engine, which every :func:`async_session_scope` session writes to.
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = _create_async_engine(
+            os.getenv("SQLALCHEMY_ASYNC_URL"), database_url(), "primary"
+        )
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+
+def get_async_replica_engine():
+    """
+    Returns the async engine of the read replica, creating it on first use.
+
+    Returns:
+        AsyncEngine: The engine read-only sessions run on, or None without a replica.
+    """
+    global _async_replica_engine
+    if _async_replica_engine is None and replica_url() is not None:
+        _async_replica_engine = _create_async_engine(
+            os.getenv("SQLALCHEMY_ASYNC_REPLICA_URL"), replica_url(), "replica"
+        )
+    return _async_replica_engine
+
+
+def _create_async_engine(async_url, db_url, target):
+    if async_url:
+        async_db_url = make_url(async_url)
+    else:
+        backend = db_url.get_backend_name()
+        async_db_url = db_url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+    if async_db_url.get_backend_name() == "postgresql":
+        engine_options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pool_recycle": pool_recycle,
+            "pool_pre_ping": pool_pre_ping,
+            "connect_args": {
+                "server_settings": {"statement_timeout": str(statement_timeout_ms)},
+                "timeout": connect_timeout,
+            },
+        }
+    else:
+        # aiosqlite (used by the benchmarks) runs on a NullPool
+        engine_options = {}
+
+    engine = create_async_engine(async_db_url, **engine_options)
+    instrument_engine(engine.sync_engine, target)
+    return engine
+
+
+AsyncSessionLocal = async_sessionmaker(sync_session_class=RoutingSession, autoflush=False)
+
+
+@asynccontextmanager
+async def async_session_scope(read_only=False, user_id=None):
+    """
+    Async counterpart of :func:`desktop_dispatcher.session.session_scope`.
+
+    Yields:
+        AsyncSession: A new session on :func:`get_async_engine` or :func:`get_async_replica_engine`.
+    """
+    engine = get_async_engine().sync_engine
+    replica = get_async_replica_engine()
+    target = read_target(user_id) if read_only else "primary"
+    info = {
+        "engines": {"primary": engine, "replica": replica.sync_engine if replica else engine},
+        "target": target,
+    }
+    with (replica_breaker if target == "replica" else database_breaker).guard():
+        async with AsyncSessionLocal(info=info) as session:
+            try:
+                yield session
+                await session.commit()
+                if session.info.get("wrote") and user_id is not None:
+                    note_write(user_id)
+            except Exception:
+                await session.rollback()
+                raise
@@ -0,0 +1,454 @@
+"""
+Block Kit messages rendered from precompiled plain-dict templates.
+
+Each layout is described once with the SDK model objects, which validates it,
+and compiled into dicts at import time. Rendering only rebuilds the parts of
+the tree that hold a variable field; everything else is shared between
+messages, so the dicts returned here must not be mutated.
+"""
+import os
+import string
+
+from slack_sdk.models.blocks import (
+    ButtonElement,
+    ContextBlock,
+    DividerBlock,
+    ExternalDataSelectElement,
+    MarkdownTextObject,
+    Option,
+    PlainTextObject,
+    SectionBlock,
+    StaticSelectElement,
+)
+
+# Slack rejects static selects with more options than this
+MAX_STATIC_OPTIONS = 100
+# ... and messages with more blocks, or section texts longer, than these
+MAX_MESSAGE_BLOCKS = 50
+MAX_SECTION_TEXT = 3000
+
+# static: every free desktop in the message; external: type-ahead through the
+# options listeners; auto: static up to MAX_STATIC_OPTIONS free desktops
+select_mode = os.getenv("DESKTOP_SELECT_MODE", "auto")
+
+_formatter = string.Formatter()
+
+
+class Slot:
+    """
+    A template field that is replaced by a whole value, such as the options array.
+
+    Args:
+        name (str): The keyword argument of :meth:`Template.render` that fills the slot.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _Dynamic:
+    def __init__(self, value):
+        self.value = value
+
+
+class Template:
+    """
+    A message layout compiled into plain dicts.
+
+    Strings may contain ``str.format`` fields and any value may be a :class:`Slot`.
+
+    Args:
+        layout: The dicts and lists making up the message.
+    """
+
+    def __init__(self, layout):
+        self._root = _compile(layout)
+
+    def render(self, **values):
+        """
+        Fills in the variable fields.
+
+        Returns:
+            The rendered layout; static parts are shared with other renders.
+        """
+        return _fill(self._root, values)
+
+
+def _compile(node):
+    if isinstance(node, Slot):
+        return _Dynamic(node)
+    if isinstance(node, str):
+        if any(field for _, field, _, _ in _formatter.parse(node)):
+            return _Dynamic(node)
+        return node
+    if isinstance(node, dict):
+        compiled = {key: _compile(value) for key, value in node.items()}
+        if any(isinstance(value, _Dynamic) for value in compiled.values()):
+            return _Dynamic(compiled)
+        return node
+    if isinstance(node, list):
+        compiled = [_compile(value) for value in node]
+        if any(isinstance(value, _Dynamic) for value in compiled):
+            return _Dynamic(compiled)
+        return node
+    return node
+
+
+def _fill(node, values):
+    if not isinstance(node, _Dynamic):
+        return node
+    value = node.value
+    if isinstance(value, Slot):
+        return values[value.name]
+    if isinstance(value, str):
+        return value.format_map(values)
+    if isinstance(value, dict):
+        return {key: _fill(item, values) for key, item in value.items()}
+    return [_fill(item, values) for item in value]
+
+
+_OPTION_LAYOUT = Option(text=PlainTextObject(text="{name}"), value="{id}")
+
+
+def _select(action_id, placeholder):
+    element = StaticSelectElement(
+        placeholder=PlainTextObject(text=placeholder),
+        options=[_OPTION_LAYOUT],
+        action_id=action_id,
+    ).to_dict()
+    element["options"] = Slot("options")
+    return element
+
+
+_DIVIDER = DividerBlock().to_dict()
+
+_OPTION = Template(_OPTION_LAYOUT.to_dict())
+
+
+def _occupied_desktop_layout(text):
+    return [
+        SectionBlock(text=text).to_dict(),
+        {
+            "type": "actions",
+            "elements": [
+                ButtonElement(text="Change desktop", action_id="change_desktop").to_dict(),
+                ButtonElement(text="Still using", action_id="renew_lease", value="{id}").to_dict(),
+                ButtonElement(
+                    text="Leave",
+                    action_id="leave_desktop",
+                    value="{id}",
+                    style="danger",
+                ).to_dict(),
+            ],
+        },
+        _DIVIDER,
+    ]
+
+
+_OCCUPIED_DESKTOP = Template(_occupied_desktop_layout("🟢  You are using *{name}*"))
+_OCCUPIED_DESKTOP_UNTIL = Template(_occupied_desktop_layout("🟢  You are using *{name}* until {until}"))
+_HANDED_OVER = Template(
+    _occupied_desktop_layout("🟢  *{name}* was freed and you were next on the waitlist, so it is yours now")
+)
+
+_NO_FREE_DESKTOPS = Template(
+    [
+        SectionBlock(text="🔴  All desktops are taken right now").to_dict(),
+        {
+            "type": "actions",
+            "elements": [
+                ButtonElement(text="Notify me", action_id="join_waitlist", style="primary").to_dict(),
+            ],
+        },
+        _DIVIDER,
+    ]
+)
+_WAITLISTED = Template(
+    [
+        SectionBlock(
+            text="🕒  You are number {position} on the waitlist. "
+            "The next desktop that is freed will be yours, and I will send you a message."
+        ).to_dict(),
+        {
+            "type": "actions",
+            "elements": [
+                ButtonElement(text="Leave the waitlist", action_id="leave_waitlist").to_dict(),
+            ],
+        },
+        _DIVIDER,
+    ]
+)
+
+
+def _external_select(action_id, placeholder):
+    return ExternalDataSelectElement(
+        placeholder=PlainTextObject(text=placeholder),
+        action_id=action_id,
+        min_query_length=0,
+    ).to_dict()
+
+
+def _desktop_selection_layout(select):
+    return [
+        _DIVIDER,
+        SectionBlock(text="⚪  You're not using any desktop").to_dict(),
+        {"type": "actions", "elements": [select]},
+        _DIVIDER,
+    ]
+
+
+def _change_desktop_layout(select):
+    return [
+        SectionBlock(text="🟢  You are currently using *{name}*").to_dict(),
+        {
+            "type": "actions",
+            "elements": [
+                select,
+                ButtonElement(
+                    text="Change",
+                    action_id="confirm_desktop_change",
+                    style="primary",
+                ).to_dict(),
+                ButtonElement(text="Cancel", action_id="cancel_desktop_change").to_dict(),
+            ],
+        },
+        _DIVIDER,
+    ]
+
+
+_DESKTOP_SELECTION = Template(
+    _desktop_selection_layout(_select("desktop_selection", "Select desktop"))
+)
+_DESKTOP_SELECTION_EXTERNAL = Template(
+    _desktop_selection_layout(_external_select("desktop_selection", "Search desktops"))
+)
+
+_CHANGE_DESKTOP = Template(
+    _change_desktop_layout(_select("new_desktop_selection", "Select new desktop"))
+)
+_CHANGE_DESKTOP_EXTERNAL = Template(
+    _change_desktop_layout(_external_select("new_desktop_selection", "Search new desktop"))
+)
+
+_STALE_NOTICE = Template(
+    [
+        ContextBlock(
+            elements=[
+                MarkdownTextObject(
+                    text="⚠️  The desktop database is not responding. This is the list as of {as_of}, "
+                    "and desktops cannot be claimed until it is back."
+                )
+            ]
+        ).to_dict()
+    ]
+)
+
+_STATUS_BOARD_HEADER = Template(
+    [
+        SectionBlock(
+            text="🖥️  *Desktops*{page}  ·  {occupied} of {total} in use",
+            block_id="{block_id}",
+        ).to_dict(),
+        _DIVIDER,
+    ]
+)
+_STATUS_BOARD_SECTION = Template(SectionBlock(text="{lines}").to_dict())
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _board_sections(desktops):
+    lines, length = [], 0
+    for desktop in desktops:
+        if desktop.user_id is None:
+            line = f"⚪  {_escape(desktop.name)}"
+        else:
+            line = f"🟢  *{_escape(desktop.name)}*  <@{desktop.user_id}>"
+        if lines and length + 1 + len(line) > MAX_SECTION_TEXT:
+            yield "\n".join(lines)
+            lines, length = [], 0
+        lines.append(line)
+        length += len(line) + 1
+    if lines:
+        yield "\n".join(lines)
+
+# The free-desktop list the options were last built for, and those options
+_options_cache = (None, [])
+
+
+def desktop_options(desktops):
+    """
+    Builds the dropdown options for a list of desktops.
+
+    The result is cached for the list object it was built from; the
+    availability cache hands out the same list until the free desktops change.
+
+    Args:
+        desktops (list): Desktops with ``id`` and ``name`` attributes.
+
+    Returns:
+        list[dict]: One option per desktop.
+    """
+    global _options_cache
+    cached_for, options = _options_cache
+    if cached_for is not desktops:
+        options = suggested_options(desktops)
+        _options_cache = (desktops, options)
+    return options
+
+
+def suggested_options(desktops):
+    """
+    Builds the options answering an ``external_select`` query, without caching them.
+
+    Args:
+        desktops (list): Desktops with ``id`` and ``name`` attributes.
+
+    Returns:
+        list[dict]: One option per desktop.
+    """
+    return [_OPTION.render(id=desktop.id, name=desktop.name) for desktop in desktops]
+
+
+def _use_external_select(free_desktops):
+    if select_mode == "auto":
+        return len(free_desktops) > MAX_STATIC_OPTIONS
+    return select_mode == "external"
+
+
+def occupied_desktop_blocks(desktop, until=None):
+    """
+    Builds the message for a user who occupies a desktop, with 'Change desktop',
+    'Still using' (renews the lease) and 'Leave' buttons.
+
+    Args:
+        desktop: The occupied desktop, with ``id`` and ``name`` attributes.
+        until (str): When the lease ends, in mrkdwn, to show after a renewal.
+
+    Returns:
+        list[dict]: The message blocks.
+    """
+    if until:
+        return _OCCUPIED_DESKTOP_UNTIL.render(id=desktop.id, name=desktop.name, until=until)
+    return _OCCUPIED_DESKTOP.render(id=desktop.id, name=desktop.name)
+
+
+def handed_over_blocks(desktop):
+    """
+    Builds the message telling a user on the waitlist that a freed desktop is now theirs,
+    with the buttons of :func:`occupied_desktop_blocks`.
+
+    Args:
+        desktop: The desktop handed over, with ``id`` and ``name`` attributes.
+
+    Returns:
+        list[dict]: The message blocks.
+    """
+    return _HANDED_OVER.render(id=desktop.id, name=desktop.name)
+
+
+def no_free_desktop_blocks():
+    """
+    Builds the message for a user without a desktop when none is free, with a 'Notify me' button.
+
+    Returns:
+        list[dict]: The message blocks.
+    """
+    return _NO_FREE_DESKTOPS.render()
+
+
+def waitlisted_blocks(position):
+    """
+    Builds the message for a user on the waitlist, with a 'Leave the waitlist' button.
+
+    Args:
+        position (int): The user's place in the queue, from 1.
+
+    Returns:
+        list[dict]: The message blocks.
+    """
+    return _WAITLISTED.render(position=position)
+
+
+def desktop_selection_blocks(free_desktops):
+    """
+    Builds the message for a user without a desktop, with a dropdown of free desktops.
+
+    The dropdown lists the free desktops, or searches them as the user types
+    when ``DESKTOP_SELECT_MODE`` asks for an ``external_select``.
+
+    Args:
+        free_desktops (list): The free desktops, with ``id`` and ``name`` attributes.
+
+    Returns:
+        list[dict]: The message blocks.
+    """
+    if _use_external_select(free_desktops):
+        return _DESKTOP_SELECTION_EXTERNAL.render()
+    return _DESKTOP_SELECTION.render(
+        options=desktop_options(free_desktops)[:MAX_STATIC_OPTIONS]
+    )
+
+
+def change_desktop_blocks(current_desktop, free_desktops):
+    """
+    Builds the message for changing desktop, with a dropdown of free desktops and 'Change'/'Cancel' buttons.
+
+    Args:
+        current_desktop: The desktop the user occupies, with a ``name`` attribute.
+        free_desktops (list): The free desktops, with ``id`` and ``name`` attributes.
+
+    Returns:
+        list[dict]: The message blocks.
+    """
+    if _use_external_select(free_desktops):
+        return _CHANGE_DESKTOP_EXTERNAL.render(name=current_desktop.name)
+    return _CHANGE_DESKTOP.render(
+        name=current_desktop.name,
+        options=desktop_options(free_desktops)[:MAX_STATIC_OPTIONS],
+    )
+
+
+def stale_notice_blocks(as_of):
+    """
+    Builds the notice shown above a desktop list taken from the last-known-good snapshot.
+
+    Args:
+        as_of (str): When the snapshot was last loaded, in mrkdwn.
+
+    Returns:
+        list[dict]: The blocks to put first in the message.
+    """
+    return _STALE_NOTICE.render(as_of=as_of)
+
+
+def status_board_blocks(desktops, block_id="status_board"):
+    """
+    Builds the status board: every desktop and its occupant, split over as
+    many messages as Slack's block limits require.
+
+    Args:
+        desktops (list): Desktops with ``id``, ``name`` and ``user_id`` attributes, in board order.
+        block_id (str): The prefix of the ``block_id`` of each message's first block,
+            followed by ``:`` and the index of the message.
+
+    Returns:
+        list[list[dict]]: The blocks of each message, at least one.
+    """
+    sections = [_STATUS_BOARD_SECTION.render(lines=lines) for lines in _board_sections(desktops)]
+    per_message = MAX_MESSAGE_BLOCKS - 2
+    shards = [sections[start : start + per_message] for start in range(0, len(sections), per_message)]
+    shards = shards or [[]]
+    occupied = sum(1 for desktop in desktops if desktop.user_id is not None)
+    return [
+        _STATUS_BOARD_HEADER.render(
+            block_id=f"{block_id}:{index}",
+            page=f" ({index + 1}/{len(shards)})" if len(shards) > 1 else "",
+            occupied=occupied,
+            total=len(desktops),
+        )
+        + shard
+        for index, shard in enumerate(shards)
+    ]
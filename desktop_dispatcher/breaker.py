@@ -0,0 +1,162 @@
+"""
+A circuit breaker around database access.
+
+When Postgres stalls, every listener would otherwise wait out a pool checkout
+and a statement timeout before failing, and the processing threads fill up
+with requests that cannot succeed. :data:`database_breaker` counts
+consecutive database calls that failed with a connection or timeout error, or
+took longer than ``DB_BREAKER_SLOW_SECONDS``. After ``DB_BREAKER_FAILURES``
+of them it opens and :func:`desktop_dispatcher.session.session_scope` raises
+:class:`DatabaseUnavailable` at once, without touching the pool. After
+``DB_BREAKER_RESET_SECONDS`` one call is let through to probe the database; it
+closes the breaker if it succeeds and opens it again if it does not.
+
+The read replica has a breaker of its own, :data:`replica_breaker`; while it
+is open the read-only sessions go to the primary.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from .metrics import BREAKER_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors that say the database is down or too slow, rather than that a query is wrong
+OUTAGE_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, TimeoutError, OSError)
+
+
+class DatabaseUnavailable(Exception):
+    """
+    Raised instead of running a database call while the breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails database calls fast after repeated failures, until the database recovers.
+
+    Args:
+        name (str): The resource the breaker protects, for logs and metrics.
+        failure_threshold (int): Consecutive failed or slow calls that open the breaker.
+        slow_call_seconds (float): A call taking longer than this counts as failed.
+        reset_timeout (float): How long the breaker stays open before probing, in seconds.
+    """
+
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=2.0, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.counters = Counter()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.labels(name).set(0)
+
+    @property
+    def is_open(self):
+        """
+        bool: True while calls are refused, i.e. open and not yet due for a probe.
+        """
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    @contextmanager
+    def guard(self):
+        """
+        Wraps one database call.
+
+        Raises:
+            DatabaseUnavailable: If the breaker is open, before the block runs.
+        """
+        probe = self._before()
+        started_at = time.monotonic()
+        try:
+            yield
+        except OUTAGE_ERRORS:
+            self._record(False, probe)
+            raise
+        except BaseException:
+            # The database answered, the query or the caller failed
+            self._record(time.monotonic() - started_at <= self.slow_call_seconds, probe)
+            raise
+        self._record(time.monotonic() - started_at <= self.slow_call_seconds, probe)
+
+    def stats(self):
+        """
+        Returns the call, failure, rejection and state change counters.
+        """
+        with self._lock:
+            return dict(self.counters)
+
+    def _before(self):
+        """
+        Returns:
+            bool: True if the call is the probe of a half-open breaker.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                self.counters["calls"] += 1
+                return False
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self.counters["probes"] += 1
+                return True
+            self.counters["rejected"] += 1
+        raise DatabaseUnavailable(f"The {self.name} circuit breaker is open")
+
+    def _record(self, ok, probe):
+        with self._lock:
+            if probe:
+                self._probing = False
+                if ok:
+                    self._failures = 0
+                    self._set_state(CLOSED)
+                else:
+                    self._open()
+                return
+            if ok:
+                self._failures = 0
+                return
+            self.counters["failures"] += 1
+            self._failures += 1
+            if self.state == CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        self.counters[f"to_{state}"] += 1
+        BREAKER_STATE.labels(self.name).set({CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[state])
+        log = logger.info if state == CLOSED else logger.error
+        log(f"The {self.name} circuit breaker is now {state.replace('_', '-')}")
+
+
+database_breaker, replica_breaker = (
+    CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv("DB_BREAKER_FAILURES", "5")),
+        slow_call_seconds=float(os.getenv("DB_BREAKER_SLOW_SECONDS", "2")),
+        reset_timeout=float(os.getenv("DB_BREAKER_RESET_SECONDS", "30")),
+    )
+    for name in ("database", "replica")
+)
@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from sqlalchemy import select as sql_select
+
+from .models import Desktop
+from .session import get_engine, is_postgres, note_write, session_scope
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "desktop_changed"
+
+DesktopState = namedtuple("DesktopState", ["id", "name", "user_id"])
+
+_SNAPSHOT_QUERY = sql_select(Desktop.id, Desktop.name, Desktop.user_id, Desktop.occupied)
+
+
+class AvailabilityCache:
+    """
+    Read-through, in-process cache of the ``desktop`` table.
+
+    The whole table is loaded on first use and then kept current by applying
+    every claim and release made by this process, plus the row changes other
+    replicas publish through the ``desktop_changed`` Postgres channel (see the
+    trigger installed by migration 8d2e5f1a9c37). The snapshot is reloaded
+    after ``ttl`` seconds regardless, which bounds staleness if a notification
+    is ever missed.
+
+    If the reload fails, e.g. because the database circuit breaker is open,
+    the last snapshot stays in use and :attr:`stale_since` tells since when;
+    the reload is retried every ``retry_interval`` seconds.
+
+    Reloads run outside the lock: one caller queries the database while the
+    others keep reading the current snapshot, and only the first load makes
+    callers wait. Changes applied during a reload are replayed on top of its
+    result, which may predate them.
+
+    Args:
+        ttl (float): The maximum age of the snapshot in seconds.
+        retry_interval (float): The time between reloads while the database is unavailable.
+    """
+
+    def __init__(self, ttl=60.0, retry_interval=5.0):
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._lock = threading.RLock()
+        # Held by the one caller reloading the snapshot
+        self._reload_lock = threading.Lock()
+        # Changes made while a reload is running, replayed once it is installed
+        self._replay = None
+        self._desktops = {}
+        self._occupants = {}
+        self._free = None
+        self._expires_at = 0.0
+        self._loaded_at = None
+        self._listener = None
+        # Bumped whenever a desktop is added, renamed or removed
+        self.generation = 0
+        # When the snapshot in use was last loaded, if reloading it failed since
+        self.stale_since = None
+
+    def free_desktops(self):
+        """
+        Returns:
+            list[DesktopState]: The free desktops, ordered by ID.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if self._free is None:
+                self._free = [
+                    desktop
+                    for _, desktop in sorted(self._desktops.items())
+                    if desktop.user_id is None
+                ]
+            return self._free
+
+    def desktop_of(self, user_id):
+        """
+        Args:
+            user_id (str): The Slack ID of the user.
+
+        Returns:
+            DesktopState: The desktop the user occupies, or None.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            desktop_id = self._occupants.get(user_id)
+            return self._desktops.get(desktop_id)
+
+    def get(self, desktop_id):
+        """
+        Args:
+            desktop_id (int): The ID of the desktop.
+
+        Returns:
+            DesktopState: The desktop, or None if it does not exist.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self._desktops.get(desktop_id)
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple[int, list[DesktopState]]: The current ``generation`` and every desktop,
+            free or occupied.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self.generation, list(self._desktops.values())
+
+    def apply(self, desktop_id, name, user_id, local=True):
+        """
+        Records the current state of one desktop.
+
+        Args:
+            desktop_id (int): The ID of the desktop.
+            name (str): The name of the desktop.
+            user_id (str): The Slack ID of the occupant, or None if the desktop is free.
+            local (bool): Whether this process made the change, rather than another replica
+                whose notification is being applied.
+        """
+        if local:
+            # A snapshot reloaded from a replica right now could predate the change
+            note_write()
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(lambda: self.apply(desktop_id, name, user_id, local=False))
+            if self._loaded_at is None:
+                # Nothing loaded yet, the next read fetches the current state anyway
+                return
+            previous = self._desktops.get(desktop_id)
+            state = DesktopState(desktop_id, name, user_id)
+            if previous == state:
+                # e.g. the notification echoing our own change; keep the free list (and its options)
+                return
+            if previous and previous.user_id is not None:
+                self._occupants.pop(previous.user_id, None)
+            if previous is None or previous.name != name:
+                self.generation += 1
+            self._desktops[desktop_id] = state
+            if user_id is not None:
+                self._occupants[user_id] = desktop_id
+            self._free = None
+
+    def remove(self, desktop_id, local=True):
+        """
+        Forgets a desktop that was deleted from the table.
+
+        Args:
+            desktop_id (int): The ID of the desktop.
+            local (bool): Whether this process deleted it, see :meth:`apply`.
+        """
+        if local:
+            note_write()
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(lambda: self.remove(desktop_id, local=False))
+            previous = self._desktops.pop(desktop_id, None)
+            if previous and previous.user_id is not None:
+                self._occupants.pop(previous.user_id, None)
+            self._free = None
+            self.generation += 1
+
+    def invalidate(self):
+        """
+        Drops the snapshot so the next read reloads it from the database.
+        """
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(self.invalidate)
+            self._expires_at = 0.0
+
+    def start_listener(self):
+        """
+        Starts the background thread that applies changes published by other replicas.
+        """
+        if not is_postgres():
+            return
+        if self._listener is None:
+            self._listener = threading.Thread(
+                target=self._listen, name="availability-cache-listener", daemon=True
+            )
+            self._listener.start()
+
+    async def refresh_async(self):
+        """
+        Reloads an expired snapshot without blocking the event loop.
+
+        The asyncio listeners await this before reading, so the synchronous
+        accessors then find a fresh snapshot and never query the database.
+        """
+        from .async_session import async_session_scope
+
+        while time.monotonic() >= self._expires_at:
+            if self._begin_reload(blocking=False):
+                rows = error = None
+                try:
+                    async with async_session_scope(read_only=True) as session:
+                        rows = (await session.execute(_SNAPSHOT_QUERY)).all()
+                except Exception as e:
+                    error = e
+                finally:
+                    self._end_reload(rows, error)
+                return
+            if self._loaded_at is not None:
+                return
+            # Another caller is loading the first snapshot, wait for it without blocking the loop
+            await asyncio.sleep(0.01)
+
+    def _ensure_loaded(self):
+        if time.monotonic() < self._expires_at:
+            return
+        # Only the first load makes callers wait, later ones serve the current snapshot meanwhile
+        if not self._begin_reload(blocking=self._loaded_at is None):
+            return
+        rows = error = None
+        try:
+            with session_scope(read_only=True) as session:
+                rows = session.execute(_SNAPSHOT_QUERY).all()
+        except Exception as e:
+            error = e
+        finally:
+            self._end_reload(rows, error)
+
+    def _begin_reload(self, blocking):
+        if not self._reload_lock.acquire(blocking=blocking):
+            return False
+        if time.monotonic() < self._expires_at:
+            # Reloaded by the caller we waited for
+            self._reload_lock.release()
+            return False
+        with self._lock:
+            self._replay = []
+        return True
+
+    def _end_reload(self, rows, error):
+        # Changes made meanwhile were applied to the current snapshot already, only a new one needs them
+        try:
+            with self._lock:
+                replay, self._replay = self._replay, None
+                if error is not None:
+                    self._keep_stale(error)
+                    return
+                if rows is None:
+                    # Interrupted, e.g. the awaiting task was cancelled
+                    return
+                self._install(rows)
+                for change in replay:
+                    change()
+        finally:
+            self._reload_lock.release()
+
+    def _keep_stale(self, error):
+        if self._loaded_at is None:
+            raise error
+        if self.stale_since is None:
+            logger.error(f"Reloading the availability snapshot failed, serving the last one: {str(error)}")
+            self.stale_since = self._loaded_at
+        self._expires_at = time.monotonic() + self.retry_interval
+
+    def _install(self, rows):
+        previous = self._desktops
+        self._desktops = {
+            row.id: DesktopState(row.id, row.name, row.user_id if row.occupied else None)
+            for row in rows
+        }
+        if previous.keys() != self._desktops.keys() or any(
+            previous[desktop_id].name != desktop.name
+            for desktop_id, desktop in self._desktops.items()
+        ):
+            self.generation += 1
+        self._occupants = {
+            desktop.user_id: desktop.id
+            for desktop in self._desktops.values()
+            if desktop.user_id is not None
+        }
+        self._free = None
+        self._expires_at = time.monotonic() + self.ttl
+        self._loaded_at = datetime.now(timezone.utc)
+        if self.stale_since is not None:
+            logger.info("The availability snapshot is current again")
+            self.stale_since = None
+
+    def _listen(self):
+        while True:
+            dbapi_connection = None
+            try:
+                connection = get_engine().raw_connection()
+                # Read before detaching, a detached fairy no longer exposes it
+                dbapi_connection = connection.driver_connection
+                connection.detach()
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                # Changes may have been missed while we were not listening
+                self.invalidate()
+                while True:
+                    if select.select([dbapi_connection], [], [], 60) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        self._handle(dbapi_connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Availability cache listener failed, reconnecting: {str(e)}")
+                if dbapi_connection is not None:
+                    dbapi_connection.close()
+                self.invalidate()
+                time.sleep(5)
+
+    def _handle(self, payload):
+        change = json.loads(payload)
+        if change["op"] == "TRUNCATE":
+            self.invalidate()
+        elif change["op"] == "DELETE":
+            self.remove(change["id"], local=False)
+        else:
+            # Other replicas' writes do not send this process's reads to the primary
+            self.apply(
+                change["id"],
+                change["name"],
+                change["user_id"] if change["occupied"] else None,
+                local=False,
+            )
+
+
+availability_cache = AvailabilityCache(ttl=float(os.getenv("AVAILABILITY_CACHE_TTL", "60")))
@@ -0,0 +1,57 @@
+"""
+Process configuration: the ``.env`` file and the variables each runtime requires.
+
+Modules read their optional settings with ``os.getenv`` when they are imported
+and create nothing that needs them until first use, so importing the listeners
+requires no configuration. Entry points call :func:`load_config` before
+importing the rest of the package.
+"""
+import functools
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+env_path = Path(__file__).resolve().parent.parent / ".env"
+
+DATABASE_VARIABLES = ("POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_HOST", "POSTGRES_DB")
+
+REQUIRED_VARIABLES = {
+    "sync": ("SLACK_BOT_TOKEN", "SLACK_APP_TOKEN"),
+    "async": ("SLACK_BOT_TOKEN", "SLACK_APP_TOKEN"),
+    "http": ("SLACK_BOT_TOKEN", "SLACK_SIGNING_SECRET"),
+    # desktop_dispatcher.admin only talks to the database
+    "admin": (),
+}
+
+
+@functools.cache
+def load_config(mode):
+    """
+    Loads ``.env``, sets up logging and checks the required variables, once per process.
+
+    Args:
+        mode (str): The runtime, ``sync``, ``async`` or ``http`` (see ``DISPATCHER_MODE``),
+            or ``admin`` for the admin commands.
+
+    Raises:
+        ValueError: If ``mode`` is not one of the modes above.
+        KeyError: If any required variable is not set, naming all of them.
+    """
+    load_dotenv(env_path)
+    logging.basicConfig(level=logging.INFO)
+
+    if mode not in REQUIRED_VARIABLES:
+        error_msg = f"Unknown mode {mode!r}, expected one of: {', '.join(REQUIRED_VARIABLES)}"
+        logging.error(error_msg)
+        raise ValueError(error_msg)
+
+    required = list(REQUIRED_VARIABLES[mode])
+    if not os.getenv("SQLALCHEMY_URL"):
+        required += DATABASE_VARIABLES
+    missing = [name for name in required if not os.getenv(name)]
+    if missing:
+        error_msg = f"Set the {', '.join(missing)} environment variables"
+        logging.error(error_msg)
+        raise KeyError({"error": error_msg})
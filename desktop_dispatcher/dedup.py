@@ -0,0 +1,322 @@
+"""
+Drops duplicate deliveries of the same interaction before the listeners run.
+
+Slack delivers an interaction again when it thinks the first delivery timed
+out, and users double-click buttons. Without a check each copy claims,
+releases or changes the desktop again, notifies the channel again and can
+answer with a contradicting message. :func:`dedup_middleware` runs before
+every listener and acks a duplicate without any database or Web API work.
+
+An interaction is a duplicate if:
+
+- its user and ``trigger_id`` (slash commands) or ``action_ts`` (block
+  actions) were seen within ``DEDUP_WINDOW`` seconds, which is a redelivery,
+  or
+- the same user clicked the same button or picked the same option of the same
+  message within ``DEDUP_CLICK_WINDOW`` seconds. Only the actions that change
+  a desktop count; a second click with a new ``action_ts`` is otherwise a new
+  interaction.
+
+The keys are kept in memory, or with ``DEDUP_BACKEND=database`` also in the
+``processed_interaction`` table, so a redelivery landing on another replica
+is caught too.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from slack_bolt.response import BoltResponse
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .metrics import DUPLICATE_INTERACTIONS
+from .models import ProcessedInteraction
+from .session import is_postgres, session_scope
+
+logger = logging.getLogger(__name__)
+
+# The actions whose repeat on the same message claims, releases or changes a desktop again
+CLICK_ACTIONS = frozenset({"desktop_selection", "leave_desktop", "renew_lease", "confirm_desktop_change"})
+
+dedup_window = float(os.getenv("DEDUP_WINDOW", "60"))
+click_window = float(os.getenv("DEDUP_CLICK_WINDOW", "2"))
+
+
+def interaction_keys(body):
+    """
+    Builds the dedup keys of an interaction.
+
+    Args:
+        body (dict): The payload of the incoming request from Slack.
+
+    Returns:
+        list[tuple]: ``(key, window, reason)`` per key; empty for requests that are never dropped,
+        such as the options of a type-ahead dropdown.
+    """
+    if body.get("command"):
+        return [(f"redelivery:{body['user_id']}:{body['trigger_id']}", dedup_window, "redelivery")]
+    if body.get("type") != "block_actions" or not body.get("actions"):
+        return []
+    user_id = body["user"]["id"]
+    action = body["actions"][0]
+    keys = [(f"redelivery:{user_id}:{action['action_ts']}", dedup_window, "redelivery")]
+    message_ts = (body.get("container") or {}).get("message_ts")
+    if action["action_id"] in CLICK_ACTIONS and message_ts:
+        value = action.get("value") or (action.get("selected_option") or {}).get("value")
+        keys.append(
+            (f"click:{user_id}:{action['action_id']}:{message_ts}:{value}", click_window, "repeated_click")
+        )
+    return keys
+
+
+class MemoryDedupStore:
+    """
+    Remembers the keys of recent interactions in process memory.
+
+    A key counts as seen until its window has passed. Once ``max_entries`` is
+    reached, the least recently used key is evicted to make room. Only
+    suitable when a single replica serves all interactions.
+
+    Args:
+        max_entries (int): The maximum number of keys kept.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.counters = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, keys):
+        """
+        Looks the keys of one interaction up and records the ones not seen yet.
+
+        Args:
+            keys (list[tuple]): The keys from :func:`interaction_keys`.
+
+        Returns:
+            tuple: The ``(key, window, reason)`` seen before, or None if the interaction is new.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for entry in keys:
+                expires_at = self._entries.get(entry[0])
+                if expires_at is not None and expires_at > now:
+                    self._entries.move_to_end(entry[0])
+                    self.counters["hits"] += 1
+                    return entry
+                if expires_at is not None:
+                    self.counters["expirations"] += 1
+            for key, window, _ in keys:
+                self._entries[key] = now + window
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self.counters["misses"] += 1
+            return None
+
+    async def check_async(self, keys):
+        return self.check(keys)
+
+    def stats(self):
+        """
+        Returns the hit, miss, expiration and eviction counters, the hit rate and the current size.
+        """
+        with self._lock:
+            return {**self.counters, "hit_rate": _hit_rate(self.counters), "size": len(self._entries)}
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _claim_statement(key, window):
+    # Inserts the key, or takes over an expired row; no row comes back if a live one exists
+    now = _utcnow()
+    insert = postgresql.insert if is_postgres() else sqlite.insert
+    statement = insert(ProcessedInteraction).values(key=key, expires_at=now + timedelta(seconds=window))
+    return statement.on_conflict_do_update(
+        index_elements=[ProcessedInteraction.key],
+        set_={"expires_at": statement.excluded.expires_at},
+        where=ProcessedInteraction.expires_at <= now,
+    ).returning(ProcessedInteraction.key)
+
+
+def _cleanup_statement(batch_size):
+    expired = (
+        select(ProcessedInteraction.key)
+        .where(ProcessedInteraction.expires_at <= _utcnow())
+        .limit(batch_size)
+    )
+    return delete(ProcessedInteraction).where(ProcessedInteraction.key.in_(expired))
+
+
+class DatabaseDedupStore:
+    """
+    Remembers the keys of recent interactions in the ``processed_interaction``
+    table, so duplicates are dropped whichever replica they reach.
+
+    A :class:`MemoryDedupStore` in front answers the duplicates this replica
+    saw itself without a query. Expired rows are deleted in batches of
+    ``cleanup_batch`` rows at most every ``cleanup_interval`` seconds,
+    piggybacking on checks. If the table cannot be reached the interaction is
+    let through: handling a duplicate beats dropping an original.
+
+    Args:
+        max_entries (int): The maximum number of keys kept in memory.
+        cleanup_interval (float): The minimum time between two cleanups, in seconds.
+        cleanup_batch (int): The maximum number of expired rows deleted per statement.
+    """
+
+    def __init__(self, max_entries=10000, cleanup_interval=60, cleanup_batch=500):
+        self.local = MemoryDedupStore(max_entries=max_entries)
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch = cleanup_batch
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+
+    def check(self, keys):
+        """
+        Looks the keys of one interaction up and records the ones not seen yet.
+
+        Args:
+            keys (list[tuple]): The keys from :func:`interaction_keys`.
+
+        Returns:
+            tuple: The ``(key, window, reason)`` seen before, or None if the interaction is new.
+        """
+        seen = self.local.check(keys)
+        if seen is None:
+            try:
+                with session_scope() as session:
+                    for entry in keys:
+                        if session.execute(_claim_statement(*entry[:2])).first() is None:
+                            seen = entry
+                            break
+                if self._cleanup_due():
+                    self.cleanup()
+            except Exception as e:
+                logger.error(f"Could not check the processed interactions: {str(e)}")
+                self._add("failures", 1)
+        self._add("hits" if seen else "misses", 1)
+        return seen
+
+    def cleanup(self):
+        """
+        Deletes expired keys batch by batch.
+        """
+        with session_scope() as session:
+            while True:
+                deleted = session.execute(_cleanup_statement(self.cleanup_batch)).rowcount
+                self._add("expirations", deleted)
+                session.commit()
+                if deleted < self.cleanup_batch:
+                    break
+
+    async def check_async(self, keys):
+        from .async_session import async_session_scope
+
+        seen = self.local.check(keys)
+        if seen is None:
+            try:
+                async with async_session_scope() as session:
+                    for entry in keys:
+                        if (await session.execute(_claim_statement(*entry[:2]))).first() is None:
+                            seen = entry
+                            break
+                if self._cleanup_due():
+                    await self.cleanup_async()
+            except Exception as e:
+                logger.error(f"Could not check the processed interactions: {str(e)}")
+                self._add("failures", 1)
+        self._add("hits" if seen else "misses", 1)
+        return seen
+
+    async def cleanup_async(self):
+        from .async_session import async_session_scope
+
+        async with async_session_scope() as session:
+            while True:
+                deleted = (await session.execute(_cleanup_statement(self.cleanup_batch))).rowcount
+                self._add("expirations", deleted)
+                await session.commit()
+                if deleted < self.cleanup_batch:
+                    break
+
+    def stats(self):
+        """
+        Returns the hit, miss, expiration and failure counters seen by this replica and the hit rate.
+        """
+        with self._lock:
+            return {**self.counters, "hit_rate": _hit_rate(self.counters)}
+
+    def _cleanup_due(self):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_cleanup:
+                return False
+            self._next_cleanup = now + self.cleanup_interval
+            return True
+
+    def _add(self, counter, amount):
+        with self._lock:
+            self.counters[counter] += amount
+
+
+def _hit_rate(counters):
+    checked = counters["hits"] + counters["misses"]
+    return counters["hits"] / checked if checked else 0.0
+
+
+def create_dedup_store():
+    """
+    Builds the interaction dedup store chosen by ``DEDUP_BACKEND``.
+
+    Returns:
+        MemoryDedupStore | DatabaseDedupStore: ``memory`` (default) or ``database``.
+    """
+    backend = os.getenv("DEDUP_BACKEND", "memory")
+    max_entries = int(os.getenv("DEDUP_MAX_ENTRIES", "10000"))
+    if backend == "database":
+        return DatabaseDedupStore(max_entries=max_entries)
+    if backend != "memory":
+        logger.error(f"Unknown DEDUP_BACKEND {backend}, using memory")
+    return MemoryDedupStore(max_entries=max_entries)
+
+
+interaction_dedup = create_dedup_store()
+
+
+def _duplicate(seen):
+    key, _, reason = seen
+    DUPLICATE_INTERACTIONS.labels(reason).inc()
+    logger.info(f"Dropped a duplicate interaction ({reason}) of user {key.split(':')[1]}")
+    # Acked like the original, so Slack does not deliver it once more
+    return BoltResponse(status=200, body="")
+
+
+def dedup_middleware(body, next):
+    """
+    Bolt global middleware acking duplicate interactions without running their listener.
+    """
+    keys = interaction_keys(body)
+    seen = interaction_dedup.check(keys) if keys else None
+    if seen:
+        return _duplicate(seen)
+    next()
+
+
+async def async_dedup_middleware(body, next):
+    """
+    AsyncApp version of :func:`dedup_middleware`.
+    """
+    keys = interaction_keys(body)
+    seen = await interaction_dedup.check_async(keys) if keys else None
+    if seen:
+        return _duplicate(seen)
+    await next()
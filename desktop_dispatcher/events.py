@@ -1,106 +1,84 @@
 import logging
 
 from slack_bolt import App
-from slack_sdk import WebClient
-from slack_sdk.models.blocks import (
-    ActionsBlock,
-    ButtonElement,
-    DividerBlock,
-    Option,
-    PlainTextObject,
-    SectionBlock,
-    StaticSelectElement,
+
+from .admission import admission_middleware
+from .blocks import (
+    MAX_STATIC_OPTIONS,
+    change_desktop_blocks,
+    desktop_selection_blocks,
+    no_free_desktop_blocks,
+    occupied_desktop_blocks,
+    stale_notice_blocks,
+    suggested_options,
+    waitlisted_blocks,
 )
+from .breaker import DatabaseUnavailable
+from .cache import availability_cache
+from .dedup import dedup_middleware
+from .messages import message_updater
+from .metrics import instrument_app
+from .notifications import notify_channel
+from .occupancy import CLAIM, RELEASE, format_usage_report, occupancy_log, usage_report
+from .processing import processing_runner
+from .repository import claim_desktop, release_desktop, renew_lease, swap_desktop
+from .search import desktop_search
+from .selections import pending_selections
+from .session import session_scope
+from .utils import slack_client
+from .waitlist import waitlist
 
-from .models import Desktop
-from .session import SessionLocal
-from .utils import get_env_variable, notify_channel
+logger = logging.getLogger(__name__)
 
-app = App(token=get_env_variable("SLACK_BOT_TOKEN"))
-slack_client = WebClient(token=get_env_variable("SLACK_BOT_TOKEN"))
+DATABASE_UNAVAILABLE = (
+    "⛔  The desktop database is not responding, so desktops cannot be claimed, changed or left "
+    "right now. Please try again in a minute."
+)
+SELECTION_NOT_STORED = "⛔  Your selection could not be saved. Please pick the desktop again."
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
-session = SessionLocal()
+def acknowledge(ack):
+    """
+    Acknowledges a request as soon as it arrives.
+
+    :func:`create_app` registers the listeners as Bolt lazy listeners behind
+    this function, so Slack gets its ack before any database or Slack API work.
+
+    Args:
+        ack (function): The function to acknowledge receipt of the request from Slack.
+    """
+    ack()
 
 
-@app.command("/desktop")
-def list_of_desktops(ack, body, say):
+def list_of_desktops(body, say):
     """
     Responds to the '/desktop' slash command by displaying the user's current desktop
     with a 'Leave Desktop' button if occupied, a list of available desktops if not,
-    or informs if none are available.
+    or offers to join the waitlist if none are available.
 
     Args:
-        ack (function): The function to acknowledge receipt of the slash command.
         body (dict): The incoming slash command payload from Slack.
         say (function): The function to send a message back to Slack.
     """
-    ack()
     try:
         user_id = body["user_id"]
-        free_desktops = session.query(Desktop).filter(Desktop.occupied == False).all() 
-        occupied_desktop = (
-            session.query(Desktop)
-            .filter(Desktop.occupied == True, Desktop.user_id == user_id)
-            .first()
-        )
+        free_desktops = availability_cache.free_desktops()
+        occupied_desktop = availability_cache.desktop_of(user_id)
 
         if occupied_desktop:
-            blocks = [
-                SectionBlock(text=f"🟢  You are using *{occupied_desktop.name}*"),
-                ActionsBlock(
-                    elements=[
-                        ButtonElement(
-                            text="Change desktop",
-                            action_id="change_desktop",
-                        ),
-                        ButtonElement(
-                            text="Leave",
-                            action_id="leave_desktop",
-                            value=str(occupied_desktop.id),
-                            style="danger",
-                        ),
-                    ]
-                ),
-                DividerBlock(),
-            ]
-            say(blocks=blocks)
-
+            say(blocks=with_stale_notice(occupied_desktop_blocks(occupied_desktop)))
         elif free_desktops:
-            options = [
-                Option(text=PlainTextObject(text=desktop.name), value=str(desktop.id))
-                for desktop in free_desktops
-            ]
-
-            blocks = [
-                DividerBlock(),
-                SectionBlock(text="⚪  You're not using any desktop"),
-                ActionsBlock(
-                    elements=[
-                        StaticSelectElement(
-                            placeholder=PlainTextObject(text="Select desktop"),
-                            options=options,
-                            action_id="desktop_selection",
-                        )
-                    ]
-                ),
-                DividerBlock(),
-            ]
-
-            say(blocks=blocks)
+            say(blocks=with_stale_notice(desktop_selection_blocks(free_desktops)))
         else:
-            say(
-                "⛔  Error getting available Desktops. Please contact maintainer"
-            )
+            say(blocks=with_stale_notice(no_free_desktop_blocks()))
+    except DatabaseUnavailable:
+        say(DATABASE_UNAVAILABLE)
     except Exception as e:
         logger.error(f"An error occurred: {str(e)}")
         say("⛔  An error occurred. Please contact maintainer.")
 
 
-@app.action("desktop_selection")
-def handle_desktop_selection(ack, body, say):
+def handle_desktop_selection(body, say, respond, client):
     """
     Handles the desktop selection action.
 
@@ -108,53 +86,35 @@ def handle_desktop_selection(ack, body, say):
     provides a confirmation message with a 'Leave Desktop' button.
 
     Args:
-        ack (function): The function to acknowledge receipt of the action from Slack.
         body (dict): The payload of the incoming action request from Slack.
         say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
     """
-    ack()
+    reply = message_updater(body, respond, client, say)
     selected_option = body["actions"][0]["selected_option"]
     desktop_id = selected_option["value"]
-    desktop_name = selected_option["text"]["text"]
     user_id = body["user"]["id"]
 
     try:
-        desktop = session.query(Desktop).filter(Desktop.id == desktop_id).first()
-        if desktop and not desktop.occupied:
-            desktop.occupied = True
-            desktop.user_id = user_id
-            session.commit()
-
-            blocks = [
-                SectionBlock(text=f"🟢  You are using *{desktop_name}*"),
-                ActionsBlock(
-                    elements=[
-                        ButtonElement(
-                            text="Change desktop",
-                            action_id="change_desktop",
-                        ),
-                        ButtonElement(
-                            text="Leave",
-                            action_id="leave_desktop",
-                            value=str(desktop.id),
-                            style="danger",
-                        ),
-                    ]
-                ),
-                DividerBlock(),
-            ]
-
-            say(blocks=blocks)
-            notify_channel(f"🖥️    *<@{user_id}>* is now using {desktop_name}")
+        with session_scope(user_id=user_id) as session:
+            desktop = claim_desktop(session, desktop_id, user_id)
+
+        if desktop:
+            availability_cache.apply(desktop.id, desktop.name, user_id)
+            occupancy_log.record(desktop.id, user_id, CLAIM)
+            reply(blocks=occupied_desktop_blocks(desktop))
+            notify_channel(f"🖥️    *<@{user_id}>* is now using {desktop.name}")
         else:
-            say("⛔  The selected desktop is no longer available. Please try again.")
+            reply("⛔  The selected desktop is no longer available. Please pick another one with /desktop.")
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
     except Exception as e:
         logger.error(f"An error occurred while processing selection: {str(e)}")
-        say("⛔  An error occurred. Please contact maintainer.")
+        reply("⛔  An error occurred. Please contact maintainer.")
 
 
-@app.action("leave_desktop")
-def handle_leave_desktop(ack, body, say):
+def handle_leave_desktop(body, say, respond, client):
     """
     Handles the action of leaving a desktop
 
@@ -162,142 +122,266 @@ def handle_leave_desktop(ack, body, say):
     and shows the list of available desktops again.
 
     Args:
-        ack (function): The function to acknowledge receipt of the action from Slack.
         body (dict): The payload of the incoming action request from Slack.
         say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
     """
-    ack()
+    reply = message_updater(body, respond, client, say)
     desktop_id = body["actions"][0]["value"]
     user_id = body["user"]["id"]
 
     try:
-        desktop = (
-            session.query(Desktop)
-            .filter(Desktop.id == desktop_id, Desktop.user_id == user_id)
-            .first()
-        )
+        with session_scope(user_id=user_id) as session:
+            desktop = release_desktop(session, desktop_id, user_id)
+
         if desktop:
-            desktop.occupied = False
-            desktop.user_id = None
-            session.commit()
-            say(f"⚪  You left: *{desktop.name}*")
+            availability_cache.apply(desktop.id, desktop.name, None)
+            occupancy_log.record(desktop.id, user_id, RELEASE)
+            reply(f"⚪  You left: *{desktop.name}*")
             notify_channel(f"⚪  *<@{user_id}>* left *{desktop.name}*")
+            waitlist.offer(desktop.id, released_by=user_id)
         else:
-            say(f"⛔  You are not currently occupying this desktop. {desktop.name}")
+            reply("⛔  You are not currently occupying this desktop.")
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
     except Exception as e:
         logger.error(f"An error occurred while processing leave request: {str(e)}")
-        say("⛔  An error occurred. Please contact maintainer.")
+        reply("⛔  An error occurred. Please contact maintainer.")
+
+
+def handle_renew_lease(body, say, respond, client):
+    """
+    Handles the 'Still using' button, which extends the lease on the user's desktop
+    so the lease sweeper does not release it.
+
+    Args:
+        body (dict): The payload of the incoming action request from Slack.
+        say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
+    """
+    reply = message_updater(body, respond, client, say)
+    desktop_id = body["actions"][0]["value"]
+    user_id = body["user"]["id"]
+
+    try:
+        with session_scope(user_id=user_id) as session:
+            desktop = renew_lease(session, desktop_id, user_id)
+
+        if desktop:
+            reply(blocks=occupied_desktop_blocks(desktop, until=lease_end(desktop.expires_at)))
+        else:
+            reply("⛔  You are not currently occupying this desktop.")
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while renewing lease: {str(e)}")
+        reply("⛔  An error occurred. Please contact maintainer.")
+
+
+def handle_join_waitlist(body, say, respond, client):
+    """
+    Handles the 'Notify me' button, which puts the user on the waitlist for the next freed desktop.
+
+    If a desktop was freed since the user ran '/desktop', they get the list of
+    free desktops instead.
+
+    Args:
+        body (dict): The payload of the incoming action request from Slack.
+        say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
+    """
+    reply = message_updater(body, respond, client, say)
+    user_id = body["user"]["id"]
+
+    try:
+        occupied_desktop = availability_cache.desktop_of(user_id)
+        free_desktops = availability_cache.free_desktops()
+
+        if occupied_desktop:
+            reply(blocks=occupied_desktop_blocks(occupied_desktop))
+        elif free_desktops:
+            reply(blocks=with_stale_notice(desktop_selection_blocks(free_desktops)))
+        else:
+            reply(blocks=waitlisted_blocks(waitlist.join(user_id)))
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while joining the waitlist: {str(e)}")
+        reply("⛔  An error occurred. Please contact maintainer.")
+
+
+def handle_leave_waitlist(body, say, respond, client):
+    """
+    Handles the 'Leave the waitlist' button.
+
+    Args:
+        body (dict): The payload of the incoming action request from Slack.
+        say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
+    """
+    reply = message_updater(body, respond, client, say)
+    user_id = body["user"]["id"]
+
+    try:
+        if waitlist.leave(user_id):
+            reply("⚪  You left the waitlist.")
+        else:
+            reply("⛔  You are not on the waitlist.")
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while leaving the waitlist: {str(e)}")
+        reply("⛔  An error occurred. Please contact maintainer.")
 
 
-@app.action("new_desktop_selection")
-def handle_new_desktop_selection(ack, body, say):
+def lease_end(expires_at):
+    """
+    Formats the end of a lease as a Slack date, shown in the reader's time zone.
+
+    Args:
+        expires_at (datetime): When the lease expires.
+
+    Returns:
+        str: The date in Slack mrkdwn.
+    """
+    return f"<!date^{int(expires_at.timestamp())}^{{time}}|{expires_at:%H:%M} UTC>"
+
+
+def with_stale_notice(blocks):
+    """
+    Puts a notice above a message built from the availability cache while it
+    serves its last-known-good snapshot, because the database is unavailable.
+
+    Args:
+        blocks (list[dict]): The message blocks.
+
+    Returns:
+        list[dict]: The blocks, with the notice first if the snapshot is stale.
+    """
+    stale_since = availability_cache.stale_since
+    if stale_since is None:
+        return blocks
+    return stale_notice_blocks(lease_end(stale_since)) + blocks
+
+
+def handle_new_desktop_selection(ack, body, say, respond):
     """
     Handles the selection of a new desktop from the dropdown menu.
 
-    This function stores the selected desktop ID in temporary storage for later use
-    when confirming the desktop change.
+    This function stores the selected desktop ID in the pending-selection store for
+    later use when confirming the desktop change.
 
     Args:
         ack (function): The function to acknowledge receipt of the action from Slack.
         body (dict): The payload of the incoming action request from Slack.
         say (function): The function to send a message back to Slack (unused in this function).
+        respond (function): Tells the user, below the dropdown, if the selection could not be stored.
     """
+    # Acked first so a slow database cannot delay the ack. The selection is still stored
+    # on this listener thread rather than the processing pool, normally long before the
+    # user gets to click "Confirm".
     ack()
     selected_desktop_id = body["actions"][0]["selected_option"]["value"]
     user_id = body["user"]["id"]
-    
-    # Store the selected desktop ID in a temporary storage
-    # For this example, we'll use a global dictionary. In a production environment,
-    # you might want to use a more robust solution like Redis or a database.
-    if not hasattr(app, 'temp_desktop_selections'):
-        app.temp_desktop_selections = {}
-    app.temp_desktop_selections[user_id] = selected_desktop_id
+
+    try:
+        pending_selections.put(user_id, selected_desktop_id)
+    except Exception as e:
+        logger.error(f"An error occurred while storing a desktop selection: {str(e)}")
+        respond(
+            text=SELECTION_NOT_STORED, response_type="ephemeral", replace_original=False
+        )
 
 
-@app.action("confirm_desktop_change")
-def handle_confirm_desktop_change(ack, body, say):
+def handle_confirm_desktop_change(body, say, respond, client):
     """
     Handles the confirmation of changing to a new desktop.
 
-    This function retrieves the new desktop ID from temporary storage,
+    This function takes the new desktop ID from the pending-selection store,
     updates the database to reflect the change, and notifies the user and channel.
 
     Args:
-        ack (function): The function to acknowledge receipt of the action from Slack.
         body (dict): The payload of the incoming action request from Slack.
         say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
     """
-    ack()
+    reply = message_updater(body, respond, client, say)
     user_id = body["user"]["id"]
     
     try:
-        # Get the new desktop ID from temporary storage
-        new_desktop_id = app.temp_desktop_selections.get(user_id)
+        # Taken out up front: if the desktop is gone the user has to pick again anyway
+        new_desktop_id = pending_selections.pop(user_id)
         if not new_desktop_id:
-            say("⛔  No desktop selected. Please try again.")
+            reply("⛔  No desktop selected. Please start over with /desktop.")
             return
 
-        # Get the current desktop for the user
-        current_desktop = (
-            session.query(Desktop)
-            .filter(Desktop.occupied == True, Desktop.user_id == user_id)
-            .first()
-        )
-
-        # Get the new desktop
-        new_desktop = session.query(Desktop).filter(Desktop.id == new_desktop_id).first()
+        with session_scope(user_id=user_id) as session:
+            desktop = swap_desktop(session, user_id, new_desktop_id)
 
-        if not new_desktop or new_desktop.occupied:
-            say("⛔  The selected desktop is no longer available. Please try again.")
+        if not desktop:
+            reply("⛔  The selected desktop is no longer available. Please pick another one with /desktop.")
             return
 
-        # Mark the current desktop as unoccupied
-        if current_desktop:
-            current_desktop.occupied = False
-            current_desktop.user_id = None
-
-        # Mark the new desktop as occupied
-        new_desktop.occupied = True
-        new_desktop.user_id = user_id
+        if desktop.previous_id:
+            availability_cache.apply(desktop.previous_id, desktop.previous_name, None)
+            occupancy_log.record(desktop.previous_id, user_id, RELEASE)
+        availability_cache.apply(desktop.id, desktop.name, user_id)
+        occupancy_log.record(desktop.id, user_id, CLAIM)
 
-        session.commit()
-
-        # Clear the temporary storage
-        del app.temp_desktop_selections[user_id]
-
-        say(f"🟢  You changed {current_desktop.name} -> *{new_desktop.name}*")
-        notify_channel(f"🖥️  *<@{user_id}>* changed desktop from *{current_desktop.name}* -> *{new_desktop.name}*")
+        if desktop.previous_name:
+            reply(f"🟢  You changed {desktop.previous_name} -> *{desktop.name}*")
+            notify_channel(f"🖥️  *<@{user_id}>* changed desktop from *{desktop.previous_name}* -> *{desktop.name}*")
+        else:
+            reply(f"🟢  You are using *{desktop.name}*")
+            notify_channel(f"🖥️    *<@{user_id}>* is now using {desktop.name}")
 
+        if desktop.previous_id:
+            waitlist.offer(desktop.previous_id, released_by=user_id)
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
     except Exception as e:
         logger.error(f"An error occurred while changing desktop: {str(e)}")
-        say("⛔  An error occurred. Please contact maintainer.")
+        reply("⛔  An error occurred. Please contact maintainer.")
 
 
-@app.action("cancel_desktop_change")
-def handle_cancel_desktop_change(ack, body, say):
+def handle_cancel_desktop_change(body, say, respond, client):
     """
     Handles the cancellation of changing to a new desktop.
 
-    This function clears any temporary storage related to the desktop change
+    This function clears the pending selection related to the desktop change
     and informs the user that the change was cancelled.
 
     Args:
-        ack (function): The function to acknowledge receipt of the action from Slack.
         body (dict): The payload of the incoming action request from Slack.
         say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
     """
-    ack()
+    reply = message_updater(body, respond, client, say)
     user_id = body["user"]["id"]
-    
-    # Clear the temporary storage if it exists
-    if hasattr(app, 'temp_desktop_selections') and user_id in app.temp_desktop_selections:
-        del app.temp_desktop_selections[user_id]
 
-    say("⛔  Desktop change cancelled.")
+    try:
+        pending_selections.discard(user_id)
+
+        # Back to the message the change started from
+        current_desktop = availability_cache.desktop_of(user_id)
+        if current_desktop:
+            reply(blocks=occupied_desktop_blocks(current_desktop))
+        else:
+            reply("⛔  Desktop change cancelled.")
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while cancelling desktop change: {str(e)}")
+        reply("⛔  An error occurred. Please contact maintainer.")
 
 
-@app.action("change_desktop")
-def handle_change_desktop(ack, body, say):
+def handle_change_desktop(body, say, respond, client):
     """
     Handles the action of changing a desktop
 
@@ -305,59 +389,109 @@ def handle_change_desktop(ack, body, say):
     and provides options to confirm or cancel the change.
 
     Args:
-        ack (function): The function to acknowledge receipt of the action from Slack.
         body (dict): The payload of the incoming action request from Slack.
         say (function): The function to send a message back to Slack.
+        respond (function): Replaces the message the action came from, through its ``response_url``.
+        client (WebClient): The Slack client, for ``chat.update`` without a ``response_url``.
     """
-    ack()
+    reply = message_updater(body, respond, client, say)
     user_id = body["user"]["id"]
 
     try:
         # Get the current desktop for the user
-        current_desktop = (
-            session.query(Desktop)
-            .filter(Desktop.occupied == True, Desktop.user_id == user_id)
-            .first()
-        )
+        current_desktop = availability_cache.desktop_of(user_id)
 
         if not current_desktop:
-            say("⛔  You are not currently using any desktop.")
+            reply("⛔  You are not currently using any desktop.")
             return
 
         # Get all available desktops
-        available_desktops = session.query(Desktop).filter(Desktop.occupied == False).all()
-
-        # Create options for the dropdown
-        options = [
-            Option(text=PlainTextObject(text=desktop.name), value=str(desktop.id))
-            for desktop in available_desktops
-        ]
-
-        blocks = [
-            SectionBlock(text=f"🟢  You are currently using *{current_desktop.name}*"),
-            ActionsBlock(
-                elements=[
-                    StaticSelectElement(
-                        placeholder=PlainTextObject(text="Select new desktop"),
-                        options=options,
-                        action_id="new_desktop_selection",
-                    ),
-                    ButtonElement(
-                        text="Change",
-                        action_id="confirm_desktop_change",
-                        style="primary",
-                    ),
-                    ButtonElement(
-                        text="Cancel",
-                        action_id="cancel_desktop_change",
-                    ),
-                ]
-            ),
-            DividerBlock(),
-        ]
-
-        say(blocks=blocks)
+        available_desktops = availability_cache.free_desktops()
 
+        reply(blocks=with_stale_notice(change_desktop_blocks(current_desktop, available_desktops)))
+
+    except DatabaseUnavailable:
+        reply(DATABASE_UNAVAILABLE)
     except Exception as e:
         logger.error(f"An error occurred while processing change desktop request: {str(e)}")
+        reply("⛔  An error occurred. Please contact maintainer.")
+
+
+def handle_desktop_search(ack, body):
+    """
+    Answers the type-ahead queries of the desktop dropdowns when they are rendered
+    as an ``external_select``.
+
+    Args:
+        ack (function): The function to answer the query with the matching options.
+        body (dict): The incoming block suggestion payload from Slack.
+    """
+    try:
+        desktops = desktop_search.search(body.get("value", ""), limit=MAX_STATIC_OPTIONS)
+        ack(options=suggested_options(desktops))
+    except Exception as e:
+        logger.error(f"An error occurred while searching desktops: {str(e)}")
+        ack(options=[])
+
+
+def desktop_stats(body, say):
+    """
+    Responds to the '/desktop-stats [days]' slash command with the desktop
+    utilisation of the last days (7 by default), read from the usage rollups.
+
+    Args:
+        body (dict): The incoming slash command payload from Slack.
+        say (function): The function to send a message back to Slack.
+    """
+    try:
+        text = body.get("text", "").strip()
+        days = min(max(int(text), 1), 366) if text.isdigit() else 7
+        with session_scope(read_only=True, user_id=body["user_id"]) as session:
+            report = usage_report(session, days)
+        say(format_usage_report(report, _desktop_name, len(availability_cache.snapshot()[1])))
+    except DatabaseUnavailable:
+        say(DATABASE_UNAVAILABLE)
+    except Exception as e:
+        logger.error(f"An error occurred while reporting desktop usage: {str(e)}")
         say("⛔  An error occurred. Please contact maintainer.")
+
+
+def _desktop_name(desktop_id):
+    desktop = availability_cache.get(desktop_id)
+    return desktop.name if desktop else f"Desktop {desktop_id}"
+
+
+def create_app():
+    """
+    Builds the Bolt app with every listener registered.
+
+    Nothing is sent to Slack here: the ``auth.test`` call Bolt makes to check
+    the token is deferred to the first request, so building the app is
+    cheap. The app shares the process-wide Slack client with the
+    notification workers.
+
+    Returns:
+        App: The app to hand to the Socket Mode or HTTP adapter.
+    """
+    app = App(client=slack_client, token_verification_enabled=False)
+    # Duplicates and requests over their limit are acked before anything else runs
+    app.middleware(dedup_middleware)
+    app.middleware(admission_middleware)
+    instrument_app(app)
+    # Work after the ack runs on its own pool, see ProcessingRunner (relies on Bolt internals, hence the pin)
+    app.listener_runner.lazy_listener_runner = processing_runner
+
+    app.command("/desktop")(ack=acknowledge, lazy=[list_of_desktops])
+    app.command("/desktop-stats")(ack=acknowledge, lazy=[desktop_stats])
+    app.action("desktop_selection")(ack=acknowledge, lazy=[handle_desktop_selection])
+    app.action("leave_desktop")(ack=acknowledge, lazy=[handle_leave_desktop])
+    app.action("renew_lease")(ack=acknowledge, lazy=[handle_renew_lease])
+    app.action("new_desktop_selection")(handle_new_desktop_selection)
+    app.action("confirm_desktop_change")(ack=acknowledge, lazy=[handle_confirm_desktop_change])
+    app.action("cancel_desktop_change")(ack=acknowledge, lazy=[handle_cancel_desktop_change])
+    app.action("change_desktop")(ack=acknowledge, lazy=[handle_change_desktop])
+    app.action("join_waitlist")(ack=acknowledge, lazy=[handle_join_waitlist])
+    app.action("leave_waitlist")(ack=acknowledge, lazy=[handle_leave_waitlist])
+    app.options("desktop_selection")(handle_desktop_search)
+    app.options("new_desktop_selection")(handle_desktop_search)
+    return app
@@ -0,0 +1,42 @@
+"""
+gunicorn settings for the HTTP Events API mode, see :mod:`desktop_dispatcher.web`.
+
+Usage:
+    gunicorn -c python:desktop_dispatcher.gunicorn_config desktop_dispatcher.web:application
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Bolt acks a request on a thread while earlier ones are still processing
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+# Slack retries after 3 seconds, a stuck worker is better restarted
+timeout = 30
+graceful_timeout = 30
+
+# Every worker writes its metrics here and /metrics sums them; must be set before
+# prometheus_client is imported, which is why it happens in the config
+if int(os.getenv("METRICS_PORT", "9090")):
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="dispatcher-metrics-"))
+
+
+def on_starting(server):
+    # A memory store would only be visible to the worker that handled the dropdown
+    if workers > 1 and os.getenv("PENDING_SELECTION_BACKEND", "memory") != "database":
+        raise RuntimeError("Set PENDING_SELECTION_BACKEND=database to run more than one worker")
+
+
+def post_worker_init(worker):
+    from desktop_dispatcher.web import start_worker
+
+    start_worker()
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
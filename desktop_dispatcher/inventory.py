@@ -0,0 +1,357 @@
+"""
+Bulk import and export of the desktop inventory as CSV or JSON lines.
+
+An import is a diff of the whole inventory against the ``desktop`` table,
+applied in one transaction: the file is streamed into a temporary staging
+table (with ``COPY`` on PostgreSQL), and a handful of set-based statements
+then rename, insert and delete desktops. Rows that carry an ``id`` are
+matched on it, rows with only a ``name`` on the name. Occupied desktops are
+never renamed or deleted, so an import never takes a desktop away from
+someone using it. Neither direction holds more than one batch of rows in
+memory, whatever the size of the file.
+
+Run through :mod:`desktop_dispatcher.admin`.
+"""
+import csv
+import io
+import json
+import logging
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    delete,
+    exists,
+    false,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
+
+from .models import Desktop
+from .session import get_engine, is_postgres
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ("id", "name", "occupied", "user_id", "expires_at")
+
+_staging = Table(
+    "desktop_inventory_import",
+    MetaData(),
+    Column("id", Integer),
+    Column("name", String, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+class InventoryError(ValueError):
+    """
+    Raised for an inventory file that cannot be imported, naming the offending line.
+    """
+
+
+def detect_format(path):
+    """
+    Args:
+        path (str): The file name, ``-`` for stdin or stdout.
+
+    Returns:
+        str: ``jsonl`` for ``.jsonl`` and ``.ndjson`` files, else ``csv``.
+    """
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv"
+
+
+@contextmanager
+def _open(path, mode):
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+    else:
+        with open(path, mode, newline="", encoding="utf-8") as file:
+            yield file
+
+
+def _parse(line_number, id, name):
+    name = (name or "").strip()
+    if not name:
+        raise InventoryError(f"line {line_number}: the desktop has no name")
+    if id in (None, ""):
+        return None, name
+    try:
+        return int(id), name
+    except (TypeError, ValueError):
+        raise InventoryError(f"line {line_number}: {id!r} is not a desktop id")
+
+
+def read_inventory(file, format):
+    """
+    Reads an inventory file one row at a time.
+
+    CSV files need a header with a ``name`` column and may have an ``id``
+    column; JSON lines are objects with the same keys. Other columns, such as
+    those of an export, are ignored.
+
+    Args:
+        file: The open file.
+        format (str): ``csv`` or ``jsonl``.
+
+    Yields:
+        tuple[int, str]: The ``id`` (None if not given) and ``name`` of each desktop.
+
+    Raises:
+        InventoryError: If a row has no name or an invalid id.
+    """
+    if format == "csv":
+        reader = csv.DictReader(file)
+        if "name" not in (reader.fieldnames or ()):
+            raise InventoryError("line 1: the CSV header has no name column")
+        for row in reader:
+            yield _parse(reader.line_num, row.get("id"), row["name"])
+        return
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise InventoryError(f"line {line_number}: {str(e)}")
+        yield _parse(line_number, row.get("id"), row.get("name"))
+
+
+class _CopySource(io.TextIOBase):
+    """
+    A file-like view of the rows as CSV text, read by ``COPY ... FROM STDIN`` a chunk at a time.
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pending = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def _batches(rows, size):
+    batch = []
+    for id, name in rows:
+        batch.append({"id": id, "name": name})
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _stage(connection, rows, batch_size):
+    """
+    Loads the rows into the staging table and returns how many there were.
+    """
+    # pysqlite runs DDL outside the transaction, so a rolled back import can leave it behind
+    _staging.drop(connection, checkfirst=True)
+    _staging.create(connection)
+    if is_postgres():
+        counted = _Counted(rows)
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            # A missing id is written as an unquoted empty field, which CSV COPY reads as NULL
+            cursor.copy_expert(
+                f"COPY {_staging.name} (id, name) FROM STDIN WITH (FORMAT csv)",
+                _CopySource(iter(counted)),
+            )
+        finally:
+            cursor.close()
+        staged = counted.count
+    else:
+        staged = 0
+        for batch in _batches(rows, batch_size):
+            connection.execute(insert(_staging), batch)
+            staged += len(batch)
+    connection.execute(text(f"CREATE INDEX ix_{_staging.name}_id ON {_staging.name} (id)"))
+    connection.execute(text(f"CREATE INDEX ix_{_staging.name}_name ON {_staging.name} (name)"))
+    connection.execute(text(f"ANALYZE {_staging.name}"))
+    return staged
+
+
+class _Counted:
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def _count(connection, *conditions):
+    return connection.execute(select(func.count()).select_from(Desktop).where(*conditions)).scalar()
+
+
+def _apply(connection, delete_missing):
+    """
+    Applies the staged inventory to the ``desktop`` table with set-based statements.
+    """
+    by_id = Desktop.id == _staging.c.id
+    by_name = and_(_staging.c.id.is_(None), Desktop.name == _staging.c.name)
+    listed = exists().where(by_id) | exists().where(by_name)
+    renamed_in_file = exists().where(by_id, Desktop.name.is_distinct_from(_staging.c.name))
+
+    stats = {
+        "occupied_not_renamed": _count(connection, Desktop.occupied == True, renamed_in_file),
+        "occupied_not_deleted": (
+            _count(connection, Desktop.occupied == True, ~listed) if delete_missing else 0
+        ),
+    }
+    stats["renamed"] = connection.execute(
+        update(Desktop)
+        .where(by_id, Desktop.occupied == False, Desktop.name.is_distinct_from(_staging.c.name))
+        .values(name=_staging.c.name)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    stats["deleted"] = (
+        connection.execute(
+            delete(Desktop)
+            .where(Desktop.occupied == False, ~listed)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if delete_missing
+        else 0
+    )
+    inserted_with_id = connection.execute(
+        insert(Desktop).from_select(
+            ["id", "name", "occupied"],
+            select(_staging.c.id, func.min(_staging.c.name), false())
+            .where(_staging.c.id.is_not(None), ~exists().where(Desktop.id == _staging.c.id))
+            .group_by(_staging.c.id),
+        )
+    ).rowcount
+    inserted_by_name = connection.execute(
+        insert(Desktop).from_select(
+            ["name", "occupied"],
+            # NOT IN rather than NOT EXISTS: desktop.name has no index, and both
+            # databases hash the subquery once instead of scanning it per row
+            select(_staging.c.name, false())
+            .where(
+                _staging.c.id.is_(None),
+                _staging.c.name.not_in(select(Desktop.name).where(Desktop.name.is_not(None))),
+            )
+            .distinct(),
+        )
+    ).rowcount
+    stats["inserted"] = inserted_with_id + inserted_by_name
+    if inserted_with_id and is_postgres():
+        # Explicit ids do not advance the serial; keep it ahead of them
+        connection.execute(
+            text("SELECT setval(pg_get_serial_sequence('desktop', 'id'), (SELECT max(id) FROM desktop))")
+        )
+    return stats
+
+
+def import_inventory(path, format=None, delete_missing=True, dry_run=False, batch_size=5000):
+    """
+    Makes the ``desktop`` table match an inventory file, in one transaction.
+
+    Desktops in the file but not in the table are inserted, desktops whose
+    name changed are renamed and, with ``delete_missing``, desktops not in the
+    file are deleted, except for occupied ones, which are counted instead.
+
+    Args:
+        path (str): The inventory file, ``-`` for stdin.
+        format (str): ``csv`` or ``jsonl``; detected from the file name if not given.
+        delete_missing (bool): Whether to delete free desktops missing from the file.
+        dry_run (bool): Roll back instead of committing, to preview the diff.
+        batch_size (int): Rows per INSERT when the database has no ``COPY``.
+
+    Returns:
+        dict: The ``rows`` read and the desktops ``inserted``, ``renamed`` and ``deleted``,
+        and how many occupied desktops were left as they are.
+
+    Raises:
+        InventoryError: If the file cannot be read; nothing is changed then.
+    """
+    format = format or detect_format(path)
+    with _open(path, "r") as file, get_engine().connect() as connection:
+        transaction = connection.begin()
+        try:
+            stats = {"rows": _stage(connection, read_inventory(file, format), batch_size)}
+            stats.update(_apply(connection, delete_missing))
+            _staging.drop(connection)
+        except Exception:
+            transaction.rollback()
+            raise
+        if dry_run:
+            transaction.rollback()
+        else:
+            transaction.commit()
+    logger.info(f"Imported desktop inventory from {path}: {stats}")
+    return stats
+
+
+def _export_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def export_inventory(path, format=None, batch_size=5000):
+    """
+    Writes every desktop, with its occupant and lease, to an inventory file.
+
+    The output can be edited and imported again; only ``id`` and ``name`` are read back.
+
+    Args:
+        path (str): The inventory file, ``-`` for stdout.
+        format (str): ``csv`` or ``jsonl``; detected from the file name if not given.
+        batch_size (int): Rows fetched from the database at a time.
+
+    Returns:
+        int: The number of desktops written.
+    """
+    format = format or detect_format(path)
+    query = select(*(getattr(Desktop, column) for column in EXPORT_COLUMNS)).order_by(Desktop.id)
+    count = 0
+    with _open(path, "w") as file, get_engine().connect() as connection:
+        if format == "csv" and is_postgres():
+            compiled = query.compile(connection, compile_kwargs={"literal_binds": True})
+            cursor = connection.connection.dbapi_connection.cursor()
+            try:
+                cursor.copy_expert(f"COPY ({compiled}) TO STDOUT WITH (FORMAT csv, HEADER)", file)
+                count = cursor.rowcount
+            finally:
+                cursor.close()
+            return count
+
+        writer = csv.writer(file, lineterminator="\n") if format == "csv" else None
+        if writer:
+            writer.writerow(EXPORT_COLUMNS)
+        rows = connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                file.write(
+                    json.dumps(dict(zip(EXPORT_COLUMNS, map(_export_value, row))), ensure_ascii=False) + "\n"
+                )
+            count += 1
+    return count
@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from .cache import availability_cache
+from .notifications import notify_channel
+from .occupancy import RELEASE, occupancy_log
+from .repository import release_expired_leases
+from .session import session_scope
+from .waitlist import waitlist
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseSweeper:
+    """
+    Releases desktops whose occupants neither left nor renewed their lease in time.
+
+    Every ``interval`` seconds the expired leases are released with one
+    set-based UPDATE per ``batch_size`` desktops (see
+    :func:`desktop_dispatcher.repository.release_expired_leases`), each batch
+    in its own transaction, and the whole cycle is announced in a single
+    channel notification however many desktops it freed. The freed desktops
+    are then offered to the waitlist, one handover per desktop, until the
+    queue is empty.
+
+    Args:
+        interval (float): The time between two sweeps, in seconds.
+        batch_size (int): The maximum number of desktops released per statement.
+        notify (function): Sends a message to the notification channel.
+        max_listed (int): How many desktops the notification names before summarising the rest.
+    """
+
+    def __init__(self, interval=60.0, batch_size=10000, notify=notify_channel, max_listed=30):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.notify = notify
+        self.max_listed = max_listed
+        self.counters = Counter()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the background thread. Calling it again is a no-op.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="lease-sweeper", daemon=True
+                )
+                self._thread.start()
+
+    def run(self, now=None):
+        """
+        Releases every lease expired at ``now`` and sends one notification about them.
+
+        Args:
+            now (datetime): The current time, for benchmarks.
+
+        Returns:
+            list[ExpiredLease]: The released desktops with their former occupants.
+        """
+        now = now or datetime.now(timezone.utc)
+        released = []
+        while True:
+            with session_scope() as session:
+                batch = release_expired_leases(session, now, self.batch_size)
+            released += batch
+            self._add("statements", 1)
+            if len(batch) < self.batch_size:
+                break
+
+        for lease in released:
+            availability_cache.apply(lease.id, lease.name, None)
+            occupancy_log.record(lease.id, lease.user_id, RELEASE)
+        if released:
+            self.notify(self.format_released(released))
+        for lease in released:
+            if waitlist.offer(lease.id) is None:
+                break
+        self._add("sweeps", 1)
+        self._add("released", len(released))
+        return released
+
+    def format_released(self, released):
+        """
+        Renders the channel notification for the leases released in one sweep.
+
+        Args:
+            released (list[ExpiredLease]): The released desktops.
+
+        Returns:
+            str: The message in Slack mrkdwn.
+        """
+        listed = ", ".join(
+            f"*{lease.name}* (<@{lease.user_id}>)" for lease in released[: self.max_listed]
+        )
+        more = len(released) - self.max_listed
+        if more > 0:
+            listed += f" and {more} more"
+        plural = "s" if len(released) > 1 else ""
+        return f"⏰  Released {len(released)} desktop{plural} whose lease expired: {listed}"
+
+    def stats(self):
+        """
+        Returns the sweep, statement and released desktop counters.
+        """
+        with self._lock:
+            return dict(self.counters)
+
+    def _loop(self):
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                self._add("failures", 1)
+                logger.error(f"Lease sweep failed: {str(e)}")
+            time.sleep(self.interval)
+
+    def _add(self, counter, amount):
+        with self._lock:
+            self.counters[counter] += amount
+
+
+lease_sweeper = LeaseSweeper(
+    interval=float(os.getenv("LEASE_SWEEP_INTERVAL", "60")),
+    batch_size=int(os.getenv("LEASE_SWEEP_BATCH_SIZE", "10000")),
+)
@@ -1,8 +1,124 @@
-from slack_bolt.adapter.socket_mode import SocketModeHandler
+import asyncio
+import atexit
+import os
+import signal
+import sys
+import threading
 
-from .events import app
-from .utils import get_env_variable
+from .config import load_config
+
+
+def run_sync():
+    """
+    Runs the listeners on Bolt's thread pool with the synchronous SocketModeHandler.
+    """
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+
+    from .cache import availability_cache
+    from .events import create_app
+    from .leases import lease_sweeper
+    from .metrics import start_metrics_server
+    from .notifications import dispatcher, notification_mode
+    from .occupancy import occupancy_log, usage_rollup
+    from .processing import processing_runner
+    from .search import desktop_search
+    from .status_board import status_board
+    from .utils import channel_resolver, get_env_variable
+
+    # Turn SIGTERM (pod shutdown) into a normal exit so queued notifications are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    atexit.register(dispatcher.shutdown)
+    atexit.register(status_board.shutdown)
+    atexit.register(occupancy_log.shutdown)
+    # Registered last so it runs first: processing still enqueues notifications
+    atexit.register(processing_runner.shutdown)
+
+    start_metrics_server(dispatcher)
+    handler = SocketModeHandler(create_app(), get_env_variable('SLACK_APP_TOKEN'))
+    # Connect first: requests arriving before the caches are warm load what they need themselves
+    handler.connect()
+    channel_resolver.warm()
+    desktop_search.warm()
+    availability_cache.start_listener()
+    dispatcher.start()
+    if notification_mode == "board":
+        status_board.start()
+    usage_rollup.start()
+    lease_sweeper.start()
+    threading.Event().wait()
+
+
+async def run_async():
+    """
+    Runs the asyncio listeners on a single event loop with the AsyncSocketModeHandler.
+    """
+    import aiohttp
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+    from .async_events import create_async_app
+    from .async_notifications import async_channel_resolver, async_dispatcher, async_slack_client
+    from .cache import availability_cache
+    from .leases import lease_sweeper
+    from .metrics import start_metrics_server
+    from .notifications import notification_mode
+    from .occupancy import occupancy_log, usage_rollup
+    from .search import desktop_search
+    from .status_board import status_board
+    from .utils import get_env_variable
+
+    # One HTTP connection pool for every Web API call made on this loop
+    async_slack_client.session = aiohttp.ClientSession()
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    start_metrics_server(async_dispatcher)
+    handler = AsyncSocketModeHandler(create_async_app(), get_env_variable('SLACK_APP_TOKEN'))
+    # Connect first: requests arriving before the caches are warm load what they need themselves
+    await handler.connect_async()
+    try:
+        await async_channel_resolver.warm()
+        await availability_cache.refresh_async()
+        desktop_search.warm()
+        availability_cache.start_listener()
+        async_dispatcher.start()
+        if notification_mode == "board":
+            status_board.start()
+        usage_rollup.start()
+        lease_sweeper.start()
+        await stop.wait()
+    finally:
+        await handler.close_async()
+        await async_dispatcher.shutdown()
+        await asyncio.to_thread(status_board.shutdown)
+        await asyncio.to_thread(occupancy_log.shutdown)
+        await async_slack_client.session.close()
+
+
+def run_http():
+    """
+    Serves the listeners over the HTTP Events API with a gunicorn worker per core.
+    """
+    # Workers are separate processes, selections must be visible to all of them
+    os.environ.setdefault("PENDING_SELECTION_BACKEND", "database")
+    os.execvp(
+        "gunicorn",
+        [
+            "gunicorn",
+            "--config",
+            "python:desktop_dispatcher.gunicorn_config",
+            "desktop_dispatcher.web:application",
+        ],
+    )
 
 
 if __name__ == "__main__":
-    SocketModeHandler(app, get_env_variable('SLACK_APP_TOKEN')).start()
+    # The runtime is imported lazily so each mode only loads its own Slack client and database driver
+    mode = os.getenv("DISPATCHER_MODE", "sync")
+    load_config(mode)
+    if mode == "async":
+        asyncio.run(run_async())
+    elif mode == "http":
+        run_http()
+    else:
+        run_sync()
@@ -0,0 +1,104 @@
+"""
+Replies to button clicks and menu choices by editing the message they came from.
+
+Posting every reply as a new message left a trail of superseded messages
+whose buttons still worked, and cost a ``chat.postMessage`` against the
+rate limit each. :func:`update_message` instead replaces the originating
+message: through the interaction's ``response_url`` (``respond`` with
+``replace_original``, which is not a Web API call), else with
+``chat.update`` on the message's ``ts``, and only posts a new message when
+the interaction has no message to edit. A reply without blocks turns the
+message into static text, so its controls cannot be clicked again.
+"""
+import functools
+import logging
+
+from .metrics import MESSAGE_REPLIES
+
+logger = logging.getLogger(__name__)
+
+
+def _container(body):
+    container = body.get("container") or {}
+    if container.get("type") == "message" and container.get("message_ts"):
+        return container.get("channel_id"), container["message_ts"]
+    return None, None
+
+
+def update_message(body, respond, client, say, text="", blocks=None):
+    """
+    Replaces the message an interaction came from with a new text and blocks.
+
+    Args:
+        body (dict): The payload of the incoming action request from Slack.
+        respond (function): Bolt's ``respond``, None if the payload has no ``response_url``.
+        client (WebClient): The client for ``chat.update``.
+        say (function): Posts a new message, the fallback.
+        text (str): The new text; the notification text when there are blocks.
+        blocks (list[dict]): The new blocks, None for a plain text message.
+    """
+    if respond is not None and body.get("response_url"):
+        try:
+            response = respond(text=text, blocks=blocks, replace_original=True)
+            if response.status_code == 200:
+                MESSAGE_REPLIES.labels("response_url").inc()
+                return
+            logger.warning(f"response_url rejected the update with {response.status_code}: {response.body}")
+        except Exception as e:
+            logger.warning(f"Could not update the message through its response_url: {str(e)}")
+
+    channel, ts = _container(body)
+    if ts:
+        try:
+            client.chat_update(channel=channel, ts=ts, text=text, blocks=blocks or [])
+            MESSAGE_REPLIES.labels("chat_update").inc()
+            return
+        except Exception as e:
+            logger.warning(f"Could not update the message with chat.update: {str(e)}")
+
+    say(text=text, blocks=blocks)
+    MESSAGE_REPLIES.labels("new_message").inc()
+
+
+def message_updater(body, respond, client, say):
+    """
+    Binds :func:`update_message` to one interaction.
+
+    Returns:
+        function: Takes the ``text`` and ``blocks`` that replace the originating message.
+    """
+    return functools.partial(update_message, body, respond, client, say)
+
+
+async def update_message_async(body, respond, client, say, text="", blocks=None):
+    """
+    Async version of :func:`update_message`.
+    """
+    if respond is not None and body.get("response_url"):
+        try:
+            response = await respond(text=text, blocks=blocks, replace_original=True)
+            if response.status_code == 200:
+                MESSAGE_REPLIES.labels("response_url").inc()
+                return
+            logger.warning(f"response_url rejected the update with {response.status_code}: {response.body}")
+        except Exception as e:
+            logger.warning(f"Could not update the message through its response_url: {str(e)}")
+
+    channel, ts = _container(body)
+    if ts:
+        try:
+            await client.chat_update(channel=channel, ts=ts, text=text, blocks=blocks or [])
+            MESSAGE_REPLIES.labels("chat_update").inc()
+            return
+        except Exception as e:
+            logger.warning(f"Could not update the message with chat.update: {str(e)}")
+
+    await say(text=text, blocks=blocks)
+    MESSAGE_REPLIES.labels("new_message").inc()
+
+
+def message_updater_async(body, respond, client, say):
+    """
+    Async version of :func:`message_updater`.
+    """
+    return functools.partial(update_message_async, body, respond, client, say)
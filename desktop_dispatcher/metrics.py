@@ -0,0 +1,322 @@
+"""
+Prometheus metrics for the hot paths: Bolt listeners, SQL statements and Slack Web API calls.
+
+The metrics are served in the Prometheus text format by :func:`start_metrics_server`
+from the bot process itself, on ``METRICS_PORT`` (9090 by default, 0 disables it).
+"""
+import logging
+import os
+import time
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from slack_bolt.context.say import Say
+from slack_bolt.listener.listener_completion_handler import ListenerCompletionHandler
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LISTENER_SECONDS = Histogram(
+    "dispatcher_listener_seconds",
+    "Time from receiving a Slack request until its listener (or the ack function of a lazy listener) returned.",
+    ["listener"],
+    buckets=LATENCY_BUCKETS,
+)
+PROCESSING_SECONDS = Histogram(
+    "dispatcher_processing_seconds",
+    "Time from receiving a Slack request until its processing after the ack finished.",
+    ["listener"],
+    buckets=LATENCY_BUCKETS,
+)
+PROCESSING_BACKLOG = Gauge(
+    "dispatcher_processing_backlog",
+    "Acknowledged requests waiting for or in processing.",
+    multiprocess_mode="livesum",
+)
+LISTENER_ERRORS = Counter(
+    "dispatcher_listener_errors_total",
+    "Listeners that raised instead of handling their error.",
+    ["listener"],
+)
+SQL_SECONDS = Histogram(
+    "dispatcher_sql_statement_seconds",
+    "Execution time of SQL statements by their leading keyword.",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+SQL_STATEMENTS = Counter(
+    "dispatcher_sql_statements_total",
+    "SQL statements by the database that ran them: primary or replica.",
+    ["target"],
+)
+REPLICA_FALLBACKS = Counter(
+    "dispatcher_db_replica_fallbacks_total",
+    "Read-only sessions sent to the primary because of a recent write, or moved there because they wrote.",
+    ["reason"],
+)
+BREAKER_STATE = Gauge(
+    "dispatcher_circuit_breaker_state",
+    "State of a circuit breaker: 0 closed, 1 half-open (probing), 2 open.",
+    ["breaker"],
+    multiprocess_mode="livemax",
+)
+SLACK_API_SECONDS = Histogram(
+    "dispatcher_slack_api_seconds",
+    "Duration of Slack Web API calls.",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+SLACK_API_ERRORS = Counter(
+    "dispatcher_slack_api_errors_total",
+    "Slack Web API calls that failed, by Slack error code.",
+    ["method", "error"],
+)
+SLACK_API_RATE_LIMITED = Counter(
+    "dispatcher_slack_api_rate_limited_total",
+    "Slack Web API calls rejected with HTTP 429.",
+    ["method"],
+)
+MESSAGE_REPLIES = Counter(
+    "dispatcher_message_replies_total",
+    "Replies to interactions by how they reached the user: response_url, chat_update or new_message.",
+    ["via"],
+)
+DUPLICATE_INTERACTIONS = Counter(
+    "dispatcher_duplicate_interactions_total",
+    "Interactions acked without running their listener: redelivery or repeated_click.",
+    ["reason"],
+)
+ADMISSION_REJECTIONS = Counter(
+    "dispatcher_admission_rejections_total",
+    "Requests refused by admission control, by the bucket that was empty (user or global) and command or action_id.",
+    ["scope", "name"],
+)
+NOTIFICATION_QUEUE_DEPTH = Gauge(
+    "dispatcher_notification_queue_depth",
+    "Channel notifications waiting to be delivered.",
+)
+
+
+def listener_name(body):
+    """
+    Names the listener a Slack request is routed to, used as the metric label.
+
+    Args:
+        body (dict): The incoming request payload.
+
+    Returns:
+        str: The slash command, the ``action_id`` or the event type.
+    """
+    if "command" in body:
+        return body["command"]
+    if body.get("type") == "block_actions" and body.get("actions"):
+        return body["actions"][0].get("action_id", "unknown")
+    if body.get("type") == "block_suggestion":
+        return body.get("action_id", "unknown")
+    if "event" in body:
+        return body["event"].get("type", "unknown")
+    return body.get("type", "unknown")
+
+
+def record_listener(context, body, response):
+    started_at = context.get("metrics_started_at")
+    if started_at is None:
+        return
+    name = listener_name(body)
+    LISTENER_SECONDS.labels(name).observe(time.perf_counter() - started_at)
+    if response is not None and response.status >= 500:
+        LISTENER_ERRORS.labels(name).inc()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info["metrics_started_at"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    SQL_SECONDS.labels(operation).observe(time.perf_counter() - started_at)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_started_at"):
+        connection.info["metrics_started_at"].pop()
+
+
+def instrument_engine(engine, target="primary"):
+    """
+    Records the latency and count of every SQL statement run on an engine.
+
+    Args:
+        engine (Engine): The engine to instrument; pass ``sync_engine`` of an AsyncEngine.
+        target (str): ``primary`` or ``replica``, the label of the statement counter.
+    """
+    statements = SQL_STATEMENTS.labels(target)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "after_cursor_execute", lambda *args: statements.inc())
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def record_slack_error(api_method, error):
+    if isinstance(error, SlackApiError):
+        if error.response.status_code == 429:
+            SLACK_API_RATE_LIMITED.labels(api_method).inc()
+        SLACK_API_ERRORS.labels(api_method, error.response.get("error") or "unknown").inc()
+    else:
+        SLACK_API_ERRORS.labels(api_method, type(error).__name__).inc()
+
+
+class InstrumentedWebClient(WebClient):
+    """
+    A WebClient that records the duration and failures of every API call.
+    """
+
+    @classmethod
+    def wrap(cls, client):
+        """
+        Returns an instrumented client with the same token and settings as ``client``.
+        """
+        return cls(
+            token=client.token,
+            base_url=client.base_url,
+            timeout=client.timeout,
+            ssl=client.ssl,
+            proxy=client.proxy,
+            headers=client.headers,
+            team_id=client.default_params.get("team_id"),
+            retry_handlers=client.retry_handlers,
+        )
+
+    def api_call(self, api_method, *args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return super().api_call(api_method, *args, **kwargs)
+        except Exception as e:
+            record_slack_error(api_method, e)
+            raise
+        finally:
+            SLACK_API_SECONDS.labels(api_method).observe(time.perf_counter() - started_at)
+
+
+def listener_timing_middleware(context, next):
+    """
+    Bolt global middleware stamping when a request arrived, see :func:`instrument_app`.
+
+    Bolt hands each request a fresh plain ``WebClient``; it is swapped for an
+    instrumented one, and ``say`` (already bound to the plain client by the
+    time middleware runs) is rebuilt on top of it.
+    """
+    context["metrics_started_at"] = time.perf_counter()
+    context["client"] = InstrumentedWebClient.wrap(context.client)
+    context["say"] = Say(client=context.client, channel=context.channel_id)
+    next()
+
+
+class _ListenerTimer(ListenerCompletionHandler):
+    def handle(self, request, response):
+        record_listener(request.context, request.body, response)
+
+
+def instrument_app(app):
+    """
+    Times every listener of a Bolt app.
+
+    Bolt runs global middleware before the listener is picked, and then runs
+    the listener on a worker (after the ack has been sent) without returning
+    through the middleware. So the middleware only stamps the arrival time and
+    the observation is made by the listener runner's completion handler.
+
+    Args:
+        app (App): The app to instrument; see :func:`desktop_dispatcher.async_metrics.instrument_async_app`
+            for an AsyncApp.
+    """
+    app.middleware(listener_timing_middleware)
+    app.listener_runner.listener_completion_handler = _ListenerTimer()
+
+
+class StatsCollector:
+    """
+    Exposes the values of a stats dict, e.g. :func:`desktop_dispatcher.session.pool_stats`, as gauges.
+
+    Args:
+        prefix (str): The metric name prefix, e.g. ``dispatcher_db_pool``.
+        documentation (str): The help text shared by the gauges.
+        stats (function): Returns the current stats as a dict of numbers.
+        labels (dict): Constant labels of every gauge, e.g. the ``pid`` of a gunicorn worker.
+    """
+
+    def __init__(self, prefix, documentation, stats, labels=None):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+        self.labels = labels or {}
+
+    def collect(self):
+        for key, value in self.stats().items():
+            gauge = GaugeMetricFamily(f"{self.prefix}_{key}", self.documentation, labels=list(self.labels))
+            gauge.add_metric(list(self.labels.values()), value)
+            yield gauge
+
+
+def register_stats(prefix, documentation, stats, registry=REGISTRY, labels=None):
+    """
+    Publishes a stats function through a :class:`StatsCollector`.
+    """
+    registry.register(StatsCollector(prefix, documentation, stats, labels))
+
+
+def register_collectors(notification_dispatcher, registry=REGISTRY, labels=None):
+    """
+    Publishes the notification queue depth and the stats of the process's components.
+
+    Args:
+        notification_dispatcher: The dispatcher whose ``queue_depth`` is reported.
+        registry (CollectorRegistry): The registry the stats are added to.
+        labels (dict): Constant labels of the stats gauges.
+    """
+    from .admission import admission_controller
+    from .breaker import database_breaker, replica_breaker
+    from .dedup import interaction_dedup
+    from .leases import lease_sweeper
+    from .occupancy import occupancy_log
+    from .selections import pending_selections
+    from .session import pool_stats
+    from .status_board import status_board
+    from .waitlist import waitlist
+
+    NOTIFICATION_QUEUE_DEPTH.set_function(lambda: notification_dispatcher.queue_depth)
+    for prefix, documentation, stats in (
+        ("dispatcher_db_pool", "Connection pool of the synchronous engine.", pool_stats),
+        ("dispatcher_pending_selections", "Pending desktop selection store counters.", pending_selections.stats),
+        ("dispatcher_interaction_dedup", "Duplicate interaction filter counters.", interaction_dedup.stats),
+        ("dispatcher_admission", "Admission control counters.", admission_controller.stats),
+        ("dispatcher_occupancy_log", "Occupancy event writer counters.", occupancy_log.stats),
+        ("dispatcher_lease_sweeper", "Expired lease sweeper counters.", lease_sweeper.stats),
+        ("dispatcher_status_board", "Channel status board counters.", status_board.stats),
+        ("dispatcher_waitlist", "Desktop waitlist counters.", waitlist.stats),
+        ("dispatcher_database_breaker", "Database circuit breaker counters.", database_breaker.stats),
+        ("dispatcher_replica_breaker", "Read replica circuit breaker counters.", replica_breaker.stats),
+    ):
+        register_stats(prefix, documentation, stats, registry=registry, labels=labels)
+
+
+def start_metrics_server(notification_dispatcher):
+    """
+    Serves all metrics on ``METRICS_PORT`` from a background thread.
+
+    Args:
+        notification_dispatcher: The dispatcher whose ``queue_depth`` is reported.
+    """
+    metrics_port = int(os.getenv("METRICS_PORT", "9090"))
+    if not metrics_port:
+        return
+    register_collectors(notification_dispatcher)
+    start_http_server(metrics_port)
+    logger.info(f"Serving metrics on port {metrics_port}")
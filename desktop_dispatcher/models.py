@@ -1,5 +1,9 @@
 from sqlalchemy import (
+    BigInteger,
     Column,
+    DateTime,
+    Float,
+    Index,
     Integer,
     String,
     Boolean
@@ -17,6 +21,9 @@ class Desktop(Base):
         user_id (str): The ID of the user currently using the desktop.
         name (str): The name of the desktop.
         occupied (bool): Indicates whether the desktop is currently occupied.
+        claimed_at (datetime): When the current occupant claimed the desktop.
+        expires_at (datetime): When the lease of the current occupant runs out
+            unless they renew it.
     """
     __tablename__ = 'desktop'
 
@@ -24,3 +31,154 @@ class Desktop(Base):
     user_id = Column(String, default=None)
     name = Column(String, default=None)
     occupied = Column(Boolean, default=False)
+    claimed_at = Column(DateTime(timezone=True), default=None)
+    expires_at = Column(DateTime(timezone=True), default=None)
+
+    __table_args__ = (
+        # Serves the free-desktop listing
+        Index(
+            'ix_desktop_free',
+            id,
+            postgresql_where=occupied == False,
+            sqlite_where=occupied == False,
+        ),
+        # Serves the "current desktop of a user" lookup and allows one desktop per user
+        Index(
+            'ix_desktop_occupied_user_id',
+            user_id,
+            unique=True,
+            postgresql_where=occupied == True,
+            sqlite_where=occupied == True,
+        ),
+        # Serves the lease sweeper, which only looks at occupied desktops
+        Index(
+            'ix_desktop_lease_expires_at',
+            expires_at,
+            postgresql_where=occupied == True,
+            sqlite_where=occupied == True,
+        ),
+    )
+
+
+class PendingSelection(Base):
+    """
+    A desktop a user picked in the 'Change desktop' dropdown but has not confirmed yet.
+
+    Attributes:
+        user_id (str): The ID of the user who made the selection.
+        desktop_id (int): The ID of the selected desktop.
+        expires_at (datetime): When the selection stops being valid.
+    """
+    __tablename__ = 'pending_selection'
+
+    user_id = Column(String, primary_key=True)
+    desktop_id = Column(Integer, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class OccupancyEvent(Base):
+    """
+    One claim or release of a desktop. Rows are only ever appended.
+
+    Attributes:
+        id (int): The unique identifier for the event, in insertion order.
+        desktop_id (int): The ID of the desktop.
+        user_id (str): The ID of the user who claimed or released it.
+        kind (str): ``claim`` or ``release``.
+        occurred_at (datetime): When the listener handled it.
+    """
+    __tablename__ = 'occupancy_event'
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    desktop_id = Column(Integer, nullable=False)
+    user_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)
+    occurred_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class DesktopUsage(Base):
+    """
+    How long a desktop was occupied during one hour or one day (UTC).
+
+    Attributes:
+        desktop_id (int): The ID of the desktop.
+        granularity (str): ``hour`` or ``day``.
+        period_start (datetime): The start of the hour or day.
+        occupied_seconds (float): The time the desktop was occupied within the period.
+        claims (int): The number of claims within the period.
+    """
+    __tablename__ = 'desktop_usage'
+
+    desktop_id = Column(Integer, primary_key=True)
+    granularity = Column(String, primary_key=True)
+    period_start = Column(DateTime(timezone=True), primary_key=True)
+    occupied_seconds = Column(Float, nullable=False, default=0)
+    claims = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Serves the reports, which read one granularity over a time range
+        Index('ix_desktop_usage_granularity_period_start', granularity, period_start),
+    )
+
+
+class UsageRollupProgress(Base):
+    """
+    The single row recording up to when the occupancy events are rolled up.
+
+    Attributes:
+        id (int): Always 1.
+        processed_until (datetime): The end of the last hour rolled up.
+    """
+    __tablename__ = 'usage_rollup_progress'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    processed_until = Column(DateTime(timezone=True), nullable=False)
+
+
+class OpenOccupancy(Base):
+    """
+    A desktop that was occupied at ``UsageRollupProgress.processed_until``,
+    carried over to the next hour the rollup processes.
+
+    Attributes:
+        desktop_id (int): The ID of the desktop.
+        user_id (str): The occupant.
+        since (datetime): When the desktop was claimed.
+    """
+    __tablename__ = 'open_occupancy'
+
+    desktop_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(String, nullable=False)
+    since = Column(DateTime(timezone=True), nullable=False)
+
+
+class ProcessedInteraction(Base):
+    """
+    An interaction already handled by some replica, see :mod:`desktop_dispatcher.dedup`.
+
+    Attributes:
+        key (str): The dedup key of the interaction.
+        expires_at (datetime): When a repeat of it stops counting as a duplicate.
+    """
+    __tablename__ = 'processed_interaction'
+
+    key = Column(String, primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class WaitlistEntry(Base):
+    """
+    A user waiting for a desktop to be freed, see :mod:`desktop_dispatcher.waitlist`.
+
+    Attributes:
+        id (int): Breaks ties between users who joined at the same time.
+        user_id (str): The ID of the waiting user.
+        joined_at (datetime): When the user joined the waitlist; earlier entries are served first.
+        expires_at (datetime): When the user stops waiting.
+    """
+    __tablename__ = 'waitlist_entry'
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    user_id = Column(String, nullable=False, unique=True)
+    joined_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
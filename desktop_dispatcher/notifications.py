@@ -0,0 +1,216 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+from .utils import channel_resolver, notification_channel_name, slack_client
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class NotificationDispatcher:
+    """
+    Delivers channel notifications from a bounded in-process queue.
+
+    Listeners only enqueue messages; dedicated worker threads post them with
+    ``chat.postMessage``. Rate-limited calls (HTTP 429) are retried after the
+    ``Retry-After`` interval Slack asks for, transient failures are retried with
+    exponential backoff, and anything else is logged and dropped.
+
+    Args:
+        client (WebClient): The Slack client used to post messages.
+        resolver (ChannelResolver): Resolves the channel name to a channel ID.
+        channel_name (str): The name of the channel notifications go to.
+        maxsize (int): The maximum number of queued notifications.
+        workers (int): The number of worker threads.
+        max_retries (int): How many times a single message is retried.
+        backoff_base (float): The first backoff delay in seconds, doubled on each retry.
+        backoff_max (float): The upper bound for a single backoff delay in seconds.
+    """
+
+    def __init__(
+        self,
+        client,
+        resolver,
+        channel_name,
+        maxsize=1000,
+        workers=1,
+        max_retries=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+    ):
+        self.client = client
+        self.resolver = resolver
+        self.channel_name = channel_name
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        """
+        int: The number of notifications waiting to be delivered.
+        """
+        return self._queue.qsize()
+
+    def start(self):
+        """
+        Starts the worker threads. Calling it again is a no-op.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"notification-worker-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, message):
+        """
+        Queues a message for delivery without waiting for Slack.
+
+        Args:
+            message (str): The message to send to the notification channel.
+
+        Returns:
+            bool: False if the queue is full and the message was dropped.
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except queue.Full:
+            logger.error(f"Notification queue is full, dropping message: {message}")
+            return False
+
+    def shutdown(self, timeout=10.0):
+        """
+        Delivers everything already queued and stops the workers.
+
+        Args:
+            timeout (float): How long to wait for the queue to drain, in seconds.
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        if self.queue_depth:
+            logger.error(f"{self.queue_depth} notifications were not delivered before shutdown")
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            try:
+                if message is _STOP:
+                    return
+                self._deliver(message)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, message):
+        for attempt in range(self.max_retries + 1):
+            delay = self._post(message, attempt)
+            if delay is None:
+                return
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        logger.error(f"Giving up on notification after {self.max_retries} retries: {message}")
+
+    def _post(self, message, attempt):
+        """
+        Makes one delivery attempt.
+
+        Returns:
+            float: The delay before the next attempt, or None if no retry is needed.
+        """
+        channel_id = self.resolver.resolve(self.channel_name)
+        if not channel_id:
+            logger.error(f"Channel {self.channel_name} not found.")
+            return None
+        try:
+            self.client.chat_postMessage(channel=channel_id, text=message)
+            return None
+        except Exception as e:
+            if is_channel_not_found(e):
+                self.resolver.invalidate(self.channel_name)
+            return retry_delay(e, attempt, self.backoff_base, self.backoff_max)
+
+
+def is_channel_not_found(error):
+    """
+    Tells whether Slack rejected a message because the channel ID is unknown.
+    """
+    return isinstance(error, SlackApiError) and error.response.get("error") == "channel_not_found"
+
+
+def retry_delay(error, attempt, backoff_base, backoff_max):
+    """
+    Decides whether and when a failed ``chat.postMessage`` is retried.
+
+    Args:
+        error (Exception): The error raised by the Slack client.
+        attempt (int): The zero-based number of the failed attempt.
+        backoff_base (float): The first backoff delay in seconds.
+        backoff_max (float): The upper bound for a single backoff delay in seconds.
+
+    Returns:
+        float: The delay before the next attempt, or None if the message should be dropped.
+    """
+    backoff = min(backoff_base * 2**attempt, backoff_max)
+    if not isinstance(error, SlackApiError):
+        logger.warning(f"Transient error sending notification, retrying: {str(error)}")
+        return backoff
+    status_code = error.response.status_code
+    if status_code == 429:
+        return float(error.response.headers.get("Retry-After", backoff))
+    if is_channel_not_found(error):
+        # The cached channel ID is stale, retry right away with a fresh one
+        return 0
+    if status_code >= 500:
+        return backoff
+    logger.error(f"Failed to send notification to channel: {str(error)}")
+    return None
+
+
+# messages: one message per change; board: the pinned status board, see desktop_dispatcher.status_board
+notification_mode = os.getenv("NOTIFICATION_MODE", "messages")
+
+dispatcher = NotificationDispatcher(
+    slack_client,
+    channel_resolver,
+    notification_channel_name,
+    maxsize=int(os.getenv("NOTIFICATION_QUEUE_SIZE", "1000")),
+    workers=int(os.getenv("NOTIFICATION_WORKERS", "1")),
+    max_retries=int(os.getenv("NOTIFICATION_MAX_RETRIES", "5")),
+)
+
+
+def notify_channel(message):
+    """
+    Queues a message for the notification channel, or with ``NOTIFICATION_MODE=board``
+    marks the status board as changed instead.
+
+    Args:
+        message (str): The message to send to the Slack channel.
+    """
+    if notification_mode == "board":
+        # Imported here: the board builds on this module
+        from .status_board import status_board
+
+        status_board.touch()
+        return
+    dispatcher.enqueue(message)
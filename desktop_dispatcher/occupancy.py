@@ -0,0 +1,456 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import DesktopUsage, OccupancyEvent, OpenOccupancy, UsageRollupProgress
+from .session import is_postgres, session_scope
+
+logger = logging.getLogger(__name__)
+
+CLAIM = "claim"
+RELEASE = "release"
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+_STOP = object()
+
+UsageReport = namedtuple(
+    "UsageReport", ["days", "covered_seconds", "desktops", "hours", "claims"]
+)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _aware(value):
+    # SQLite hands back naive datetimes
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _start_of_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _start_of_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class OccupancyLog:
+    """
+    Appends claims and releases to the ``occupancy_event`` table without a
+    database round trip per click.
+
+    Listeners only put events on an in-process queue; a background thread
+    writes them with one multi-row INSERT per batch of up to ``batch_size``
+    events, at the latest ``flush_interval`` seconds after the first one.
+    Events still queued when the process is killed without a shutdown are
+    lost, which is acceptable for capacity planning data.
+
+    Args:
+        batch_size (int): The maximum number of events per INSERT.
+        flush_interval (float): How long an event may wait for its batch to fill, in seconds.
+        maxsize (int): The maximum number of queued events.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, maxsize=100000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.counters = Counter()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        """
+        int: The number of events waiting to be written.
+        """
+        return self._queue.qsize()
+
+    def start(self):
+        """
+        Starts the writer thread. Calling it again is a no-op.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="occupancy-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def record(self, desktop_id, user_id, kind):
+        """
+        Queues an event without waiting for the database.
+
+        Args:
+            desktop_id (int): The ID of the desktop.
+            user_id (str): The Slack ID of the user.
+            kind (str): :data:`CLAIM` or :data:`RELEASE`.
+        """
+        self.start()
+        event = {
+            "desktop_id": int(desktop_id),
+            "user_id": user_id,
+            "kind": kind,
+            "occurred_at": _utcnow(),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._add("dropped", 1)
+            logger.error(f"Occupancy log queue is full, dropping event: {event}")
+
+    def shutdown(self, timeout=10.0):
+        """
+        Writes everything already queued and stops the writer thread.
+
+        Args:
+            timeout (float): How long to wait for the queue to drain, in seconds.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if self.queue_depth:
+            logger.error(f"{self.queue_depth} occupancy events were not written before shutdown")
+
+    def stats(self):
+        """
+        Returns the written, batch and dropped counters and the queue depth.
+        """
+        with self._lock:
+            return {**self.counters, "queue_depth": self.queue_depth}
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is _STOP:
+                return
+            batch = [event]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stop = True
+                    break
+                batch.append(event)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        try:
+            with session_scope() as session:
+                session.execute(insert(OccupancyEvent), batch)
+            self._add("written", len(batch))
+            self._add("batches", 1)
+        except Exception as e:
+            self._add("dropped", len(batch))
+            logger.error(f"Failed to write {len(batch)} occupancy events: {str(e)}")
+
+    def _add(self, counter, amount):
+        with self._lock:
+            self.counters[counter] += amount
+
+
+def _add_usage_statement(rows):
+    """
+    Adds occupied seconds and claims to hourly or daily rows, creating them as needed.
+    """
+    insert_ = postgresql.insert if is_postgres() else sqlite.insert
+    statement = insert_(DesktopUsage).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=[DesktopUsage.desktop_id, DesktopUsage.granularity, DesktopUsage.period_start],
+        set_={
+            "occupied_seconds": DesktopUsage.occupied_seconds + statement.excluded.occupied_seconds,
+            "claims": DesktopUsage.claims + statement.excluded.claims,
+        },
+    )
+
+
+class UsageRollup:
+    """
+    Maintains the hourly and daily ``desktop_usage`` rows from the occupancy events.
+
+    Every ``interval`` seconds the hours that ended at least ``lag`` seconds
+    ago (leaving the :class:`OccupancyLog` time to flush) are processed one by
+    one, each in its own transaction: the events of the hour are replayed on
+    top of the desktops that were occupied when it started, the occupied time
+    is added to the hour's and the day's rows, and the progress row moves on.
+    So every hour is counted exactly once however long the history gets, and
+    the reports never read the events. The progress row is locked with SKIP
+    LOCKED, so with several replicas one of them does the work.
+
+    A release without a known claim, i.e. of a desktop occupied before the
+    log existed, counts from the start of its hour.
+
+    Args:
+        interval (float): The time between two runs, in seconds.
+        lag (float): How long after the end of an hour it is processed, in seconds.
+    """
+
+    def __init__(self, interval=300.0, lag=60.0):
+        self.interval = interval
+        self.lag = lag
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the background thread. Calling it again is a no-op.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="usage-rollup", daemon=True
+                )
+                self._thread.start()
+
+    def run(self, now=None):
+        """
+        Rolls up every complete hour not processed yet.
+
+        Args:
+            now (datetime): The current time, for backfills and benchmarks.
+
+        Returns:
+            int: The number of hours processed.
+        """
+        now = now or _utcnow()
+        until = _start_of_hour(now - timedelta(seconds=self.lag))
+        processed = 0
+        while self._roll_up_next_hour(until):
+            processed += 1
+        return processed
+
+    def _loop(self):
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Usage rollup failed: {str(e)}")
+            time.sleep(self.interval)
+
+    def _roll_up_next_hour(self, until):
+        with session_scope() as session:
+            progress = session.execute(
+                select(UsageRollupProgress).with_for_update(skip_locked=True)
+            ).scalar()
+            if progress is None:
+                if session.execute(select(func.count()).select_from(UsageRollupProgress)).scalar():
+                    # Another replica holds the lock
+                    return False
+                first = session.execute(select(func.min(OccupancyEvent.occurred_at))).scalar()
+                if first is None:
+                    return False
+                progress = UsageRollupProgress(id=1, processed_until=_start_of_hour(_aware(first)))
+                session.add(progress)
+
+            start = _aware(progress.processed_until)
+            if start + HOUR > until:
+                return False
+            self._roll_up_hour(session, start)
+            progress.processed_until = start + HOUR
+            return True
+
+    def _roll_up_hour(self, session, start):
+        end = start + HOUR
+        open_occupancies = {
+            desktop_id: (user_id, _aware(since))
+            for desktop_id, user_id, since in session.execute(
+                select(OpenOccupancy.desktop_id, OpenOccupancy.user_id, OpenOccupancy.since)
+            )
+        }
+        events = session.execute(
+            select(
+                OccupancyEvent.desktop_id,
+                OccupancyEvent.user_id,
+                OccupancyEvent.kind,
+                OccupancyEvent.occurred_at,
+            )
+            .where(OccupancyEvent.occurred_at >= start, OccupancyEvent.occurred_at < end)
+            .order_by(OccupancyEvent.occurred_at, OccupancyEvent.id)
+        )
+
+        seconds = defaultdict(float)
+        claims = Counter()
+        changed = set()
+        for desktop_id, user_id, kind, occurred_at in events:
+            occurred_at = _aware(occurred_at)
+            if desktop_id in open_occupancies or kind == RELEASE:
+                # A claim on an open occupancy means its release was lost; close it anyway
+                _, since = open_occupancies.pop(desktop_id, (None, start))
+                seconds[desktop_id] += (occurred_at - max(since, start)).total_seconds()
+            if kind == CLAIM:
+                open_occupancies[desktop_id] = (user_id, occurred_at)
+                claims[desktop_id] += 1
+            changed.add(desktop_id)
+        for desktop_id, (_, since) in open_occupancies.items():
+            seconds[desktop_id] += (end - max(since, start)).total_seconds()
+
+        desktop_ids = seconds.keys() | claims.keys()
+        if desktop_ids:
+            for granularity, period_start in (("hour", start), ("day", _start_of_day(start))):
+                session.execute(
+                    _add_usage_statement(
+                        [
+                            {
+                                "desktop_id": desktop_id,
+                                "granularity": granularity,
+                                "period_start": period_start,
+                                "occupied_seconds": seconds[desktop_id],
+                                "claims": claims[desktop_id],
+                            }
+                            for desktop_id in desktop_ids
+                        ]
+                    )
+                )
+        if changed:
+            session.execute(delete(OpenOccupancy).where(OpenOccupancy.desktop_id.in_(changed)))
+            still_open = [
+                {"desktop_id": desktop_id, "user_id": user_id, "since": since}
+                for desktop_id, (user_id, since) in open_occupancies.items()
+                if desktop_id in changed
+            ]
+            if still_open:
+                session.execute(insert(OpenOccupancy), still_open)
+
+
+def _report_statements(days, now):
+    since = _start_of_day(now) - (days - 1) * DAY
+    per_desktop = (
+        select(
+            DesktopUsage.desktop_id,
+            func.sum(DesktopUsage.occupied_seconds),
+            func.sum(DesktopUsage.claims),
+        )
+        .where(DesktopUsage.granularity == "day", DesktopUsage.period_start >= since)
+        .group_by(DesktopUsage.desktop_id)
+    )
+    per_hour = (
+        select(DesktopUsage.period_start, func.sum(DesktopUsage.occupied_seconds))
+        .where(DesktopUsage.granularity == "hour", DesktopUsage.period_start >= since)
+        .group_by(DesktopUsage.period_start)
+    )
+    progress = select(UsageRollupProgress.processed_until)
+    return since, per_desktop, per_hour, progress
+
+
+def _build_report(days, since, per_desktop, per_hour, processed_until):
+    covered_seconds = 0.0
+    if processed_until is not None:
+        covered_seconds = max((_aware(processed_until) - since).total_seconds(), 0.0)
+    desktops = sorted(
+        ((desktop_id, occupied, claims) for desktop_id, occupied, claims in per_desktop),
+        key=lambda row: -row[1],
+    )
+    hours = defaultdict(float)
+    for period_start, occupied in per_hour:
+        hours[_aware(period_start).hour] += occupied
+    return UsageReport(
+        days=days,
+        covered_seconds=covered_seconds,
+        desktops=desktops,
+        hours=dict(hours),
+        claims=sum(claims for _, _, claims in desktops),
+    )
+
+
+def usage_report(session, days=7, now=None):
+    """
+    Summarises desktop usage of the last ``days`` days (today included) from the rollups alone.
+
+    Args:
+        session (Session): The database session to read in.
+        days (int): The number of days to cover.
+        now (datetime): The current time.
+
+    Returns:
+        UsageReport: Occupied seconds and claims per desktop (busiest first),
+        occupied seconds summed per hour of the day (UTC), the total number of
+        claims and how many seconds of the period are rolled up already.
+    """
+    since, per_desktop, per_hour, progress = _report_statements(days, now or _utcnow())
+    return _build_report(
+        days,
+        since,
+        session.execute(per_desktop).all(),
+        session.execute(per_hour).all(),
+        session.execute(progress).scalar(),
+    )
+
+
+async def usage_report_async(session, days=7, now=None):
+    """
+    Async version of :func:`usage_report`.
+    """
+    since, per_desktop, per_hour, progress = _report_statements(days, now or _utcnow())
+    return _build_report(
+        days,
+        since,
+        (await session.execute(per_desktop)).all(),
+        (await session.execute(per_hour)).all(),
+        (await session.execute(progress)).scalar(),
+    )
+
+
+def format_usage_report(report, name_of, desktop_count, top=10):
+    """
+    Renders a usage report as the ``/desktop-stats`` reply.
+
+    Args:
+        report (UsageReport): The report to render.
+        name_of (function): Maps a desktop ID to its name.
+        desktop_count (int): The number of desktops, for the average utilisation.
+        top (int): How many of the busiest desktops to list.
+
+    Returns:
+        str: The message in Slack mrkdwn.
+    """
+    covered = report.covered_seconds
+    if not covered or not report.desktops:
+        return f"📊  No desktop usage recorded in the last {report.days} days yet."
+
+    total = sum(occupied for _, occupied, _ in report.desktops)
+    lines = [
+        f"📊  *Desktop usage, last {report.days} days*",
+        f"Average utilisation: *{total / (covered * max(desktop_count, 1)):.0%}* · {report.claims} claims",
+    ]
+    covered_days = covered / DAY.total_seconds()
+    busiest = sorted(report.hours.items(), key=lambda item: -item[1])[:3]
+    if busiest and desktop_count:
+        lines.append(
+            "Busiest hours (UTC): "
+            + ", ".join(
+                f"{hour:02d}:00 {occupied / (covered_days * HOUR.total_seconds() * desktop_count):.0%}"
+                for hour, occupied in busiest
+            )
+        )
+    lines.append("Most used:")
+    lines += [
+        f"• {name_of(desktop_id)}  {occupied / covered:.0%}  ({claims} claims)"
+        for desktop_id, occupied, claims in report.desktops[:top]
+    ]
+    return "\n".join(lines)
+
+
+occupancy_log = OccupancyLog(
+    batch_size=int(os.getenv("OCCUPANCY_LOG_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("OCCUPANCY_LOG_FLUSH_INTERVAL", "1")),
+)
+usage_rollup = UsageRollup(interval=float(os.getenv("USAGE_ROLLUP_INTERVAL", "300")))
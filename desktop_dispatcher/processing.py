@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from slack_bolt.lazy_listener.internals import build_runnable_function
+from slack_bolt.lazy_listener.runner import LazyListenerRunner
+
+from .metrics import PROCESSING_BACKLOG, PROCESSING_SECONDS, listener_name
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessingRunner(LazyListenerRunner):
+    """
+    Runs the processing stage of the listeners, i.e. Bolt's lazy listeners.
+
+    Each listener only acknowledges the request on Bolt's listener pool and
+    hands its database and Slack work to this runner, which runs it on a
+    separate pool of ``concurrency`` threads. Slow downstream calls then queue
+    up here instead of occupying the threads that acknowledge new requests.
+
+    This relies on slack_bolt internals that are not part of its public API:
+    the ``App.listener_runner.lazy_listener_runner`` attribute it is installed
+    through, the :class:`LazyListenerRunner` interface it implements and
+    ``slack_bolt.lazy_listener.internals.build_runnable_function``. They were
+    checked against slack-bolt 1.30, which pyproject.toml pins to 1.30.x;
+    recheck them before raising the pin.
+
+    Args:
+        concurrency (int): The number of requests processed at once.
+    """
+
+    def __init__(self, concurrency):
+        self.logger = logger
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="listener-processing"
+        )
+        self._lock = threading.Lock()
+        self._backlog = 0
+
+    @property
+    def backlog(self):
+        """
+        int: The number of acknowledged requests still waiting for or in processing.
+        """
+        return self._backlog
+
+    def start(self, function, request):
+        """
+        Queues the processing of an acknowledged request.
+
+        Args:
+            function (function): The lazy listener function.
+            request (BoltRequest): The copy of the request Bolt made for it.
+        """
+        runnable = build_runnable_function(func=function, logger=self.logger, request=request)
+        with self._lock:
+            self._backlog += 1
+        PROCESSING_BACKLOG.inc()
+
+        def run():
+            try:
+                runnable()
+            finally:
+                with self._lock:
+                    self._backlog -= 1
+                PROCESSING_BACKLOG.dec()
+                started_at = request.context.get("metrics_started_at")
+                if started_at is not None:
+                    PROCESSING_SECONDS.labels(listener_name(request.body)).observe(
+                        time.perf_counter() - started_at
+                    )
+
+        self._executor.submit(run)
+
+    def shutdown(self, timeout=10.0):
+        """
+        Finishes the requests already acknowledged and stops the pool.
+
+        Args:
+            timeout (float): How long to wait for the backlog to drain, in seconds.
+        """
+        self._executor.shutdown(wait=False)
+        deadline = time.monotonic() + timeout
+        while self.backlog and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if self.backlog:
+            logger.error(f"{self.backlog} acknowledged requests were not processed before shutdown")
+
+
+processing_runner = ProcessingRunner(concurrency=int(os.getenv("PROCESSING_CONCURRENCY", "20")))
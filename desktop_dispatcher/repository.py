@@ -0,0 +1,266 @@
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import Desktop
+from .session import is_postgres
+
+SwappedDesktop = namedtuple(
+    "SwappedDesktop", ["id", "name", "previous_id", "previous_name"]
+)
+
+ExpiredLease = namedtuple("ExpiredLease", ["id", "name", "user_id"])
+
+# How long a claim lasts unless the occupant renews it
+lease_duration = timedelta(hours=float(os.getenv("DESKTOP_LEASE_HOURS", "10")))
+
+_FREE = {"occupied": False, "user_id": None, "claimed_at": None, "expires_at": None}
+
+
+def _lease(now=None):
+    now = now or datetime.now(timezone.utc)
+    return {"claimed_at": now, "expires_at": now + lease_duration}
+
+
+def _claim_statement(desktop_id, user_id):
+    return (
+        update(Desktop)
+        .where(Desktop.id == int(desktop_id), Desktop.occupied == False)
+        .values(occupied=True, user_id=user_id, **_lease())
+        .returning(Desktop.id, Desktop.name)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _release_statement(desktop_id, user_id):
+    return (
+        update(Desktop)
+        .where(
+            Desktop.id == int(desktop_id),
+            Desktop.occupied == True,
+            Desktop.user_id == user_id,
+        )
+        .values(**_FREE)
+        .returning(Desktop.id, Desktop.name)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _release_current_statement(user_id, new_desktop_id):
+    return (
+        update(Desktop)
+        .where(
+            Desktop.occupied == True,
+            Desktop.user_id == user_id,
+            Desktop.id != int(new_desktop_id),
+        )
+        .values(**_FREE)
+        .returning(Desktop.id, Desktop.name)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _renew_statement(desktop_id, user_id):
+    return (
+        update(Desktop)
+        .where(
+            Desktop.id == int(desktop_id),
+            Desktop.occupied == True,
+            Desktop.user_id == user_id,
+        )
+        .values(expires_at=datetime.now(timezone.utc) + lease_duration)
+        .returning(Desktop.id, Desktop.name, Desktop.expires_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _expired_condition(now):
+    return (Desktop.occupied == True, Desktop.expires_at <= now)
+
+
+def _swapped(claimed, released):
+    if released:
+        return SwappedDesktop(claimed.id, claimed.name, released.id, released.name)
+    return SwappedDesktop(claimed.id, claimed.name, None, None)
+
+
+def claim_desktop(session, desktop_id, user_id):
+    """
+    Marks a free desktop as occupied by the user.
+
+    The check and the update are a single conditional UPDATE, so when several
+    users claim the same desktop at once exactly one of them gets it. A user who
+    already occupies another desktop cannot claim a second one; the transaction
+    is rolled back in that case.
+
+    Args:
+        session (Session): The database session to execute the statement in.
+        desktop_id (int): The ID of the desktop to claim.
+        user_id (str): The Slack ID of the user claiming the desktop.
+
+    Returns:
+        Row: The claimed desktop's ``id`` and ``name``, or None if it could not be claimed.
+    """
+    try:
+        return session.execute(_claim_statement(desktop_id, user_id)).first()
+    except IntegrityError:
+        # ix_desktop_occupied_user_id: the user already occupies a desktop
+        session.rollback()
+        return None
+
+
+def release_desktop(session, desktop_id, user_id):
+    """
+    Frees a desktop, provided it is occupied by the user.
+
+    Args:
+        session (Session): The database session to execute the statement in.
+        desktop_id (int): The ID of the desktop to release.
+        user_id (str): The Slack ID of the user releasing the desktop.
+
+    Returns:
+        Row: The released desktop's ``id`` and ``name``, or None if the user does not occupy it.
+    """
+    return session.execute(_release_statement(desktop_id, user_id)).first()
+
+
+def swap_desktop(session, user_id, new_desktop_id):
+    """
+    Moves the user from their current desktop to a free one.
+
+    The current desktop is released before the new one is claimed, because the
+    unique index on occupied ``user_id`` is checked row by row. If the new
+    desktop turns out to be taken the transaction is rolled back, so the user
+    never ends up without a desktop because someone else took the new one first.
+
+    Args:
+        session (Session): The database session to execute the statements in.
+        user_id (str): The Slack ID of the user changing desktop.
+        new_desktop_id (int): The ID of the desktop to move to.
+
+    Returns:
+        SwappedDesktop: The new desktop's ``id`` and ``name`` and the ``previous_id`` and
+        ``previous_name`` of the released desktop (None if the user had none), or None if
+        the new desktop is not free.
+    """
+    released = session.execute(_release_current_statement(user_id, new_desktop_id)).first()
+    claimed = claim_desktop(session, new_desktop_id, user_id)
+    if not claimed:
+        session.rollback()
+        return None
+    return _swapped(claimed, released)
+
+
+def renew_lease(session, desktop_id, user_id):
+    """
+    Extends the lease on a desktop by :data:`lease_duration` from now, provided the user occupies it.
+
+    Args:
+        session (Session): The database session to execute the statement in.
+        desktop_id (int): The ID of the desktop.
+        user_id (str): The Slack ID of the user renewing the lease.
+
+    Returns:
+        Row: The desktop's ``id``, ``name`` and new ``expires_at``, or None if the user does not occupy it.
+    """
+    return session.execute(_renew_statement(desktop_id, user_id)).first()
+
+
+def release_expired_leases(session, now, limit):
+    """
+    Frees desktops whose lease ran out, up to ``limit`` of them, in one set-based statement.
+
+    On PostgreSQL this is a single ``UPDATE ... FROM (SELECT ... FOR UPDATE SKIP
+    LOCKED) ... RETURNING``: the sub-select picks the expired rows through
+    ``ix_desktop_lease_expires_at`` and hands their occupants to RETURNING, and
+    rows another replica is sweeping or a user is renewing at the same moment
+    are skipped. SQLite cannot return columns of a joined table, so the
+    occupants are read first in the same transaction and the UPDATE repeats the
+    expiry condition, so a desktop renewed or released in between is left alone.
+
+    Args:
+        session (Session): The database session to execute the statements in.
+        now (datetime): Leases that expire at or before this time are released.
+        limit (int): The maximum number of desktops to release.
+
+    Returns:
+        list[ExpiredLease]: The released desktops with their former occupants.
+    """
+    if is_postgres():
+        expired = (
+            select(Desktop.id, Desktop.user_id)
+            .where(*_expired_condition(now))
+            .order_by(Desktop.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .subquery("expired")
+        )
+        rows = session.execute(
+            update(Desktop)
+            .where(Desktop.id == expired.c.id)
+            .values(**_FREE)
+            .returning(Desktop.id, Desktop.name, expired.c.user_id)
+            .execution_options(synchronize_session=False)
+        )
+        return [ExpiredLease(*row) for row in rows]
+
+    occupants = dict(
+        session.execute(
+            select(Desktop.id, Desktop.user_id)
+            .where(*_expired_condition(now))
+            .order_by(Desktop.expires_at)
+            .limit(limit)
+        ).all()
+    )
+    if not occupants:
+        return []
+    rows = session.execute(
+        update(Desktop)
+        .where(Desktop.id.in_(occupants), *_expired_condition(now))
+        .values(**_FREE)
+        .returning(Desktop.id, Desktop.name)
+        .execution_options(synchronize_session=False)
+    )
+    return [ExpiredLease(id, name, occupants[id]) for id, name in rows]
+
+
+async def claim_desktop_async(session, desktop_id, user_id):
+    """
+    AsyncSession version of :func:`claim_desktop`.
+    """
+    try:
+        return (await session.execute(_claim_statement(desktop_id, user_id))).first()
+    except IntegrityError:
+        await session.rollback()
+        return None
+
+
+async def release_desktop_async(session, desktop_id, user_id):
+    """
+    AsyncSession version of :func:`release_desktop`.
+    """
+    return (await session.execute(_release_statement(desktop_id, user_id))).first()
+
+
+async def swap_desktop_async(session, user_id, new_desktop_id):
+    """
+    AsyncSession version of :func:`swap_desktop`.
+    """
+    released = (
+        await session.execute(_release_current_statement(user_id, new_desktop_id))
+    ).first()
+    claimed = await claim_desktop_async(session, new_desktop_id, user_id)
+    if not claimed:
+        await session.rollback()
+        return None
+    return _swapped(claimed, released)
+
+
+async def renew_lease_async(session, desktop_id, user_id):
+    """
+    AsyncSession version of :func:`renew_lease`.
+    """
+    return (await session.execute(_renew_statement(desktop_id, user_id))).first()
@@ -0,0 +1,130 @@
+import bisect
+import itertools
+import threading
+from collections import Counter, defaultdict
+
+from .cache import availability_cache
+
+
+def trigrams(text):
+    """
+    Splits text into its overlapping three-character substrings.
+
+    Args:
+        text (str): The lowercased text.
+
+    Returns:
+        set[str]: The trigrams, empty for text shorter than three characters.
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DesktopSearch:
+    """
+    Type-ahead search over desktop names, answering the ``external_select`` menus.
+
+    Names are kept in a sorted list for prefix lookups and in a trigram index
+    for substring lookups, built from the availability cache and rebuilt only
+    when a desktop is added, renamed or removed. Results are ranked exact match
+    first, then prefix matches, then other substring matches, each in name
+    order. A query without any substring match falls back to the names sharing
+    the most trigrams with it, which tolerates typos. Only free desktops are
+    returned.
+
+    Args:
+        cache (AvailabilityCache): The source of desktop names and occupancy.
+        min_similarity (float): The share of the query's trigrams a fuzzy match must contain.
+    """
+
+    def __init__(self, cache, min_similarity=0.5):
+        self.cache = cache
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._generation = None
+        self._names = []
+        self._trigrams = {}
+
+    def warm(self):
+        """
+        Builds the index up front so the first query does not pay for it.
+        """
+        self._index()
+
+    def search(self, query, limit=100):
+        """
+        Finds free desktops whose name matches the typed text.
+
+        Args:
+            query (str): The text typed in the select menu.
+            limit (int): The maximum number of results.
+
+        Returns:
+            list[DesktopState]: The matching free desktops, best match first.
+        """
+        query = query.strip().lower()
+        names, index = self._index()
+        if not query:
+            return self.cache.free_desktops()[:limit]
+
+        start = bisect.bisect_left(names, (query,))
+        prefix_ids = (
+            desktop_id
+            for name, desktop_id in itertools.takewhile(
+                lambda entry: entry[0].startswith(query), itertools.islice(names, start, None)
+            )
+        )
+        results = self._take_free(prefix_ids, limit)
+        if len(results) == limit or len(query) < 3:
+            return results
+
+        query_trigrams = trigrams(query)
+        postings = sorted((index.get(trigram, ()) for trigram in query_trigrams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        substring_ids = sorted(
+            (name, desktop_id)
+            for desktop_id, name in candidates
+            if query in name and not name.startswith(query)
+        )
+        results += self._take_free(
+            [desktop_id for _, desktop_id in substring_ids], limit - len(results)
+        )
+        if results:
+            return results
+
+        # No substring match: rank by shared trigrams, like pg_trgm's similarity()
+        shared = Counter()
+        for posting in postings:
+            shared.update(posting)
+        threshold = self.min_similarity * len(query_trigrams)
+        fuzzy = sorted(
+            (-count, name, desktop_id)
+            for (desktop_id, name), count in shared.items()
+            if count >= threshold
+        )
+        return self._take_free([desktop_id for _, _, desktop_id in fuzzy], limit)
+
+    def _take_free(self, desktop_ids, limit):
+        results = []
+        for desktop_id in desktop_ids:
+            if len(results) == limit:
+                break
+            desktop = self.cache.get(desktop_id)
+            if desktop is not None and desktop.user_id is None:
+                results.append(desktop)
+        return results
+
+    def _index(self):
+        with self._lock:
+            if self.cache.generation != self._generation:
+                generation, desktops = self.cache.snapshot()
+                self._names = sorted(((desktop.name or "").lower(), desktop.id) for desktop in desktops)
+                index = defaultdict(list)
+                for name, desktop_id in self._names:
+                    for trigram in trigrams(name):
+                        index[trigram].append((desktop_id, name))
+                self._trigrams = dict(index)
+                self._generation = generation
+            return self._names, self._trigrams
+
+
+desktop_search = DesktopSearch(availability_cache)
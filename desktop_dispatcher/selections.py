@@ -0,0 +1,344 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import PendingSelection
+from .session import is_postgres, session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class MemorySelectionStore:
+    """
+    Keeps each user's pending desktop selection in process memory.
+
+    Entries expire ``ttl`` seconds after they were written and, once
+    ``max_entries`` is reached, the least recently used entry is evicted to make
+    room. Every operation is O(1). Only suitable when a single replica serves
+    all interactions.
+
+    Args:
+        max_entries (int): The maximum number of pending selections kept.
+        ttl (float): How long a selection stays valid, in seconds.
+    """
+
+    def __init__(self, max_entries=10000, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counters = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, user_id, desktop_id):
+        """
+        Stores the desktop a user picked, replacing any earlier pick.
+
+        Args:
+            user_id (str): The Slack ID of the user.
+            desktop_id (str): The ID of the selected desktop.
+        """
+        with self._lock:
+            self._entries[user_id] = (desktop_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def get(self, user_id):
+        """
+        Returns the desktop a user picked, or None if there is no live selection.
+        """
+        with self._lock:
+            return self._lookup(user_id, remove=False)
+
+    def pop(self, user_id):
+        """
+        Removes and returns the desktop a user picked, or None if there is no live selection.
+        """
+        with self._lock:
+            return self._lookup(user_id, remove=True)
+
+    def discard(self, user_id):
+        """
+        Forgets a user's selection without counting a hit or miss.
+        """
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    async def put_async(self, user_id, desktop_id):
+        self.put(user_id, desktop_id)
+
+    async def get_async(self, user_id):
+        return self.get(user_id)
+
+    async def pop_async(self, user_id):
+        return self.pop(user_id)
+
+    async def discard_async(self, user_id):
+        self.discard(user_id)
+
+    def stats(self):
+        """
+        Returns the hit, miss, expiration and eviction counters and the current size.
+        """
+        with self._lock:
+            return {**self.counters, "size": len(self._entries)}
+
+    def _lookup(self, user_id, remove):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        desktop_id, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        if remove:
+            del self._entries[user_id]
+        else:
+            self._entries.move_to_end(user_id)
+        return desktop_id
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _upsert_statement(user_id, desktop_id, expires_at):
+    insert = postgresql.insert if is_postgres() else sqlite.insert
+    statement = insert(PendingSelection).values(
+        user_id=user_id, desktop_id=int(desktop_id), expires_at=expires_at
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[PendingSelection.user_id],
+        set_={"desktop_id": statement.excluded.desktop_id, "expires_at": statement.excluded.expires_at},
+    )
+
+
+def _select_statement(user_id):
+    return select(PendingSelection.desktop_id).where(
+        PendingSelection.user_id == user_id, PendingSelection.expires_at > _utcnow()
+    )
+
+
+def _pop_statement(user_id):
+    # Deletes expired rows too, but only a live one is returned
+    return (
+        delete(PendingSelection)
+        .where(PendingSelection.user_id == user_id)
+        .returning(PendingSelection.desktop_id, PendingSelection.expires_at)
+    )
+
+
+def _discard_statement(user_id):
+    return delete(PendingSelection).where(PendingSelection.user_id == user_id)
+
+
+def _cleanup_statement(batch_size):
+    expired = (
+        select(PendingSelection.user_id)
+        .where(PendingSelection.expires_at <= _utcnow())
+        .limit(batch_size)
+    )
+    return delete(PendingSelection).where(PendingSelection.user_id.in_(expired))
+
+
+def _evict_statement(count):
+    # The entries closest to expiry are the least recently written ones
+    oldest = (
+        select(PendingSelection.user_id)
+        .order_by(PendingSelection.expires_at)
+        .limit(count)
+    )
+    return delete(PendingSelection).where(PendingSelection.user_id.in_(oldest))
+
+
+class DatabaseSelectionStore:
+    """
+    Keeps pending desktop selections in the ``pending_selection`` table, so the
+    confirmation can land on any replica.
+
+    Lookups ignore expired rows. They are deleted in batches of ``cleanup_batch``
+    rows at most every ``cleanup_interval`` seconds, piggybacking on writes, and
+    if more than ``max_entries`` rows remain the oldest ones are evicted.
+
+    Args:
+        max_entries (int): The maximum number of pending selections kept.
+        ttl (float): How long a selection stays valid, in seconds.
+        cleanup_interval (float): The minimum time between two cleanups, in seconds.
+        cleanup_batch (int): The maximum number of expired rows deleted per statement.
+    """
+
+    def __init__(self, max_entries=10000, ttl=900, cleanup_interval=60, cleanup_batch=500):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch = cleanup_batch
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+
+    def put(self, user_id, desktop_id):
+        """
+        Stores the desktop a user picked, replacing any earlier pick.
+
+        Args:
+            user_id (str): The Slack ID of the user.
+            desktop_id (str): The ID of the selected desktop.
+        """
+        expires_at = _utcnow() + timedelta(seconds=self.ttl)
+        with session_scope() as session:
+            session.execute(_upsert_statement(user_id, desktop_id, expires_at))
+        if self._cleanup_due():
+            self.cleanup()
+
+    def get(self, user_id):
+        """
+        Returns the desktop a user picked, or None if there is no live selection.
+        """
+        with session_scope() as session:
+            desktop_id = session.execute(_select_statement(user_id)).scalar()
+        return self._count(desktop_id)
+
+    def pop(self, user_id):
+        """
+        Removes and returns the desktop a user picked, or None if there is no live selection.
+        """
+        with session_scope() as session:
+            row = session.execute(_pop_statement(user_id)).first()
+        return self._count(self._live(row))
+
+    def discard(self, user_id):
+        """
+        Forgets a user's selection without counting a hit or miss.
+        """
+        with session_scope() as session:
+            session.execute(_discard_statement(user_id))
+
+    def cleanup(self):
+        """
+        Deletes expired selections batch by batch, then evicts the oldest ones above ``max_entries``.
+        """
+        with session_scope() as session:
+            while True:
+                deleted = session.execute(_cleanup_statement(self.cleanup_batch)).rowcount
+                self._add("expirations", deleted)
+                session.commit()
+                if deleted < self.cleanup_batch:
+                    break
+            size = session.execute(select(func.count()).select_from(PendingSelection)).scalar()
+            if size > self.max_entries:
+                evicted = session.execute(_evict_statement(size - self.max_entries)).rowcount
+                self._add("evictions", evicted)
+
+    async def put_async(self, user_id, desktop_id):
+        from .async_session import async_session_scope
+
+        expires_at = _utcnow() + timedelta(seconds=self.ttl)
+        async with async_session_scope() as session:
+            await session.execute(_upsert_statement(user_id, desktop_id, expires_at))
+        if self._cleanup_due():
+            await self.cleanup_async()
+
+    async def get_async(self, user_id):
+        from .async_session import async_session_scope
+
+        async with async_session_scope() as session:
+            desktop_id = (await session.execute(_select_statement(user_id))).scalar()
+        return self._count(desktop_id)
+
+    async def pop_async(self, user_id):
+        from .async_session import async_session_scope
+
+        async with async_session_scope() as session:
+            row = (await session.execute(_pop_statement(user_id))).first()
+        return self._count(self._live(row))
+
+    async def discard_async(self, user_id):
+        from .async_session import async_session_scope
+
+        async with async_session_scope() as session:
+            await session.execute(_discard_statement(user_id))
+
+    async def cleanup_async(self):
+        from .async_session import async_session_scope
+
+        async with async_session_scope() as session:
+            while True:
+                deleted = (await session.execute(_cleanup_statement(self.cleanup_batch))).rowcount
+                self._add("expirations", deleted)
+                await session.commit()
+                if deleted < self.cleanup_batch:
+                    break
+            size = (
+                await session.execute(select(func.count()).select_from(PendingSelection))
+            ).scalar()
+            if size > self.max_entries:
+                evicted = (
+                    await session.execute(_evict_statement(size - self.max_entries))
+                ).rowcount
+                self._add("evictions", evicted)
+
+    def stats(self):
+        """
+        Returns the hit, miss, expiration and eviction counters seen by this replica.
+        """
+        with self._lock:
+            return dict(self.counters)
+
+    def _cleanup_due(self):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_cleanup:
+                return False
+            self._next_cleanup = now + self.cleanup_interval
+            return True
+
+    def _live(self, row):
+        if row is None:
+            return None
+        expires_at = row.expires_at
+        if expires_at.tzinfo is None:
+            # SQLite hands back naive datetimes
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at <= _utcnow():
+            self._add("expirations", 1)
+            return None
+        return row.desktop_id
+
+    def _count(self, desktop_id):
+        self._add("hits" if desktop_id is not None else "misses", 1)
+        return None if desktop_id is None else str(desktop_id)
+
+    def _add(self, counter, amount):
+        with self._lock:
+            self.counters[counter] += amount
+
+
+def create_selection_store():
+    """
+    Builds the pending-selection store chosen by ``PENDING_SELECTION_BACKEND``.
+
+    Returns:
+        MemorySelectionStore | DatabaseSelectionStore: ``memory`` (default) or ``database``.
+    """
+    backend = os.getenv("PENDING_SELECTION_BACKEND", "memory")
+    max_entries = int(os.getenv("PENDING_SELECTION_MAX_ENTRIES", "10000"))
+    ttl = float(os.getenv("PENDING_SELECTION_TTL", "900"))
+    if backend == "database":
+        return DatabaseSelectionStore(max_entries=max_entries, ttl=ttl)
+    if backend != "memory":
+        logger.error(f"Unknown PENDING_SELECTION_BACKEND {backend}, using memory")
+    return MemorySelectionStore(max_entries=max_entries, ttl=ttl)
+
+
+pending_selections = create_selection_store()
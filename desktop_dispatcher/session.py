@@ -1,26 +1,287 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.engine.url import URL
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.engine.url import URL, make_url
+from sqlalchemy.pool import QueuePool
 
+from desktop_dispatcher.breaker import database_breaker, replica_breaker
+from desktop_dispatcher.metrics import REPLICA_FALLBACKS, instrument_engine
 from desktop_dispatcher.utils import get_env_variable
 
-db_user = get_env_variable("POSTGRES_USER")
-db_password = get_env_variable("POSTGRES_PASSWORD")
-db_host = get_env_variable("POSTGRES_HOST")
-db_name = get_env_variable("POSTGRES_DB")
+pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+pool_pre_ping = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+# A stalled server can otherwise hold a new connection for minutes of TCP retries
+connect_timeout = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# How long after a write the reads it could affect keep going to the primary, in seconds
+replica_staleness_guard = float(os.getenv("DB_REPLICA_STALENESS_GUARD", "5"))
+
+_engine = None
+_replica_engine = None
+_engine_lock = threading.Lock()
+# monotonic time of the last write, per user and (under None) of anyone's, oldest first;
+# entries older than replica_staleness_guard no longer matter and are dropped
+_last_writes = OrderedDict()
+_last_writes_lock = threading.Lock()
+
+
+@functools.cache
+def database_url():
+    """
+    Builds the database URL from the environment, once.
+
+    Returns:
+        URL: ``SQLALCHEMY_URL`` if set, else the Postgres URL from the ``POSTGRES_*`` variables.
+    """
+    if os.getenv("SQLALCHEMY_URL"):
+        # Full URL override, e.g. a local SQLite file for benchmarks
+        return make_url(os.getenv("SQLALCHEMY_URL"))
+    return URL.create(
+            drivername="postgresql",
+            database=get_env_variable("POSTGRES_DB"),
+            username=get_env_variable("POSTGRES_USER"),
+            password=get_env_variable("POSTGRES_PASSWORD"),
+            host=get_env_variable("POSTGRES_HOST"),
+            port=5432
+    )
+
+
+@functools.cache
+def replica_url():
+    """
+    Builds the URL of the read replica from the environment, once.
+
+    Returns:
+        URL: ``SQLALCHEMY_REPLICA_URL`` if set, else the primary's URL with ``POSTGRES_REPLICA_HOST``
+        as the host, or None if there is no replica.
+    """
+    if os.getenv("SQLALCHEMY_REPLICA_URL"):
+        return make_url(os.getenv("SQLALCHEMY_REPLICA_URL"))
+    if os.getenv("POSTGRES_REPLICA_HOST"):
+        return database_url().set(host=os.getenv("POSTGRES_REPLICA_HOST"))
+    return None
+
+
+def is_postgres():
+    """
+    Returns:
+        bool: True if the database is Postgres rather than e.g. a benchmark SQLite file.
+    """
+    return database_url().get_backend_name() == "postgresql"
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A QueuePool that records how long callers wait to check out a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            waited = time.perf_counter() - started_at
+            with self._stats_lock:
+                self.checkouts += 1
+                self.checkout_wait_total += waited
+                self.checkout_wait_max = max(self.checkout_wait_max, waited)
+
+
+def get_engine():
+    """
+    Returns the engine of the process, creating it and its pool on first use.
+
+    Returns:
+        Engine: The primary's engine, which every :func:`session_scope` session writes to.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _create_engine(database_url(), "primary")
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def get_replica_engine():
+    """
+    Returns the engine of the read replica, creating it and its pool on first use.
+
+    Returns:
+        Engine: The engine read-only sessions run on, or None without a replica.
+    """
+    global _replica_engine
+    if _replica_engine is None and replica_url() is not None:
+        with _engine_lock:
+            if _replica_engine is None:
+                _replica_engine = _create_engine(replica_url(), "replica")
+    return _replica_engine
+
 
-db_url = URL.create(
-        drivername="postgresql",
-        database=db_name,
-        username=db_user,
-        password=db_password,
-        host=db_host,
-        port=5432
-)
+def _create_engine(url, target):
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        connect_args=(
+            {
+                "options": f"-c statement_timeout={statement_timeout_ms}",
+                "connect_timeout": connect_timeout,
+            }
+            if url.get_backend_name() == "postgresql"
+            else {}
+        ),
+    )
+    instrument_engine(engine, target)
+    return engine
 
-engine = create_engine(db_url)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class RoutingSession(Session):
+    """
+    A session that runs on the primary, or on the replica while it only reads.
+
+    The engines come from ``info["engines"]`` and the target from
+    ``info["target"]``. A session routed to the replica moves to the primary
+    for good at its first flush or INSERT, UPDATE or DELETE, so whatever a
+    write flow reads afterwards is read from where it wrote.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        writes = self._flushing or getattr(clause, "is_dml", False)
+        if writes:
+            self.info["wrote"] = True
+            if self.info["target"] == "replica":
+                REPLICA_FALLBACKS.labels("write").inc()
+                self.info["target"] = "primary"
+        return self.info["engines"][self.info["target"]]
+
+
+def note_write(user_id=None):
+    """
+    Records a write, so the reads right after it go to the primary rather than a replica lagging behind.
+
+    Args:
+        user_id (str): The Slack ID of the user who wrote, None if the write was not a user's.
+    """
+    now = time.monotonic()
+    with _last_writes_lock:
+        for key in (None, user_id) if user_id is not None else (None,):
+            _last_writes[key] = now
+            _last_writes.move_to_end(key)
+        while _last_writes and next(iter(_last_writes.values())) <= now - replica_staleness_guard:
+            _last_writes.popitem(last=False)
+
+
+def read_target(user_id=None):
+    """
+    Chooses where a read-only session runs.
+
+    Args:
+        user_id (str): The Slack ID of the user the read is for, None if it is shared,
+            like the availability snapshot, and any recent write counts.
+
+    Returns:
+        str: ``replica``, or ``primary`` if there is none, its circuit breaker is open
+        or a write within ``DB_REPLICA_STALENESS_GUARD`` seconds could still be missing from it.
+    """
+    if replica_url() is None:
+        return "primary"
+    if replica_breaker.is_open:
+        REPLICA_FALLBACKS.labels("replica_unavailable").inc()
+        return "primary"
+    if time.monotonic() - _last_writes.get(user_id, float("-inf")) < replica_staleness_guard:
+        REPLICA_FALLBACKS.labels("recent_write").inc()
+        return "primary"
+    return "replica"
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
 
 Base = declarative_base()
+
+
+@contextmanager
+def session_scope(read_only=False, user_id=None):
+    """
+    Provides a session for the duration of one listener invocation.
+
+    The session is committed when the block exits normally, rolled back if it
+    raises, and always closed so its connection goes back to the pool.
+
+    Args:
+        read_only (bool): Whether the block only reads, so the session may run on the replica.
+        user_id (str): The Slack ID of the user the block reads or writes for; a write
+            sends the user's reads to the primary for ``DB_REPLICA_STALENESS_GUARD`` seconds.
+
+    Yields:
+        Session: A new :class:`RoutingSession` on :func:`get_engine` or :func:`get_replica_engine`.
+
+    Raises:
+        DatabaseUnavailable: Right away, if the circuit breaker of the database is open.
+    """
+    engine = get_engine()
+    target = read_target(user_id) if read_only else "primary"
+    with (replica_breaker if target == "replica" else database_breaker).guard():
+        session = SessionLocal(
+            info={
+                "engines": {"primary": engine, "replica": get_replica_engine() or engine},
+                "target": target,
+            }
+        )
+        try:
+            yield session
+            session.commit()
+            if session.info.get("wrote") and user_id is not None:
+                note_write(user_id)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+def pool_stats():
+    """
+    Returns a snapshot of the connection pool, used to size it for concurrent users.
+
+    Returns:
+        dict: Pool capacity, connections in use, utilisation (0..1) and checkout wait times in seconds.
+    """
+    pool = get_engine().pool
+    capacity = pool.size() + max_overflow
+    checked_out = pool.checkedout()
+    with pool._stats_lock:
+        checkouts = pool.checkouts
+        wait_total = pool.checkout_wait_total
+        wait_max = pool.checkout_wait_max
+    return {
+        "size": pool.size(),
+        "max_overflow": max_overflow,
+        "checked_out": checked_out,
+        "utilisation": checked_out / capacity if capacity else 0.0,
+        "checkouts": checkouts,
+        "checkout_wait_avg": wait_total / checkouts if checkouts else 0.0,
+        "checkout_wait_max": wait_max,
+    }
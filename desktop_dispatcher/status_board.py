@@ -0,0 +1,238 @@
+"""
+A pinned status board in the notification channel, edited in place.
+
+With ``NOTIFICATION_MODE=board`` the bot no longer posts a message per
+claim, release and change. It keeps one pinned message (or several, see
+:func:`desktop_dispatcher.blocks.status_board_blocks`) listing every desktop
+and its occupant, and :func:`desktop_dispatcher.notifications.notify_channel`
+only marks the board as changed. Changes arriving within ``STATUS_BOARD_WINDOW``
+seconds of each other are merged into a single ``chat.update`` per message,
+and messages whose content did not change are not edited at all.
+
+The board is rendered from the availability cache, which every process keeps
+current, so each process edits it after the changes it made itself. The
+board messages are found again through the channel's pins after a restart.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from .blocks import status_board_blocks
+from .cache import availability_cache
+from .notifications import is_channel_not_found, retry_delay
+from .utils import channel_resolver, notification_channel_name, slack_client
+
+logger = logging.getLogger(__name__)
+
+BLOCK_ID = "status_board"
+
+
+class StatusBoard:
+    """
+    Keeps the status board messages in step with the availability cache.
+
+    A background thread waits for :meth:`touch`, lets further changes
+    accumulate for ``window`` seconds and then edits the board once. It also
+    redraws it every ``refresh`` seconds, which catches up with changes made
+    by other processes and with messages that were unpinned or deleted.
+
+    Args:
+        client (WebClient): The Slack client used to post, edit and pin the board.
+        resolver (ChannelResolver): Resolves the channel name to a channel ID.
+        channel_name (str): The channel the board is pinned in.
+        window (float): How long to wait for more changes before editing, in seconds.
+        refresh (float): The time between two redraws without changes, in seconds.
+        max_retries (int): How many times a single Slack call is retried.
+        backoff_base (float): The first backoff delay in seconds, doubled on each retry.
+        backoff_max (float): The upper bound for a single backoff delay in seconds.
+    """
+
+    def __init__(
+        self,
+        client,
+        resolver,
+        channel_name,
+        window=5.0,
+        refresh=300.0,
+        max_retries=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+    ):
+        self.client = client
+        self.resolver = resolver
+        self.channel_name = channel_name
+        self.window = window
+        self.refresh = refresh
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.counters = Counter()
+        # The ts and the last blocks written of each board message, by index
+        self._messages = None
+        self._rendered = {}
+        self._changed = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the background thread and draws the board once. Calling it again is a no-op.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._changed.set()
+                self._thread = threading.Thread(target=self._loop, name="status-board", daemon=True)
+                self._thread.start()
+
+    def touch(self):
+        """
+        Marks the board as changed without waiting for Slack.
+        """
+        self.start()
+        self._add("changes", 1)
+        self._changed.set()
+
+    def shutdown(self, timeout=10.0):
+        """
+        Applies the changes not yet on the board and stops the thread.
+
+        Args:
+            timeout (float): How long to wait for the last edit, in seconds.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping = True
+        self._changed.set()
+        thread.join(timeout)
+
+    def flush(self):
+        """
+        Brings every board message up to date with the availability cache.
+
+        Returns:
+            int: The number of Slack calls it took.
+        """
+        channel_id = self.resolver.resolve(self.channel_name)
+        if not channel_id:
+            logger.error(f"Channel {self.channel_name} not found.")
+            return 0
+        _, desktops = availability_cache.snapshot()
+        desktops.sort(key=lambda desktop: (desktop.name or "", desktop.id))
+        shards = status_board_blocks(desktops, block_id=BLOCK_ID)
+
+        calls = 0
+        if self._messages is None:
+            self._messages = self._find_messages(channel_id)
+            calls += 1
+            for index in set(self._rendered) - set(self._messages):
+                del self._rendered[index]
+        for index, blocks in enumerate(shards):
+            if self._rendered.get(index) == blocks:
+                self._add("unchanged", 1)
+                continue
+            text = blocks[0]["text"]["text"]
+            ts = self._messages.get(index)
+            if ts:
+                self._call("chat_update", channel=channel_id, ts=ts, text=text, blocks=blocks)
+                calls += 1
+            else:
+                response = self._call("chat_postMessage", channel=channel_id, text=text, blocks=blocks)
+                ts = self._messages[index] = response["ts"]
+                self._call("pins_add", channel=channel_id, timestamp=ts)
+                calls += 2
+            self._rendered[index] = blocks
+        # The board shrank: drop the messages it no longer needs
+        for index in sorted(index for index in self._messages if index >= len(shards)):
+            self._call("chat_delete", channel=channel_id, ts=self._messages.pop(index))
+            self._rendered.pop(index, None)
+            calls += 1
+        self._add("flushes", 1)
+        self._add("slack_calls", calls)
+        return calls
+
+    def stats(self):
+        """
+        Returns the change, flush, unchanged message, Slack call and failure counters.
+        """
+        with self._lock:
+            return dict(self.counters)
+
+    def _find_messages(self, channel_id):
+        """
+        Finds the board messages pinned in the channel, by the index in their ``block_id``.
+
+        A board posted twice, e.g. by two processes starting at once, keeps the
+        oldest message of each index and deletes the others.
+        """
+        response = self._call("pins_list", channel=channel_id)
+        found = {}
+        for item in sorted(response.get("items") or (), key=lambda item: item.get("message", {}).get("ts", "")):
+            message = item.get("message") or {}
+            block_id = ((message.get("blocks") or [{}])[0]).get("block_id", "")
+            prefix, _, index = block_id.partition(":")
+            if prefix != BLOCK_ID or not index.isdigit():
+                continue
+            if int(index) in found:
+                self._call("chat_delete", channel=channel_id, ts=message["ts"])
+            else:
+                found[int(index)] = message["ts"]
+        return found
+
+    def _call(self, method, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return getattr(self.client, method)(**kwargs)
+            except Exception as e:
+                if is_channel_not_found(e):
+                    self.resolver.invalidate(self.channel_name)
+                if method == "chat_update" and _error(e) == "message_not_found":
+                    # Deleted by hand; post the board again on the next flush
+                    self._messages = None
+                    self._rendered.clear()
+                    self._changed.set()
+                    raise
+                delay = retry_delay(e, attempt, self.backoff_base, self.backoff_max)
+                if delay is None or attempt == self.max_retries:
+                    raise
+            time.sleep(delay)
+
+    def _loop(self):
+        while True:
+            if not self._changed.wait(self.refresh):
+                # Nothing changed here for a while; look for unpinned or deleted messages too
+                self._messages = None
+            elif not self._stopping:
+                # Let the rest of a burst of changes arrive
+                time.sleep(self.window)
+            self._changed.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self._add("failures", 1)
+                logger.error(f"Status board update failed: {str(e)}")
+            if self._stopping:
+                return
+
+    def _add(self, counter, amount):
+        with self._lock:
+            self.counters[counter] += amount
+
+
+def _error(exception):
+    response = getattr(exception, "response", None)
+    return response.get("error") if response is not None else None
+
+
+status_board = StatusBoard(
+    slack_client,
+    channel_resolver,
+    notification_channel_name,
+    window=float(os.getenv("STATUS_BOARD_WINDOW", "5")),
+    refresh=float(os.getenv("STATUS_BOARD_REFRESH", "300")),
+    max_retries=int(os.getenv("NOTIFICATION_MAX_RETRIES", "5")),
+)
@@ -1,21 +1,21 @@
 import logging
 import os
-from pathlib import Path
+import threading
+import time
 
-from dotenv import load_dotenv
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
+from .metrics import InstrumentedWebClient
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-env_path = Path(__file__).resolve().parent.parent / ".env"
-
-load_dotenv(env_path)
-
-slack_client = WebClient(token=os.getenv("SLACK_BOT_TOKEN"))
+slack_api_url = os.getenv("SLACK_API_URL", WebClient.BASE_URL)
+# The one client of the process: the Bolt app, the notification workers and the channel resolver share it
+slack_client = InstrumentedWebClient(token=os.getenv("SLACK_BOT_TOKEN"), base_url=slack_api_url)
 notification_channel_name = os.getenv("NOTIFICATION_CHANNEL_NAME")
+channel_cache_ttl = int(os.getenv("CHANNEL_CACHE_TTL", "3600"))
+channel_miss_ttl = int(os.getenv("CHANNEL_MISS_TTL", "300"))
 
 
 def get_env_variable(variable_name: str) -> str:
@@ -32,15 +32,113 @@ def get_env_variable(variable_name: str) -> str:
     - KeyError: If the specified environment variable is not set.
     """
     try:
-        var_value = os.environ[variable_name]
-        logging.info(f"Successfully retrieved the {variable_name} environment variable")
-        return var_value
+        return os.environ[variable_name]
     except KeyError:
         error_msg = f"Set the {variable_name} environment variable"
         logging.error(error_msg)
         raise KeyError({"error": error_msg})
 
 
+class ChannelResolver:
+    """
+    Resolves Slack channel names to channel IDs.
+
+    The name -> ID mapping of every channel the bot is a member of is fetched
+    page by page with ``users.conversations`` and kept for ``ttl`` seconds, so
+    resolving a channel name normally costs no Slack API call at all.
+
+    A name that is still missing after a refetch, e.g. a misconfigured or
+    archived channel, is remembered for ``negative_ttl`` seconds, so it does
+    not cost a full listing on every lookup.
+
+    Args:
+        client (WebClient): The Slack client used to list the bot's channels.
+        ttl (int): How long, in seconds, a fetched mapping stays valid.
+        page_size (int): The number of channels requested per page.
+        negative_ttl (int): How long, in seconds, a name that was not found is not looked up again.
+    """
+
+    def __init__(self, client, ttl=3600, page_size=200, negative_ttl=300):
+        self.client = client
+        self.ttl = ttl
+        self.page_size = page_size
+        self.negative_ttl = negative_ttl
+        self._channels = {}
+        # Names not found by the last refetch, with when they may be refetched
+        self._misses = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """
+        Fetches all channels up front so the first notification does not pay for it.
+        """
+        with self._lock:
+            self._refresh()
+
+    def resolve(self, channel_name):
+        """
+        Returns the ID of the channel with the given name.
+
+        Args:
+            channel_name (str): The name of the Slack channel.
+
+        Returns:
+            str: The ID of the Slack channel, or None if the channel is not found.
+        """
+        with self._lock:
+            if self._is_stale(channel_name):
+                self._refresh()
+                self._note_miss(channel_name)
+            return self._channels.get(channel_name)
+
+    def invalidate(self, channel_name):
+        """
+        Drops a cached mapping, e.g. after Slack reported the channel as not found.
+
+        Args:
+            channel_name (str): The name of the Slack channel to forget.
+        """
+        with self._lock:
+            self._channels.pop(channel_name, None)
+
+    def _refresh(self):
+        channels = {}
+        cursor = None
+        try:
+            while True:
+                response = self.client.users_conversations(
+                    limit=self.page_size, exclude_archived=True, cursor=cursor
+                )
+                for channel in response["channels"]:
+                    channels[channel["name"]] = channel["id"]
+                cursor = response.get("response_metadata", {}).get("next_cursor")
+                if not cursor:
+                    break
+        except SlackApiError as e:
+            logger.error(f"Error fetching channels: {str(e)}")
+            return
+        self._store(channels)
+
+    def _is_stale(self, channel_name):
+        now = time.monotonic()
+        if now >= self._expires_at:
+            return True
+        return channel_name not in self._channels and now >= self._misses.get(channel_name, 0.0)
+
+    def _note_miss(self, channel_name):
+        if channel_name not in self._channels:
+            self._misses[channel_name] = time.monotonic() + self.negative_ttl
+
+    def _store(self, channels):
+        self._channels = channels
+        self._misses = {}
+        self._expires_at = time.monotonic() + self.ttl
+
+
+channel_resolver = ChannelResolver(slack_client, ttl=channel_cache_ttl, negative_ttl=channel_miss_ttl)
+
+
 def get_channel_id_by_name(channel_name):
     """
     Retrieves the ID of a Slack channel by its name.
@@ -51,30 +149,4 @@ def get_channel_id_by_name(channel_name):
     Returns:
         str: The ID of the Slack channel, or None if the channel is not found.
     """
-    try:
-        response = slack_client.users_conversations()
-        channels = response["channels"]
-        for channel in channels:
-            if channel["name"] == channel_name:
-                return channel["id"]
-        return None
-    except SlackApiError as e:
-        logger.error(f"Error fetching channels: {str(e)}")
-        return None
-
-
-def notify_channel(message):
-    """
-    Sends a message to a specified Slack channel.
-
-    Args:
-        message (str): The message to send to the Slack channel.
-    """
-    channel_id = get_channel_id_by_name(notification_channel_name)
-    if not channel_id:
-        logger.error(f"Channel {notification_channel_name} not found.")
-        return
-    try:
-        slack_client.chat_postMessage(channel=channel_id, text=message)
-    except Exception as e:
-        logger.error(f"Failed to send notification to channel: {str(e)}")
+    return channel_resolver.resolve(channel_name)
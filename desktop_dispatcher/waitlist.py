@@ -0,0 +1,334 @@
+"""
+A first-in, first-out waitlist of users waiting for a desktop to be freed.
+
+When no desktop is free, ``/desktop`` offers a 'Notify me' button instead of
+leaving the user to run the command again and again. The button puts the user
+at the back of the ``waitlist_entry`` table. Whenever a desktop is released,
+whether by 'Leave', by changing desktop or by the lease sweeper, the code
+that released it calls :meth:`Waitlist.offer`. That claims the desktop for the
+user at the head of the queue and removes them from the queue, in one
+transaction. The user then gets a direct message with the desktop's buttons.
+Nothing polls: a waiting user costs no query until a desktop is freed for them.
+
+The head of the queue is read with ``FOR UPDATE SKIP LOCKED`` on PostgreSQL.
+Two replicas offering two freed desktops at the same moment therefore serve
+two different users. A user who meanwhile got a desktop of their own is
+passed over. With nobody waiting, a release costs a single SELECT more.
+Entries expire after ``WAITLIST_TTL`` seconds and are deleted in batches,
+piggybacking on joins.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, delete, exists, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from .blocks import handed_over_blocks
+from .cache import availability_cache
+from .models import Desktop, WaitlistEntry
+from .notifications import notify_channel
+from .occupancy import CLAIM, occupancy_log
+from .repository import _claim_statement
+from .session import is_postgres, session_scope
+from .utils import slack_client
+
+logger = logging.getLogger(__name__)
+
+Handover = namedtuple("Handover", ["id", "name", "user_id"])
+
+# How often a handover is retried when its user claimed a desktop of their own meanwhile
+_CLAIM_ATTEMPTS = 3
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _join_statement(user_id, ttl):
+    now = _utcnow()
+    insert = postgresql.insert if is_postgres() else sqlite.insert
+    statement = insert(WaitlistEntry).values(user_id=user_id, joined_at=now, expires_at=now + ttl)
+    expired = WaitlistEntry.expires_at <= now
+    return statement.on_conflict_do_update(
+        index_elements=[WaitlistEntry.user_id],
+        set_={
+            # An expired entry does not keep its place: the user goes to the back again
+            "joined_at": case((expired, statement.excluded.joined_at), else_=WaitlistEntry.joined_at),
+            "expires_at": statement.excluded.expires_at,
+        },
+    ).returning(WaitlistEntry.joined_at)
+
+
+def _position_statement(joined_at):
+    return select(func.count()).where(WaitlistEntry.joined_at <= joined_at, WaitlistEntry.expires_at > _utcnow())
+
+
+def _leave_statement(user_id):
+    return delete(WaitlistEntry).where(WaitlistEntry.user_id == user_id)
+
+
+def _head_statement(released_by):
+    occupies_desktop = exists().where(Desktop.occupied == True, Desktop.user_id == WaitlistEntry.user_id)
+    statement = (
+        select(WaitlistEntry.id, WaitlistEntry.user_id)
+        .where(WaitlistEntry.expires_at > _utcnow(), WaitlistEntry.user_id != released_by, ~occupies_desktop)
+        .order_by(WaitlistEntry.joined_at, WaitlistEntry.id)
+        .limit(1)
+    )
+    if is_postgres():
+        statement = statement.with_for_update(skip_locked=True, of=WaitlistEntry)
+    return statement
+
+
+def _served_statement(entry_id, released_by):
+    # Someone who gave a desktop up does not want the next one either
+    return delete(WaitlistEntry).where(or_(WaitlistEntry.id == entry_id, WaitlistEntry.user_id == released_by))
+
+
+def _cleanup_statement(batch_size):
+    expired = select(WaitlistEntry.id).where(WaitlistEntry.expires_at <= _utcnow()).limit(batch_size)
+    return delete(WaitlistEntry).where(WaitlistEntry.id.in_(expired))
+
+
+def _handover_message(handover):
+    return f"🟢  *{handover.name}* was freed and you were next on the waitlist, so it is yours now"
+
+
+def _channel_message(handover):
+    return f"🖥️    *<@{handover.user_id}>* is now using {handover.name} (from the waitlist)"
+
+
+class Waitlist:
+    """
+    Queues users for the next freed desktop and hands freed desktops over to them.
+
+    Args:
+        ttl (float): How long a user stays on the waitlist, in seconds.
+        cleanup_interval (float): The minimum time between two cleanups of expired entries, in seconds.
+        cleanup_batch (int): The maximum number of expired entries deleted per statement.
+    """
+
+    def __init__(self, ttl=3600.0, cleanup_interval=60.0, cleanup_batch=500):
+        self.ttl = timedelta(seconds=ttl)
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch = cleanup_batch
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+
+    def join(self, user_id):
+        """
+        Puts the user at the back of the queue, or keeps their place and extends it if they are on it.
+
+        Args:
+            user_id (str): The Slack ID of the user.
+
+        Returns:
+            int: The user's place in the queue, from 1.
+        """
+        with session_scope(user_id=user_id) as session:
+            joined_at = session.execute(_join_statement(user_id, self.ttl)).scalar_one()
+            position = session.execute(_position_statement(joined_at)).scalar_one()
+        self._add("joined", 1)
+        if self._cleanup_due():
+            self.cleanup()
+        return position
+
+    def leave(self, user_id):
+        """
+        Takes the user off the queue.
+
+        Args:
+            user_id (str): The Slack ID of the user.
+
+        Returns:
+            bool: Whether the user was on it.
+        """
+        with session_scope(user_id=user_id) as session:
+            left = session.execute(_leave_statement(user_id)).rowcount > 0
+        self._add("left", left)
+        return left
+
+    def offer(self, desktop_id, released_by=None):
+        """
+        Hands a freed desktop over to the user at the head of the queue and tells them and the channel.
+
+        Call it after the transaction that freed the desktop was committed. Errors
+        are logged rather than raised, so the release itself is never reported as failed.
+
+        Args:
+            desktop_id (int): The ID of the desktop just freed.
+            released_by (str): The Slack ID of the user who freed it, who is passed over and,
+                if the desktop goes to someone, taken off the queue.
+
+        Returns:
+            Handover: The desktop and the user it went to, or None if nobody got it.
+        """
+        try:
+            handover = self._hand_over(desktop_id, released_by)
+        except Exception as e:
+            logger.error(f"Could not offer desktop {desktop_id} to the waitlist: {str(e)}")
+            self._add("failures", 1)
+            return None
+        if handover:
+            self._announce(handover)
+            try:
+                slack_client.chat_postMessage(
+                    channel=handover.user_id, text=_handover_message(handover), blocks=handed_over_blocks(handover)
+                )
+            except Exception as e:
+                logger.error(f"Could not tell {handover.user_id} about their desktop: {str(e)}")
+                self._add("notify_failures", 1)
+        return handover
+
+    def cleanup(self):
+        """
+        Deletes expired entries batch by batch.
+        """
+        with session_scope() as session:
+            while True:
+                deleted = session.execute(_cleanup_statement(self.cleanup_batch)).rowcount
+                self._add("expired", deleted)
+                session.commit()
+                if deleted < self.cleanup_batch:
+                    break
+
+    async def join_async(self, user_id):
+        """
+        AsyncSession version of :meth:`join`.
+        """
+        from .async_session import async_session_scope
+
+        async with async_session_scope(user_id=user_id) as session:
+            joined_at = (await session.execute(_join_statement(user_id, self.ttl))).scalar_one()
+            position = (await session.execute(_position_statement(joined_at))).scalar_one()
+        self._add("joined", 1)
+        if self._cleanup_due():
+            await self.cleanup_async()
+        return position
+
+    async def leave_async(self, user_id):
+        """
+        AsyncSession version of :meth:`leave`.
+        """
+        from .async_session import async_session_scope
+
+        async with async_session_scope(user_id=user_id) as session:
+            left = (await session.execute(_leave_statement(user_id))).rowcount > 0
+        self._add("left", left)
+        return left
+
+    async def offer_async(self, desktop_id, released_by=None):
+        """
+        AsyncSession version of :meth:`offer`, messaging the user with the async client.
+        """
+        from .async_notifications import async_slack_client, notify_channel as notify_channel_async
+
+        try:
+            handover = await self._hand_over_async(desktop_id, released_by)
+        except Exception as e:
+            logger.error(f"Could not offer desktop {desktop_id} to the waitlist: {str(e)}")
+            self._add("failures", 1)
+            return None
+        if handover:
+            self._announce(handover, notify=None)
+            await notify_channel_async(_channel_message(handover))
+            try:
+                await async_slack_client.chat_postMessage(
+                    channel=handover.user_id, text=_handover_message(handover), blocks=handed_over_blocks(handover)
+                )
+            except Exception as e:
+                logger.error(f"Could not tell {handover.user_id} about their desktop: {str(e)}")
+                self._add("notify_failures", 1)
+        return handover
+
+    async def cleanup_async(self):
+        from .async_session import async_session_scope
+
+        async with async_session_scope() as session:
+            while True:
+                deleted = (await session.execute(_cleanup_statement(self.cleanup_batch))).rowcount
+                self._add("expired", deleted)
+                await session.commit()
+                if deleted < self.cleanup_batch:
+                    break
+
+    def stats(self):
+        """
+        Returns the joined, left, handed over, unclaimed, expired and failure counters.
+        """
+        with self._lock:
+            return dict(self.counters)
+
+    def _hand_over(self, desktop_id, released_by):
+        with session_scope() as session:
+            for _ in range(_CLAIM_ATTEMPTS):
+                head = session.execute(_head_statement(released_by)).first()
+                if head is None:
+                    self._add("empty", 1)
+                    return None
+                try:
+                    desktop = session.execute(_claim_statement(desktop_id, head.user_id)).first()
+                except IntegrityError:
+                    # The user claimed a desktop of their own since the head was read, so they are served
+                    session.rollback()
+                    session.execute(_leave_statement(head.user_id))
+                    continue
+                if desktop is None:
+                    # Someone else claimed the desktop first
+                    self._add("unclaimed", 1)
+                    return None
+                session.execute(_served_statement(head.id, released_by))
+                return Handover(desktop.id, desktop.name, head.user_id)
+        self._add("unclaimed", 1)
+        return None
+
+    async def _hand_over_async(self, desktop_id, released_by):
+        from .async_session import async_session_scope
+
+        async with async_session_scope() as session:
+            for _ in range(_CLAIM_ATTEMPTS):
+                head = (await session.execute(_head_statement(released_by))).first()
+                if head is None:
+                    self._add("empty", 1)
+                    return None
+                try:
+                    desktop = (await session.execute(_claim_statement(desktop_id, head.user_id))).first()
+                except IntegrityError:
+                    await session.rollback()
+                    await session.execute(_leave_statement(head.user_id))
+                    continue
+                if desktop is None:
+                    self._add("unclaimed", 1)
+                    return None
+                await session.execute(_served_statement(head.id, released_by))
+                return Handover(desktop.id, desktop.name, head.user_id)
+        self._add("unclaimed", 1)
+        return None
+
+    def _announce(self, handover, notify=notify_channel):
+        availability_cache.apply(handover.id, handover.name, handover.user_id)
+        occupancy_log.record(handover.id, handover.user_id, CLAIM)
+        if notify:
+            notify(_channel_message(handover))
+        self._add("handed_over", 1)
+
+    def _cleanup_due(self):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_cleanup:
+                return False
+            self._next_cleanup = now + self.cleanup_interval
+            return True
+
+    def _add(self, counter, amount):
+        with self._lock:
+            self.counters[counter] += amount
+
+
+waitlist = Waitlist(ttl=float(os.getenv("WAITLIST_TTL", "3600")))
@@ -0,0 +1,126 @@
+"""
+HTTP Events API entry point for the listeners in :mod:`desktop_dispatcher.events`.
+
+Slack posts every slash command, interaction and options request to
+``/slack/events``; Bolt rejects any request whose signature does not match
+``SLACK_SIGNING_SECRET`` before a listener runs. ``/healthz`` and ``/readyz``
+answer the Kubernetes probes and ``/metrics`` serves the Prometheus metrics of
+all worker processes, plus the component stats (pool, selections, dedup, ...)
+of the worker that answered, labelled with its ``pid``.
+
+The WSGI ``application`` is served by gunicorn with one worker process per
+core, see :mod:`desktop_dispatcher.gunicorn_config`. Workers share no memory:
+pending selections live in the database and each worker keeps its own
+availability cache current through the ``desktop_changed`` channel.
+"""
+import atexit
+import logging
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from slack_bolt.adapter.wsgi import SlackRequestHandler
+from sqlalchemy import text
+
+from .config import load_config
+
+# Before the rest of the package reads its settings; fails without SLACK_SIGNING_SECRET,
+# which Bolt would otherwise only notice by rejecting every request
+load_config("http")
+
+from .cache import availability_cache  # noqa: E402
+from .events import create_app  # noqa: E402
+from .leases import lease_sweeper  # noqa: E402
+from .metrics import register_collectors  # noqa: E402
+from .notifications import dispatcher, notification_mode  # noqa: E402
+from .occupancy import occupancy_log, usage_rollup  # noqa: E402
+from .processing import processing_runner  # noqa: E402
+from .search import desktop_search  # noqa: E402
+from .session import get_engine  # noqa: E402
+from .status_board import status_board  # noqa: E402
+from .utils import channel_resolver  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+slack_handler = SlackRequestHandler(create_app(), path="/slack/events")
+
+# The component stats of this worker, which the multiprocess files do not hold
+worker_registry = CollectorRegistry()
+
+
+def start_worker():
+    """
+    Warms the caches and starts the background threads of one worker process.
+
+    Called by gunicorn after the worker has been forked, so no thread or
+    database connection is ever shared between processes.
+    """
+    atexit.register(dispatcher.shutdown)
+    atexit.register(status_board.shutdown)
+    atexit.register(occupancy_log.shutdown)
+    # Registered last so it runs first: processing still enqueues notifications
+    atexit.register(processing_runner.shutdown)
+    channel_resolver.warm()
+    desktop_search.warm()
+    availability_cache.start_listener()
+    dispatcher.start()
+    if notification_mode == "board":
+        status_board.start()
+    usage_rollup.start()
+    lease_sweeper.start()
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        register_collectors(dispatcher, registry=worker_registry, labels={"pid": str(os.getpid())})
+    else:
+        register_collectors(dispatcher)
+
+
+def is_ready():
+    """
+    Tells whether this worker can serve Slack requests, i.e. reach the database.
+
+    Returns:
+        bool: True if a trivial query succeeds.
+    """
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        return False
+
+
+def metrics():
+    """
+    Returns:
+        bytes: The metrics in the Prometheus text format, summed over all workers
+        when gunicorn set up ``PROMETHEUS_MULTIPROC_DIR``.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return generate_latest(registry) + generate_latest(worker_registry)
+    return generate_latest(REGISTRY)
+
+
+def _plain(start_response, status, body):
+    start_response(status, [("Content-Type", "text/plain; charset=utf-8")])
+    return [body]
+
+
+def application(environ, start_response):
+    """
+    The WSGI application: Slack requests go to Bolt, the probe and metrics routes are answered here.
+    """
+    path = environ.get("PATH_INFO", "")
+    if environ.get("REQUEST_METHOD") == "GET":
+        if path == "/healthz":
+            return _plain(start_response, "200 OK", b"ok")
+        if path == "/readyz":
+            if is_ready():
+                return _plain(start_response, "200 OK", b"ready")
+            return _plain(start_response, "503 Service Unavailable", b"database unavailable")
+        if path == "/metrics":
+            start_response("200 OK", [("Content-Type", CONTENT_TYPE_LATEST)])
+            return [metrics()]
+    return slack_handler(environ, start_response)
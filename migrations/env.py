@@ -2,15 +2,18 @@ import sys
 from logging.config import fileConfig
 
 from alembic import context
+from dotenv import load_dotenv
 from sqlalchemy import create_engine, engine_from_config, exc, pool, text
-from sqlalchemy.engine import URL
 from sqlalchemy.engine.url import URL
 
 sys.path = ['', '..'] + sys.path[1:]
 
+from desktop_dispatcher.config import env_path  # noqa: E402
 from desktop_dispatcher.session import Base  # noqa: E402
 from desktop_dispatcher.utils import get_env_variable  # noqa: E402
 
+load_dotenv(env_path)
+
 # from desktop_dispatcher.models import Desktop  # noqa: E402
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,60 @@
+"""add desktop availability indexes
+
+Revision ID: 3b9c1d7e4a52
+Revises: 6f01aefa2e00
+Create Date: 2024-08-02 10:41:07.512384
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c1d7e4a52'
+down_revision: Union[str, None] = '6f01aefa2e00'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Users holding more than one desktop would violate the unique index.
+    # Releasing desktops people hold is the operator's call, not the migration's.
+    duplicates = []
+    if not context.is_offline_mode():
+        duplicates = op.get_bind().execute(
+            sa.text(
+                """
+                SELECT user_id, string_agg(CAST(id AS TEXT), ', ') AS desktop_ids
+                FROM desktop WHERE occupied = true
+                GROUP BY user_id HAVING count(*) > 1
+                ORDER BY user_id
+                """
+            )
+        ).all()
+    if duplicates:
+        held = "; ".join(f"{row.user_id}: desktops {row.desktop_ids}" for row in duplicates)
+        raise RuntimeError(
+            "Some users occupy more than one desktop, release all but one of each "
+            f"and run the migration again. {held}"
+        )
+    op.create_index(
+        'ix_desktop_free',
+        'desktop',
+        ['id'],
+        unique=False,
+        postgresql_where=sa.text('occupied = false'),
+    )
+    op.create_index(
+        'ix_desktop_occupied_user_id',
+        'desktop',
+        ['user_id'],
+        unique=True,
+        postgresql_where=sa.text('occupied = true'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_desktop_occupied_user_id', table_name='desktop')
+    op.drop_index('ix_desktop_free', table_name='desktop')
@@ -0,0 +1,71 @@
+"""add desktop change notifications
+
+Revision ID: 8d2e5f1a9c37
+Revises: 3b9c1d7e4a52
+Create Date: 2024-08-09 14:03:51.228615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5f1a9c37'
+down_revision: Union[str, None] = '3b9c1d7e4a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Publishes every row change on the desktop_changed channel so each bot
+    # replica can keep its availability cache in sync (desktop_dispatcher.cache).
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_desktop_change() RETURNS trigger AS $$
+        DECLARE
+            changed desktop;
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                PERFORM pg_notify('desktop_changed', json_build_object('op', TG_OP)::text);
+                RETURN NULL;
+            ELSIF TG_OP = 'DELETE' THEN
+                changed := OLD;
+            ELSE
+                changed := NEW;
+            END IF;
+            PERFORM pg_notify(
+                'desktop_changed',
+                json_build_object(
+                    'op', TG_OP,
+                    'id', changed.id,
+                    'name', changed.name,
+                    'user_id', changed.user_id,
+                    'occupied', changed.occupied
+                )::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER desktop_changed
+        AFTER INSERT OR UPDATE OR DELETE ON desktop
+        FOR EACH ROW EXECUTE FUNCTION notify_desktop_change()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER desktop_truncated
+        AFTER TRUNCATE ON desktop
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_desktop_change()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS desktop_truncated ON desktop")
+    op.execute("DROP TRIGGER IF EXISTS desktop_changed ON desktop")
+    op.execute("DROP FUNCTION IF EXISTS notify_desktop_change()")
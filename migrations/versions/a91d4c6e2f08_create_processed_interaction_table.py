@@ -0,0 +1,37 @@
+"""create processed interaction table
+
+Revision ID: a91d4c6e2f08
+Revises: f2c6a94d8b13
+Create Date: 2024-09-03 11:27:09.441652
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91d4c6e2f08'
+down_revision: Union[str, None] = 'f2c6a94d8b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('processed_interaction',
+        sa.Column('key', sa.VARCHAR(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('key', name='processed_interaction_pkey')
+    )
+    op.create_index(
+        'ix_processed_interaction_expires_at',
+        'processed_interaction',
+        ['expires_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_processed_interaction_expires_at', table_name='processed_interaction')
+    op.drop_table('processed_interaction')
@@ -0,0 +1,38 @@
+"""create pending selection table
+
+Revision ID: c4a7e2b19f60
+Revises: 8d2e5f1a9c37
+Create Date: 2024-08-14 09:22:40.174903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2b19f60'
+down_revision: Union[str, None] = '8d2e5f1a9c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('pending_selection',
+        sa.Column('user_id', sa.VARCHAR(), nullable=False),
+        sa.Column('desktop_id', sa.INTEGER(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', name='pending_selection_pkey')
+    )
+    op.create_index(
+        'ix_pending_selection_expires_at',
+        'pending_selection',
+        ['expires_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pending_selection_expires_at', table_name='pending_selection')
+    op.drop_table('pending_selection')
@@ -0,0 +1,40 @@
+"""create waitlist entry table
+
+Revision ID: d37b8e1f5c94
+Revises: a91d4c6e2f08
+Create Date: 2024-09-10 16:48:31.902275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd37b8e1f5c94'
+down_revision: Union[str, None] = 'a91d4c6e2f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('waitlist_entry',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.VARCHAR(), nullable=False),
+        sa.Column('joined_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id', name='waitlist_entry_pkey'),
+        sa.UniqueConstraint('user_id', name='waitlist_entry_user_id_key')
+    )
+    op.create_index(
+        'ix_waitlist_entry_expires_at',
+        'waitlist_entry',
+        ['expires_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_waitlist_entry_expires_at', table_name='waitlist_entry')
+    op.drop_table('waitlist_entry')
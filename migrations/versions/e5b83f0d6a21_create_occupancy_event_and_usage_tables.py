@@ -0,0 +1,69 @@
+"""create occupancy event and usage tables
+
+Revision ID: e5b83f0d6a21
+Revises: c4a7e2b19f60
+Create Date: 2024-08-21 10:03:17.529416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b83f0d6a21'
+down_revision: Union[str, None] = 'c4a7e2b19f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('occupancy_event',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('desktop_id', sa.INTEGER(), nullable=False),
+        sa.Column('user_id', sa.VARCHAR(), nullable=False),
+        sa.Column('kind', sa.VARCHAR(), nullable=False),
+        sa.Column('occurred_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id', name='occupancy_event_pkey')
+    )
+    op.create_index(
+        'ix_occupancy_event_occurred_at',
+        'occupancy_event',
+        ['occurred_at'],
+        unique=False,
+    )
+    op.create_table('desktop_usage',
+        sa.Column('desktop_id', sa.INTEGER(), nullable=False),
+        sa.Column('granularity', sa.VARCHAR(), nullable=False),
+        sa.Column('period_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('occupied_seconds', sa.Float(), nullable=False),
+        sa.Column('claims', sa.INTEGER(), nullable=False),
+        sa.PrimaryKeyConstraint('desktop_id', 'granularity', 'period_start', name='desktop_usage_pkey')
+    )
+    op.create_index(
+        'ix_desktop_usage_granularity_period_start',
+        'desktop_usage',
+        ['granularity', 'period_start'],
+        unique=False,
+    )
+    op.create_table('usage_rollup_progress',
+        sa.Column('id', sa.INTEGER(), autoincrement=False, nullable=False),
+        sa.Column('processed_until', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id', name='usage_rollup_progress_pkey')
+    )
+    op.create_table('open_occupancy',
+        sa.Column('desktop_id', sa.INTEGER(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.VARCHAR(), nullable=False),
+        sa.Column('since', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('desktop_id', name='open_occupancy_pkey')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('open_occupancy')
+    op.drop_table('usage_rollup_progress')
+    op.drop_index('ix_desktop_usage_granularity_period_start', table_name='desktop_usage')
+    op.drop_table('desktop_usage')
+    op.drop_index('ix_occupancy_event_occurred_at', table_name='occupancy_event')
+    op.drop_table('occupancy_event')
@@ -0,0 +1,47 @@
+"""add desktop leases
+
+Revision ID: f2c6a94d8b13
+Revises: e5b83f0d6a21
+Create Date: 2024-08-26 15:12:44.806231
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a94d8b13'
+down_revision: Union[str, None] = 'e5b83f0d6a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('desktop', sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('desktop', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    # Desktops occupied before leases existed get a full default lease
+    # (DESKTOP_LEASE_HOURS) from now, so their occupants can still renew them.
+    op.execute(
+        sa.text(
+            """
+            UPDATE desktop SET claimed_at = now(), expires_at = now() + :lease_hours * interval '1 hour'
+            WHERE occupied = true
+            """
+        ).bindparams(lease_hours=float(os.getenv("DESKTOP_LEASE_HOURS", "10")))
+    )
+    op.create_index(
+        'ix_desktop_lease_expires_at',
+        'desktop',
+        ['expires_at'],
+        unique=False,
+        postgresql_where=sa.text('occupied = true'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_desktop_lease_expires_at', table_name='desktop')
+    op.drop_column('desktop', 'expires_at')
+    op.drop_column('desktop', 'claimed_at')